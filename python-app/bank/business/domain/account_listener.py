@@ -0,0 +1,42 @@
+"""
+Account listener interface for observing account mutations.
+"""
+from abc import ABC
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .current_account import CurrentAccount
+    from .transaction import Transaction
+
+
+class AccountListener(ABC):
+    """
+    Interface for objects that want to be notified of account mutations.
+
+    Transfers are reported once, through the listeners of the source account.
+    A transfer with an account held elsewhere (see CurrentAccount.transfer_in
+    and transfer_out) is reported through the listeners of the local account.
+
+    The notifications of a mutation are delivered while the locks of the
+    accounts involved are held, followed by account_unlocked once they have
+    been released.
+    """
+
+    def transaction_recorded(self, account: 'CurrentAccount', transaction: 'Transaction') -> None:
+        """Called after a transaction has been applied to the account."""
+        pass
+
+    def transaction_date_changed(self, account: 'CurrentAccount', transaction: 'Transaction',
+                                 old_date: datetime) -> None:
+        """Called after the date of a recorded transaction has been changed."""
+        pass
+
+    def account_unlocked(self, account: 'CurrentAccount') -> None:
+        """
+        Called after a mutation of the account, once its locks have been released.
+
+        Slow work that must not delay other operations on the account, such
+        as waiting for a logged record to become durable, belongs here.
+        """
+        pass
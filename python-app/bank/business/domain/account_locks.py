@@ -0,0 +1,71 @@
+"""
+Striped locks serializing the operations on current accounts.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from .current_account_id import CurrentAccountId
+
+
+class AccountLocks:
+    """
+    Fixed set of reentrant locks shared by all current accounts.
+
+    Each account id maps to one stripe, so accounts need no lock of their
+    own and every object representing the same account uses the same lock.
+    Operations on several accounts acquire their stripes in increasing
+    stripe order, which is a global order derived from the account ids, so
+    two transfers between the same accounts in opposite directions cannot
+    deadlock.
+    """
+
+    __slots__ = ('stripes', '_depth')
+
+    def __init__(self, stripe_count: int = 1024):
+        self.stripes = tuple(threading.RLock() for _ in range(stripe_count))
+        # Number of hold blocks the current thread is inside
+        self._depth = threading.local()
+
+    def stripe_of(self, account_id: CurrentAccountId) -> int:
+        """Get the index of the stripe guarding an account."""
+        # Account ids cache their hash, which only depends on the branch and account numbers
+        return hash(account_id) % len(self.stripes)
+
+    def is_held(self) -> bool:
+        """Check whether the current thread holds any of the locks."""
+        return getattr(self._depth, 'value', 0) > 0
+
+    @contextmanager
+    def hold(self, *account_ids: CurrentAccountId) -> Iterator[None]:
+        """Hold the locks of the given accounts for the duration of the block."""
+        stripes = sorted({self.stripe_of(account_id) for account_id in account_ids})
+        self._acquire(stripes)
+        try:
+            yield
+        finally:
+            self._release(stripes)
+
+    @contextmanager
+    def hold_all(self) -> Iterator[None]:
+        """Hold every lock, stopping all account operations for the duration of the block."""
+        stripes = list(range(len(self.stripes)))
+        self._acquire(stripes)
+        try:
+            yield
+        finally:
+            self._release(stripes)
+
+    def _acquire(self, stripes: List[int]) -> None:
+        for index in stripes:
+            self.stripes[index].acquire()
+        self._depth.value = getattr(self._depth, 'value', 0) + 1
+
+    def _release(self, stripes: List[int]) -> None:
+        self._depth.value -= 1
+        for index in reversed(stripes):
+            self.stripes[index].release()
+
+
+# Locks used by every current account
+ACCOUNT_LOCKS = AccountLocks()
@@ -0,0 +1,98 @@
+"""
+Operations and results of batch processing.
+"""
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .transaction import Transaction
+
+
+class BatchOperation:
+    """
+    A deposit, withdrawal or transfer submitted as part of a batch.
+    """
+
+    __slots__ = ('kind', 'operation_location', 'branch', 'account_number', 'amount', 'envelope',
+                 'dst_branch', 'dst_account_number')
+
+    DEPOSIT = "deposit"
+    WITHDRAWAL = "withdrawal"
+    TRANSFER = "transfer"
+
+    def __init__(self, kind: str, operation_location: int, branch: int, account_number: int,
+                 amount: float, envelope: Optional[int] = None, dst_branch: Optional[int] = None,
+                 dst_account_number: Optional[int] = None):
+        self.kind = kind
+        self.operation_location = operation_location
+        self.branch = branch
+        self.account_number = account_number
+        self.amount = amount
+        self.envelope = envelope
+        self.dst_branch = dst_branch
+        self.dst_account_number = dst_account_number
+
+    @classmethod
+    def deposit(cls, operation_location: int, branch: int, account_number: int,
+                envelope: int, amount: float) -> 'BatchOperation':
+        return cls(cls.DEPOSIT, operation_location, branch, account_number, amount, envelope=envelope)
+
+    @classmethod
+    def withdrawal(cls, operation_location: int, branch: int, account_number: int,
+                   amount: float) -> 'BatchOperation':
+        return cls(cls.WITHDRAWAL, operation_location, branch, account_number, amount)
+
+    @classmethod
+    def transfer(cls, operation_location: int, src_branch: int, src_account_number: int,
+                 dst_branch: int, dst_account_number: int, amount: float) -> 'BatchOperation':
+        return cls(cls.TRANSFER, operation_location, src_branch, src_account_number, amount,
+                   dst_branch=dst_branch, dst_account_number=dst_account_number)
+
+    def get_kind(self) -> str:
+        return self.kind
+
+    def get_operation_location(self) -> int:
+        return self.operation_location
+
+    def get_branch(self) -> int:
+        return self.branch
+
+    def get_account_number(self) -> int:
+        return self.account_number
+
+    def get_amount(self) -> float:
+        return self.amount
+
+    def get_envelope(self) -> Optional[int]:
+        return self.envelope
+
+    def get_dst_branch(self) -> Optional[int]:
+        return self.dst_branch
+
+    def get_dst_account_number(self) -> Optional[int]:
+        return self.dst_account_number
+
+
+class BatchResult:
+    """
+    Outcome of one operation of a batch: its transaction, or the key of the error that prevented it.
+    """
+
+    __slots__ = ('index', 'transaction', 'error')
+
+    def __init__(self, index: int, transaction: Optional['Transaction'] = None,
+                 error: Optional[str] = None):
+        self.index = index
+        self.transaction = transaction
+        self.error = error
+
+    def get_index(self) -> int:
+        return self.index
+
+    def get_transaction(self) -> Optional['Transaction']:
+        return self.transaction
+
+    def get_error(self) -> Optional[str]:
+        return self.error
+
+    def is_success(self) -> bool:
+        return self.error is None
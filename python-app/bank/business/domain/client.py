@@ -15,6 +15,8 @@ class Client(User):
     Client class representing bank customers.
     """
     
+    __slots__ = ('cpf', 'account')
+    
     def __init__(self, first_name: str, last_name: str, cpf: int, password: str, birthday: datetime):
         super().__init__(first_name, last_name, password, birthday)
         self.cpf = cpf
@@ -8,4 +8,5 @@ class Credentials(ABC):
     """
     Interface for objects that can be used as authentication credentials.
     """
-    pass
\ No newline at end of file
+    
+    __slots__ = ()
\ No newline at end of file
@@ -1,13 +1,19 @@
 """
 Current Account class for the banking system.
 """
-from typing import List, TYPE_CHECKING
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple, TYPE_CHECKING
 from ..business_exception import BusinessException
+from .account_locks import ACCOUNT_LOCKS
 from .credentials import Credentials
 from .current_account_id import CurrentAccountId
+from .ledger import Ledger, DEPOSIT, WITHDRAWAL, TRANSFER_OUT, TRANSFER_IN
 
 if TYPE_CHECKING:
+    from .account_listener import AccountListener
     from .client import Client
+    from .monthly_summary import MonthlySummary
     from .operation_location import Branch, OperationLocation
     from .transaction import Transaction, Deposit, Withdrawal, Transfer
 
@@ -15,17 +21,26 @@ if TYPE_CHECKING:
 class CurrentAccount(Credentials):
     """
     Current account class representing bank accounts.
+    
+    The transaction history is kept in a columnar Ledger; the transaction
+    getters materialize Transaction objects from it on demand.
+    
+    Operations are serialized by the account locks, so concurrent threads
+    cannot overdraw an account, and a transfer updates both accounts
+    atomically.
     """
     
+    __slots__ = ('id', 'client', 'balance', 'ledger', 'listeners', '_transaction_loader', '__weakref__')
+    
     def __init__(self, branch: 'Branch', number: int, client: 'Client', initial_balance: float = 0.0):
         self.id = CurrentAccountId(branch, number)
         branch.add_account(self)
         self.client = client
         client.set_account(self)
         self.balance = initial_balance
-        self.deposits: List['Deposit'] = []
-        self.transfers: List['Transfer'] = []
-        self.withdrawals: List['Withdrawal'] = []
+        self.ledger = Ledger(self)
+        self.listeners: Tuple['AccountListener', ...] = ()
+        self._transaction_loader: Optional[Callable[['CurrentAccount'], None]] = None
     
     def get_id(self) -> CurrentAccountId:
         return self.id
@@ -37,55 +52,218 @@ class CurrentAccount(Credentials):
         return self.balance
     
     def get_deposits(self) -> List['Deposit']:
-        return self.deposits.copy()
+        with ACCOUNT_LOCKS.hold(self.id):
+            return list(self.get_ledger().iter_transactions((DEPOSIT,)))
     
     def get_transfers(self) -> List['Transfer']:
-        return self.transfers.copy()
+        with ACCOUNT_LOCKS.hold(self.id):
+            return list(self.get_ledger().iter_transactions((TRANSFER_OUT, TRANSFER_IN)))
     
     def get_withdrawals(self) -> List['Withdrawal']:
-        return self.withdrawals.copy()
+        with ACCOUNT_LOCKS.hold(self.id):
+            return list(self.get_ledger().iter_transactions((WITHDRAWAL,)))
+    
+    def get_ledger(self) -> Ledger:
+        """Get the transaction ledger, loading it first if needed."""
+        self.ensure_transactions_loaded()
+        return self.ledger
+    
+    def set_transaction_loader(self, loader: Callable[['CurrentAccount'], None]) -> None:
+        """
+        Defer loading of the transaction history of this account.
+        
+        The loader is called once, with this account, the first time the
+        transactions are needed. It must fill the ledger directly.
+        """
+        self._transaction_loader = loader
+    
+    def ensure_transactions_loaded(self) -> None:
+        """Run the pending transaction loader, if any."""
+        if self._transaction_loader is None:
+            return
+        with ACCOUNT_LOCKS.hold(self.id):
+            loader = self._transaction_loader
+            if loader is not None:
+                self._transaction_loader = None
+                loader(self)
+    
+    def add_listener(self, listener: 'AccountListener') -> None:
+        """Register a listener to be notified of mutations on this account."""
+        if listener not in self.listeners:
+            self.listeners = self.listeners + (listener,)
+    
+    def remove_listener(self, listener: 'AccountListener') -> None:
+        """Unregister a previously added listener."""
+        self.listeners = tuple(l for l in self.listeners if l is not listener)
+    
+    @staticmethod
+    @contextmanager
+    def locked(*accounts: 'CurrentAccount') -> Iterator[None]:
+        """
+        Hold the locks of several accounts for the duration of the block.
+        
+        The operations made on them inside the block run as one atomic unit,
+        and listeners are notified that the accounts are unlocked only once,
+        at the end of the block.
+        """
+        accounts = tuple(dict.fromkeys(accounts))
+        try:
+            with ACCOUNT_LOCKS.hold(*(account.id for account in accounts)):
+                yield
+        finally:
+            for account in accounts:
+                account._notify_unlocked()
     
     def get_transactions(self) -> List['Transaction']:
-        """Get all transactions for this account."""
-        transactions = []
-        transactions.extend(self.deposits)
-        transactions.extend(self.withdrawals)
-        transactions.extend(self.transfers)
-        return transactions
+        """Get all transactions for this account, in the order they were recorded."""
+        with ACCOUNT_LOCKS.hold(self.id):
+            return list(self.get_ledger().iter_transactions())
+    
+    def get_transactions_by_date(self, begin: datetime, end: datetime) -> List['Transaction']:
+        """Get the transactions dated between begin and end (inclusive), newest first."""
+        with ACCOUNT_LOCKS.hold(self.id):
+            return self.get_ledger().get_transactions_between(begin, end)
+    
+    def get_statement_page(self, begin: datetime, end: datetime, page_size: int,
+                           after: Optional[Tuple[int, int]] = None
+                           ) -> Tuple[List['Transaction'], Optional[Tuple[int, int]]]:
+        """Get a page of the transactions dated between begin and end, newest first (see Ledger.get_page)."""
+        with ACCOUNT_LOCKS.hold(self.id):
+            return self.get_ledger().get_page(begin, end, page_size, after)
+    
+    def get_balance_at(self, date: datetime) -> float:
+        """Get the balance right after the transactions dated up to date, in O(log n)."""
+        with ACCOUNT_LOCKS.hold(self.id):
+            return self.get_ledger().get_balance_at(date, self.balance)
+    
+    def get_monthly_summary(self, year: int, month: int) -> 'MonthlySummary':
+        """Get the totals and opening and closing balances of a month."""
+        with ACCOUNT_LOCKS.hold(self.id):
+            return self.get_ledger().get_monthly_summary(year, month, self.balance)
     
     def deposit(self, location: 'OperationLocation', envelope: int, amount: float) -> 'Deposit':
         """Perform a deposit operation."""
-        self._deposit_amount(amount)
-        
         from .transaction import Deposit
-        deposit = Deposit(location, self, envelope, amount)
-        self.deposits.append(deposit)
+        with ACCOUNT_LOCKS.hold(self.id):
+            self._deposit_amount(amount)
+            self.ensure_transactions_loaded()
+            
+            deposit = Deposit(location, self, envelope, amount)
+            deposit.row = self.ledger.append(DEPOSIT, deposit.date, amount, location, envelope)
+            self._notify_recorded(deposit)
+        self._notify_unlocked()
         
         return deposit
     
     def withdrawal(self, location: 'OperationLocation', amount: float) -> 'Withdrawal':
         """Perform a withdrawal operation."""
-        self._withdrawal_amount(amount)
-        
         from .transaction import Withdrawal
-        withdrawal = Withdrawal(location, self, amount)
-        self.withdrawals.append(withdrawal)
+        with ACCOUNT_LOCKS.hold(self.id):
+            self._withdrawal_amount(amount)
+            self.ensure_transactions_loaded()
+            
+            withdrawal = Withdrawal(location, self, amount)
+            withdrawal.row = self.ledger.append(WITHDRAWAL, withdrawal.date, amount, location)
+            self._notify_recorded(withdrawal)
+        self._notify_unlocked()
         
         return withdrawal
     
     def transfer(self, location: 'OperationLocation', destination_account: 'CurrentAccount', 
                 amount: float) -> 'Transfer':
         """Perform a transfer operation."""
-        self._withdrawal_amount(amount)
-        destination_account._deposit_amount(amount)
+        from .transaction import Transfer
+        with ACCOUNT_LOCKS.hold(self.id, destination_account.id):
+            self._withdrawal_amount(amount)
+            destination_account._deposit_amount(amount)
+            self.ensure_transactions_loaded()
+            destination_account.ensure_transactions_loaded()
+            
+            transfer = Transfer(location, self, destination_account, amount)
+            transfer.row = self.ledger.append(TRANSFER_OUT, transfer.date, amount, location,
+                                              counterparty=destination_account)
+            transfer.destination_row = destination_account.ledger.append(
+                TRANSFER_IN, transfer.date, amount, location, counterparty=self, link=transfer.row)
+            self.ledger.set_link(transfer.row, transfer.destination_row)
+            self._notify_recorded(transfer)
+        self._notify_unlocked()
+        
+        return transfer
+    
+    def transfer_out(self, location: 'OperationLocation', destination_account: 'CurrentAccount',
+                     amount: float) -> 'Transfer':
+        """
+        Perform the source side of a transfer to an account held elsewhere.
         
+        Only this account is debited and only its ledger records the
+        transfer; destination_account stands in for the remote account,
+        whose side is recorded with transfer_in where it is held.
+        """
         from .transaction import Transfer
-        transfer = Transfer(location, self, destination_account, amount)
-        self.transfers.append(transfer)
-        destination_account.transfers.append(transfer)
+        with ACCOUNT_LOCKS.hold(self.id):
+            self._withdrawal_amount(amount)
+            self.ensure_transactions_loaded()
+            
+            transfer = Transfer(location, self, destination_account, amount)
+            transfer.row = self.ledger.append(TRANSFER_OUT, transfer.date, amount, location,
+                                              counterparty=destination_account)
+            self._notify_recorded(transfer)
+        self._notify_unlocked()
         
         return transfer
     
+    def transfer_in(self, location: 'OperationLocation', source_account: 'CurrentAccount',
+                    amount: float, date: Optional[datetime] = None) -> 'Transfer':
+        """
+        Perform the destination side of a transfer from an account held elsewhere.
+        
+        Only this account is credited and only its ledger records the
+        transfer; source_account stands in for the remote account.
+        """
+        from .transaction import Transfer
+        with ACCOUNT_LOCKS.hold(self.id):
+            self._deposit_amount(amount)
+            self.ensure_transactions_loaded()
+            
+            transfer = Transfer(location, source_account, self, amount, date)
+            transfer.destination_row = self.ledger.append(TRANSFER_IN, transfer.date, amount, location,
+                                                          counterparty=source_account)
+            self._notify_recorded(transfer)
+        self._notify_unlocked()
+        
+        return transfer
+    
+    def _transaction_date_changed(self, transaction: 'Transaction', old_date: datetime) -> None:
+        """Internal method called by a transaction when its date is changed."""
+        from .transaction import Transfer
+        date = transaction.get_date()
+        is_transfer = isinstance(transaction, Transfer)
+        account_ids = (self.id, transaction.get_destination_account().id) if is_transfer else (self.id,)
+        with ACCOUNT_LOCKS.hold(*account_ids):
+            if transaction.get_row() >= 0:
+                self.get_ledger().set_date(transaction.get_row(), date)
+            
+            if is_transfer and transaction.get_destination_row() >= 0:
+                transaction.get_destination_account().get_ledger().set_date(
+                    transaction.get_destination_row(), date)
+            
+            for listener in self.listeners:
+                listener.transaction_date_changed(self, transaction, old_date)
+        self._notify_unlocked()
+    
+    def _notify_recorded(self, transaction: 'Transaction') -> None:
+        """Notify listeners that a transaction has been recorded."""
+        for listener in self.listeners:
+            listener.transaction_recorded(self, transaction)
+    
+    def _notify_unlocked(self) -> None:
+        """Notify listeners that the locks held for a mutation have been released."""
+        if ACCOUNT_LOCKS.is_held():
+            # Inside an enclosing locked block, which notifies when it ends
+            return
+        for listener in self.listeners:
+            listener.account_unlocked(self)
+    
     def _deposit_amount(self, amount: float) -> None:
         """Internal method to deposit amount."""
         if not self._is_valid_amount(amount):
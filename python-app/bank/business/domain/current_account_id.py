@@ -10,11 +10,17 @@ if TYPE_CHECKING:
 class CurrentAccountId:
     """
     Composite identifier for current accounts.
+    
+    The hash depends only on the branch and account numbers and is computed
+    once, as ids are hashed on every dictionary lookup and lock acquisition.
     """
     
+    __slots__ = ('branch', 'number', '_hash')
+    
     def __init__(self, branch: 'Branch', number: int):
         self.branch = branch
         self.number = number
+        self._hash = hash((branch.get_number(), number))
     
     def get_branch(self) -> 'Branch':
         return self.branch
@@ -23,9 +29,11 @@ class CurrentAccountId:
         return self.number
     
     def __eq__(self, other) -> bool:
+        if self is other:
+            return True
         if not isinstance(other, CurrentAccountId):
             return False
-        return self.branch == other.branch and self.number == other.number
+        return self.number == other.number and self.branch == other.branch
     
     def __hash__(self) -> int:
-        return hash((self.branch, self.number))
\ No newline at end of file
+        return self._hash
\ No newline at end of file
@@ -13,6 +13,8 @@ class Employee(User, Credentials):
     Employee class representing bank employees.
     """
     
+    __slots__ = ('username',)
+    
     def __init__(self, first_name: str, last_name: str, username: str, password: str, birthday: datetime):
         super().__init__(first_name, last_name, password, birthday)
         self.username = username
@@ -0,0 +1,396 @@
+"""
+Columnar transaction ledger for current accounts.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from .monthly_summary import MonthlySummary
+
+if TYPE_CHECKING:
+    from .current_account import CurrentAccount
+    from .operation_location import OperationLocation
+    from .transaction import Transaction
+
+
+# Row types
+DEPOSIT = 0
+WITHDRAWAL = 1
+TRANSFER_OUT = 2
+TRANSFER_IN = 3
+
+NO_COUNTERPARTY = -1
+NO_LINK = -1
+
+# Sign of the effect of each row type on the balance
+BALANCE_SIGNS = (1, -1, -1, 1)
+
+# Rows of the time index between two running-balance checkpoints
+CHECKPOINT_INTERVAL = 64
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_timestamp(date: datetime) -> int:
+    """Encode a naive datetime as microseconds since the epoch."""
+    return (date - _EPOCH) // _MICROSECOND
+
+
+def decode_timestamp(value: int) -> datetime:
+    """Decode microseconds since the epoch into a naive datetime."""
+    return _EPOCH + timedelta(microseconds=value)
+
+
+class Ledger:
+    """
+    Transaction history of one account, stored as parallel typed arrays.
+
+    Each row costs a few dozen bytes instead of a full Transaction object.
+    Transaction objects are materialized from the rows only when asked for,
+    and are not kept by the ledger.
+
+    A transfer is stored as a TRANSFER_OUT row in the source ledger and a
+    TRANSFER_IN row in the destination ledger; the link column holds the row
+    of the same transfer in the other ledger.
+
+    Rows are also indexed by timestamp. Rows recorded in chronological order
+    are appended to the index in O(1); back-dated rows fall back to a bisect
+    insertion. Date range queries then cost O(log n + k).
+
+    Per-month rollups (row count and total per row type) are maintained with
+    every row, so month totals cost O(1) instead of O(rows).
+
+    Running-balance checkpoints hold the net effect on the balance of the
+    rows of the time index up to every CHECKPOINT_INTERVAL-th position, so
+    the balance at any date costs O(log n) plus a bounded scan. Appending a
+    row costs O(1) amortized; a back-dated row shifts the checkpoints after
+    it, in O(n / CHECKPOINT_INTERVAL).
+    """
+
+    __slots__ = ('owner', 'timestamps', 'kinds', 'amounts', 'locations', 'envelopes', 'counterparties',
+                 'links', 'location_table', 'counterparty_table', '_counterparty_index',
+                 'time_order', 'sorted_timestamps', 'monthly_totals', 'balance_checkpoints')
+
+    # Column names and array type codes, in storage order
+    COLUMNS: Tuple[Tuple[str, str], ...] = (
+        ('timestamps', 'q'),
+        ('kinds', 'b'),
+        ('amounts', 'd'),
+        ('locations', 'i'),
+        ('envelopes', 'q'),
+        ('counterparties', 'i'),
+        ('links', 'i'),
+    )
+
+    def __init__(self, owner: 'CurrentAccount'):
+        self.owner = owner
+        self.timestamps = array('q')
+        self.kinds = array('b')
+        self.amounts = array('d')
+        self.locations = array('i')
+        self.envelopes = array('q')
+        self.counterparties = array('i')
+        self.links = array('i')
+        # Interned objects referenced by the location and counterparty columns
+        self.location_table: Dict[int, 'OperationLocation'] = {}
+        self.counterparty_table: List['CurrentAccount'] = []
+        self._counterparty_index: Dict['CurrentAccount', int] = {}
+        # Time index: rows sorted by timestamp, and their timestamps
+        self.time_order = array('i')
+        self.sorted_timestamps = array('q')
+        # Monthly rollups: year * 12 + month - 1 -> [row count, total of each row type]
+        self.monthly_totals: Dict[int, List[float]] = {}
+        # Running balance checkpoints: entry i is the net effect of the first
+        # (i + 1) * CHECKPOINT_INTERVAL rows of the time index
+        self.balance_checkpoints = array('d')
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def append(self, kind: int, date: datetime, amount: float, location: 'OperationLocation',
+               envelope: int = 0, counterparty: Optional['CurrentAccount'] = None,
+               link: int = NO_LINK) -> int:
+        """Append a row. Return its index."""
+        location_number = location.get_number()
+        if location_number not in self.location_table:
+            self.location_table[location_number] = location
+        row = len(self.kinds)
+        timestamp = encode_timestamp(date)
+        self.timestamps.append(timestamp)
+        self.kinds.append(kind)
+        self.amounts.append(amount)
+        self.locations.append(location_number)
+        self.envelopes.append(envelope)
+        self.counterparties.append(self._intern_counterparty(counterparty))
+        self.links.append(link)
+        self._index_insert(row, timestamp)
+        self._add_to_month(row, timestamp, 1)
+        return row
+
+    def set_date(self, row: int, date: datetime) -> None:
+        timestamp = encode_timestamp(date)
+        if timestamp == self.timestamps[row]:
+            return
+        self._index_remove(row, self.timestamps[row])
+        self._add_to_month(row, self.timestamps[row], -1)
+        self.timestamps[row] = timestamp
+        self._index_insert(row, timestamp)
+        self._add_to_month(row, timestamp, 1)
+
+    def set_link(self, row: int, link: int) -> None:
+        self.links[row] = link
+
+    def get_date(self, row: int) -> datetime:
+        return decode_timestamp(self.timestamps[row])
+
+    def get_counterparty(self, row: int) -> Optional['CurrentAccount']:
+        index = self.counterparties[row]
+        return self.counterparty_table[index] if index != NO_COUNTERPARTY else None
+
+    def get_transaction(self, row: int) -> 'Transaction':
+        """Materialize the transaction stored at row."""
+        from .transaction import Deposit, Withdrawal, Transfer
+
+        kind = self.kinds[row]
+        location = self.location_table[self.locations[row]]
+        amount = self.amounts[row]
+        date = decode_timestamp(self.timestamps[row])
+        if kind == DEPOSIT:
+            transaction = Deposit(location, self.owner, self.envelopes[row], amount, date)
+            transaction.row = row
+        elif kind == WITHDRAWAL:
+            transaction = Withdrawal(location, self.owner, amount, date)
+            transaction.row = row
+        elif kind == TRANSFER_OUT:
+            transaction = Transfer(location, self.owner, self.get_counterparty(row), amount, date)
+            transaction.row = row
+            transaction.destination_row = self.links[row]
+        else:
+            transaction = Transfer(location, self.get_counterparty(row), self.owner, amount, date)
+            transaction.row = self.links[row]
+            transaction.destination_row = row
+        return transaction
+
+    def iter_transactions(self, kinds: Optional[Tuple[int, ...]] = None) -> Iterator['Transaction']:
+        """Materialize the transactions in insertion order, optionally only of the given kinds."""
+        for row in range(len(self.kinds)):
+            if kinds is None or self.kinds[row] in kinds:
+                yield self.get_transaction(row)
+
+    def rows_between(self, begin: datetime, end: datetime) -> array:
+        """Get the rows dated between begin and end (inclusive), oldest first."""
+        low = bisect_left(self.sorted_timestamps, encode_timestamp(begin))
+        high = bisect_right(self.sorted_timestamps, encode_timestamp(end))
+        return self.time_order[low:high]
+
+    def get_transactions_between(self, begin: datetime, end: datetime) -> List['Transaction']:
+        """Materialize the transactions dated between begin and end (inclusive), newest first."""
+        rows = self.rows_between(begin, end)
+        return [self.get_transaction(row) for row in reversed(rows)]
+
+    def get_page(self, begin: datetime, end: datetime, page_size: int,
+                 after: Optional[Tuple[int, int]] = None) -> Tuple[List['Transaction'], Optional[Tuple[int, int]]]:
+        """
+        Materialize up to page_size transactions dated between begin and end (inclusive), newest first.
+
+        Rows are ordered by (timestamp, row), descending, and the page
+        starts right after the position after, if given. Row indexes never
+        change, so positions stay valid as rows are added. Return the page
+        and the position of its last row, or None if no row follows it.
+        """
+        sorted_timestamps = self.sorted_timestamps
+        low = bisect_left(sorted_timestamps, encode_timestamp(begin))
+        high = bisect_right(sorted_timestamps, encode_timestamp(end))
+        if after is not None:
+            high = min(high, bisect_right(sorted_timestamps, after[0], low))
+        rows: List[int] = []
+        # One more row than the page tells whether another page follows
+        while high > low and len(rows) <= page_size:
+            # Rows sharing a timestamp are ordered by row, which the time index does not guarantee
+            timestamp = sorted_timestamps[high - 1]
+            start = bisect_left(sorted_timestamps, timestamp, low, high)
+            group = sorted(self.time_order[start:high], reverse=True)
+            if after is not None and timestamp == after[0]:
+                group = [row for row in group if row < after[1]]
+            rows.extend(group[:page_size + 1 - len(rows)])
+            high = start
+        next_position = None
+        if len(rows) > page_size:
+            del rows[page_size:]
+            next_position = (self.timestamps[rows[-1]], rows[-1])
+        return [self.get_transaction(row) for row in rows], next_position
+
+    def get_balance_at(self, date: datetime, balance: float) -> float:
+        """
+        Get the balance right after the rows dated up to date (inclusive).
+
+        The balance is derived backwards from the given current balance, by
+        undoing the rows dated after date, so it is correct for back-dated
+        rows and for loaded ledgers alike.
+        """
+        position = bisect_right(self.sorted_timestamps, encode_timestamp(date))
+        return balance - self._balance_change_before(len(self.time_order)) + self._balance_change_before(position)
+
+    def get_monthly_summary(self, year: int, month: int, balance: float) -> MonthlySummary:
+        """
+        Summarize a month from the rollups and the running-balance checkpoints.
+
+        Balances are derived backwards from the given current balance, so
+        they are correct for back-dated rows and for loaded ledgers alike.
+        """
+        key = year * 12 + month - 1
+        totals = self.monthly_totals.get(key, [0, 0.0, 0.0, 0.0, 0.0])
+        next_month = datetime(year + month // 12, month % 12 + 1, 1)
+        closing_balance = self.get_balance_at(next_month - _MICROSECOND, balance)
+        opening_balance = closing_balance - _balance_change(totals)
+        return MonthlySummary(year, month, int(totals[0]), totals[1 + DEPOSIT], totals[1 + WITHDRAWAL],
+                              totals[1 + TRANSFER_OUT], totals[1 + TRANSFER_IN],
+                              opening_balance, closing_balance)
+
+    def get_columns(self) -> Dict[str, array]:
+        """Get the column arrays, by name."""
+        return {name: getattr(self, name) for name, _ in self.COLUMNS}
+
+    def set_columns(self, columns: Dict[str, array], location_table: Dict[int, 'OperationLocation'],
+                    counterparty_table: List['CurrentAccount'],
+                    indexes: Optional[Tuple[array, array, Dict[int, List[float]], array]] = None) -> None:
+        """
+        Replace the whole content of the ledger, e.g. when loading it from storage.
+
+        indexes, when given, are the time order, sorted timestamps, monthly
+        totals and balance checkpoints of the new rows, already computed in
+        bulk by the caller; they are used as they are instead of rebuilt.
+        """
+        for name, _ in self.COLUMNS:
+            setattr(self, name, columns[name])
+        self.location_table = location_table
+        self.counterparty_table = counterparty_table
+        self._counterparty_index = {account: index for index, account in enumerate(counterparty_table)}
+        if indexes is not None:
+            self.time_order, self.sorted_timestamps, self.monthly_totals, self.balance_checkpoints = indexes
+            return
+        timestamps = self.timestamps
+        self.time_order = array('i', sorted(range(len(timestamps)), key=timestamps.__getitem__))
+        self.sorted_timestamps = array('q', [timestamps[row] for row in self.time_order])
+        self._rebuild_monthly_totals()
+        self._rebuild_balance_checkpoints()
+
+    def _intern_counterparty(self, counterparty: Optional['CurrentAccount']) -> int:
+        if counterparty is None:
+            return NO_COUNTERPARTY
+        index = self._counterparty_index.get(counterparty)
+        if index is None:
+            index = len(self.counterparty_table)
+            self.counterparty_table.append(counterparty)
+            self._counterparty_index[counterparty] = index
+        return index
+
+    def _index_insert(self, row: int, timestamp: int) -> None:
+        sorted_timestamps = self.sorted_timestamps
+        if not sorted_timestamps or timestamp >= sorted_timestamps[-1]:
+            sorted_timestamps.append(timestamp)
+            self.time_order.append(row)
+            position = len(sorted_timestamps) - 1
+        else:
+            # Back-dated row
+            position = bisect_right(sorted_timestamps, timestamp)
+            sorted_timestamps.insert(position, timestamp)
+            self.time_order.insert(position, row)
+        self._checkpoints_insert(position, row)
+
+    def _index_remove(self, row: int, timestamp: int) -> None:
+        low = bisect_left(self.sorted_timestamps, timestamp)
+        high = bisect_right(self.sorted_timestamps, timestamp)
+        for position in range(low, high):
+            if self.time_order[position] == row:
+                del self.sorted_timestamps[position]
+                del self.time_order[position]
+                self._checkpoints_remove(position, row)
+                return
+
+    def _balance_change_before(self, position: int) -> float:
+        """Get the net effect on the balance of the rows before position in the time index."""
+        block = position // CHECKPOINT_INTERVAL
+        change = self.balance_checkpoints[block - 1] if block else 0.0
+        kinds = self.kinds
+        amounts = self.amounts
+        for row in self.time_order[block * CHECKPOINT_INTERVAL:position]:
+            change += BALANCE_SIGNS[kinds[row]] * amounts[row]
+        return change
+
+    def _checkpoints_insert(self, position: int, row: int) -> None:
+        """Update the checkpoints after row was inserted at position in the time index."""
+        checkpoints = self.balance_checkpoints
+        time_order = self.time_order
+        kinds = self.kinds
+        amounts = self.amounts
+        effect = BALANCE_SIGNS[kinds[row]] * amounts[row]
+        # Each later checkpoint gains the row and loses the one pushed past it
+        for block in range(position // CHECKPOINT_INTERVAL, len(checkpoints)):
+            pushed = time_order[(block + 1) * CHECKPOINT_INTERVAL]
+            checkpoints[block] += effect - BALANCE_SIGNS[kinds[pushed]] * amounts[pushed]
+        if len(time_order) % CHECKPOINT_INTERVAL == 0:
+            last = time_order[-1]
+            checkpoints.append(self._balance_change_before(len(time_order) - 1) +
+                               BALANCE_SIGNS[kinds[last]] * amounts[last])
+
+    def _checkpoints_remove(self, position: int, row: int) -> None:
+        """Update the checkpoints after row was removed from position in the time index."""
+        checkpoints = self.balance_checkpoints
+        time_order = self.time_order
+        if len(checkpoints) * CHECKPOINT_INTERVAL > len(time_order):
+            checkpoints.pop()
+        kinds = self.kinds
+        amounts = self.amounts
+        effect = BALANCE_SIGNS[kinds[row]] * amounts[row]
+        # Each later checkpoint loses the row and gains the one pulled before it
+        for block in range(position // CHECKPOINT_INTERVAL, len(checkpoints)):
+            pulled = time_order[(block + 1) * CHECKPOINT_INTERVAL - 1]
+            checkpoints[block] += BALANCE_SIGNS[kinds[pulled]] * amounts[pulled] - effect
+
+    def _rebuild_balance_checkpoints(self) -> None:
+        """Compute the running-balance checkpoints from scratch."""
+        checkpoints = self.balance_checkpoints = array('d')
+        kinds = self.kinds
+        amounts = self.amounts
+        change = 0.0
+        for position, row in enumerate(self.time_order, 1):
+            change += BALANCE_SIGNS[kinds[row]] * amounts[row]
+            if position % CHECKPOINT_INTERVAL == 0:
+                checkpoints.append(change)
+
+    def _rebuild_monthly_totals(self) -> None:
+        """Compute the monthly rollups from scratch, one month of the time index at a time."""
+        self.monthly_totals = {}
+        sorted_timestamps = self.sorted_timestamps
+        kinds = self.kinds
+        amounts = self.amounts
+        position = 0
+        while position < len(sorted_timestamps):
+            date = decode_timestamp(sorted_timestamps[position])
+            next_month = datetime(date.year + date.month // 12, date.month % 12 + 1, 1)
+            end = bisect_left(sorted_timestamps, encode_timestamp(next_month), position)
+            totals = [end - position, 0.0, 0.0, 0.0, 0.0]
+            for row in self.time_order[position:end]:
+                totals[1 + kinds[row]] += amounts[row]
+            self.monthly_totals[date.year * 12 + date.month - 1] = totals
+            position = end
+
+    def _add_to_month(self, row: int, timestamp: int, sign: int) -> None:
+        """Add (sign 1) or remove (sign -1) a row from its monthly rollup."""
+        date = decode_timestamp(timestamp)
+        key = date.year * 12 + date.month - 1
+        totals = self.monthly_totals.get(key)
+        if totals is None:
+            totals = self.monthly_totals[key] = [0, 0.0, 0.0, 0.0, 0.0]
+        totals[0] += sign
+        totals[1 + self.kinds[row]] += sign * self.amounts[row]
+        if totals[0] == 0:
+            del self.monthly_totals[key]
+
+
+def _balance_change(totals: List[float]) -> float:
+    """Get the net effect on the balance of the rows of a monthly rollup."""
+    return sum(sign * total for sign, total in zip(BALANCE_SIGNS, totals[1:]))
@@ -0,0 +1,52 @@
+"""
+Monthly summary of the transactions of a current account.
+"""
+
+
+class MonthlySummary:
+    """
+    Totals and balances of a current account for one month.
+    """
+
+    __slots__ = ('year', 'month', 'transaction_count', 'deposits', 'withdrawals', 'transfers_out',
+                 'transfers_in', 'opening_balance', 'closing_balance')
+
+    def __init__(self, year: int, month: int, transaction_count: int, deposits: float,
+                 withdrawals: float, transfers_out: float, transfers_in: float,
+                 opening_balance: float, closing_balance: float):
+        self.year = year
+        self.month = month
+        self.transaction_count = transaction_count
+        self.deposits = deposits
+        self.withdrawals = withdrawals
+        self.transfers_out = transfers_out
+        self.transfers_in = transfers_in
+        self.opening_balance = opening_balance
+        self.closing_balance = closing_balance
+
+    def get_year(self) -> int:
+        return self.year
+
+    def get_month(self) -> int:
+        return self.month
+
+    def get_transaction_count(self) -> int:
+        return self.transaction_count
+
+    def get_deposits(self) -> float:
+        return self.deposits
+
+    def get_withdrawals(self) -> float:
+        return self.withdrawals
+
+    def get_transfers_out(self) -> float:
+        return self.transfers_out
+
+    def get_transfers_in(self) -> float:
+        return self.transfers_in
+
+    def get_opening_balance(self) -> float:
+        return self.opening_balance
+
+    def get_closing_balance(self) -> float:
+        return self.closing_balance
@@ -13,6 +13,8 @@ class OperationLocation(ABC):
     Abstract base class for operation locations (ATM, Branch).
     """
     
+    __slots__ = ('number',)
+    
     def __init__(self, number: int):
         self.number = number
     
@@ -36,6 +38,8 @@ class Branch(OperationLocation):
     Branch class representing bank branches.
     """
     
+    __slots__ = ('name', 'accounts')
+    
     def __init__(self, number: int, name: str = None):
         super().__init__(number)
         self.name = name
@@ -61,5 +65,7 @@ class ATM(OperationLocation):
     ATM class representing automated teller machines.
     """
     
+    __slots__ = ()
+    
     def __init__(self, number: int):
         super().__init__(number)
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+Pages of account statements.
+"""
+import base64
+import binascii
+import struct
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+from ..business_exception import BusinessException
+
+if TYPE_CHECKING:
+    from .transaction import Transaction
+
+# Timestamp and ledger row of the last transaction of a page
+_CURSOR = struct.Struct('<qq')
+
+
+class StatementPage:
+    """
+    Consecutive transactions of a statement, newest first.
+
+    The cursor resumes the statement right after the last transaction of
+    the page; it is None on the last page.
+    """
+
+    __slots__ = ('transactions', 'cursor')
+
+    def __init__(self, transactions: List['Transaction'], cursor: Optional[str]):
+        self.transactions = transactions
+        self.cursor = cursor
+
+    def get_transactions(self) -> List['Transaction']:
+        return self.transactions
+
+    def get_cursor(self) -> Optional[str]:
+        return self.cursor
+
+    def has_next(self) -> bool:
+        return self.cursor is not None
+
+
+def encode_cursor(position: Tuple[int, int]) -> str:
+    """Encode a (timestamp, row) ledger position as an opaque cursor."""
+    return base64.urlsafe_b64encode(_CURSOR.pack(*position)).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """Decode a cursor made by encode_cursor into its (timestamp, row) ledger position."""
+    try:
+        return _CURSOR.unpack(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, struct.error, TypeError, ValueError):
+        raise BusinessException("exception.invalid.cursor")
@@ -3,7 +3,7 @@ Transaction classes for the banking system.
 """
 from abc import ABC
 from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from .current_account import CurrentAccount  
@@ -15,11 +15,16 @@ class Transaction(ABC):
     Abstract base class for all transactions.
     """
     
-    def __init__(self, location: 'OperationLocation', account: 'CurrentAccount', amount: float):
+    __slots__ = ('location', 'account', 'amount', 'date', 'row')
+    
+    def __init__(self, location: 'OperationLocation', account: 'CurrentAccount', amount: float,
+                 date: Optional[datetime] = None):
         self.location = location
         self.account = account
         self.amount = amount
-        self.date = datetime.now()
+        self.date = date if date is not None else datetime.now()
+        # Row of this transaction in the ledger of its account, if recorded
+        self.row = -1
     
     def get_account(self) -> 'CurrentAccount':
         return self.account
@@ -33,9 +38,14 @@ class Transaction(ABC):
     def get_location(self) -> 'OperationLocation':
         return self.location
     
+    def get_row(self) -> int:
+        return self.row
+    
     def set_date(self, date: datetime) -> None:
         """This method is here for initializing the database."""
+        old_date = self.date
         self.date = date
+        self.account._transaction_date_changed(self, old_date)
 
 
 class Deposit(Transaction):
@@ -43,8 +53,11 @@ class Deposit(Transaction):
     Deposit transaction.
     """
     
-    def __init__(self, location: 'OperationLocation', account: 'CurrentAccount', envelope: int, amount: float):
-        super().__init__(location, account, amount)
+    __slots__ = ('envelope',)
+    
+    def __init__(self, location: 'OperationLocation', account: 'CurrentAccount', envelope: int, amount: float,
+                 date: Optional[datetime] = None):
+        super().__init__(location, account, amount, date)
         self.envelope = envelope
     
     def get_envelope(self) -> int:
@@ -56,8 +69,11 @@ class Withdrawal(Transaction):
     Withdrawal transaction.
     """
     
-    def __init__(self, location: 'OperationLocation', account: 'CurrentAccount', amount: float):
-        super().__init__(location, account, amount)
+    __slots__ = ()
+    
+    def __init__(self, location: 'OperationLocation', account: 'CurrentAccount', amount: float,
+                 date: Optional[datetime] = None):
+        super().__init__(location, account, amount, date)
 
 
 class Transfer(Transaction):
@@ -65,10 +81,17 @@ class Transfer(Transaction):
     Transfer transaction.
     """
     
+    __slots__ = ('destination_account', 'destination_row')
+    
     def __init__(self, location: 'OperationLocation', account: 'CurrentAccount', 
-                 destination_account: 'CurrentAccount', amount: float):
-        super().__init__(location, account, amount)
+                 destination_account: 'CurrentAccount', amount: float, date: Optional[datetime] = None):
+        super().__init__(location, account, amount, date)
         self.destination_account = destination_account
+        # Row of this transfer in the ledger of the destination account, if recorded
+        self.destination_row = -1
     
     def get_destination_account(self) -> 'CurrentAccount':
-        return self.destination_account
\ No newline at end of file
+        return self.destination_account
+    
+    def get_destination_row(self) -> int:
+        return self.destination_row
\ No newline at end of file
@@ -11,6 +11,8 @@ class User(ABC):
     Abstract base class for users in the banking system.
     """
     
+    __slots__ = ('first_name', 'last_name', 'password', 'birthday')
+    
     def __init__(self, first_name: str, last_name: str, password: str, birthday: datetime):
         self.first_name = first_name
         self.last_name = last_name
@@ -0,0 +1,128 @@
+"""
+Bulk import of current accounts from CSV files.
+"""
+import csv
+import math
+from datetime import datetime
+from itertools import islice
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from ..business_exception import BusinessException
+from ..domain.operation_location import Branch
+from ...data.database import Database
+from ...util.random_string import RandomString
+
+
+class ImportSummary:
+    """
+    Number of accounts imported and of rows rejected by an import.
+    """
+
+    __slots__ = ('imported', 'failed')
+
+    def __init__(self, imported: int = 0, failed: int = 0):
+        self.imported = imported
+        self.failed = failed
+
+    def get_imported(self) -> int:
+        return self.imported
+
+    def get_failed(self) -> int:
+        return self.failed
+
+
+class AccountImporter:
+    """
+    Streaming importer of current accounts from CSV.
+
+    Input rows are "branch,first_name,last_name,cpf,birthday,balance", with
+    an optional header line and the birthday as YYYY-MM-DD. Opening balances
+    must be finite and not negative. The input is read
+    in chunks of chunk_size rows, so memory use does not grow with its size.
+    Each chunk is validated row by row, then every branch of the chunk gets
+    one block of account numbers and one bulk save.
+
+    For every input row, a line "line,branch,number,password,error" is
+    written to the output: the account number and generated password of the
+    new account, or the key of the error that rejected the row.
+    """
+
+    HEADER = ("branch", "first_name", "last_name", "cpf", "birthday", "balance")
+    OUTPUT_HEADER = ("line", "branch", "number", "password", "error")
+
+    def __init__(self, database: Database, chunk_size: int = 10000):
+        self.database = database
+        self.chunk_size = chunk_size
+        self.random = RandomString(8)
+        self._branches: Dict[int, Optional[Branch]] = {}
+
+    def import_csv(self, input_file: TextIO, output_file: TextIO) -> ImportSummary:
+        """Import the accounts of input_file, writing one result line per row to output_file."""
+        reader = csv.reader(input_file)
+        writer = csv.writer(output_file)
+        writer.writerow(self.OUTPUT_HEADER)
+        summary = ImportSummary()
+        line = 0
+        while True:
+            chunk = list(islice(reader, self.chunk_size))
+            if not chunk:
+                break
+            if line == 0 and chunk[0] and chunk[0][0].strip().lower() == self.HEADER[0]:
+                chunk = chunk[1:]
+                line = 1
+            writer.writerows(self._import_chunk(chunk, line + 1, summary))
+            line += len(chunk)
+        return summary
+
+    def _import_chunk(self, chunk: List[List[str]], first_line: int, summary: ImportSummary) -> List[tuple]:
+        """Import the rows of a chunk. Return their output lines, in input order."""
+        results: List[tuple] = []
+        by_branch: Dict[int, Tuple[Branch, List[int], List[tuple]]] = {}
+        for index, row in enumerate(chunk):
+            line = first_line + index
+            try:
+                branch, account_row = self._parse_row(row)
+            except BusinessException as e:
+                results.append((line, row[0] if row else "", "", "", str(e)))
+                summary.failed += 1
+                continue
+            _, indexes, rows = by_branch.setdefault(branch.get_number(), (branch, [], []))
+            indexes.append(index)
+            rows.append(account_row)
+            results.append(None)
+
+        for branch, indexes, rows in by_branch.values():
+            first_number = self.database.reserve_account_numbers(len(rows))
+            self.database.save_new_current_accounts(branch, first_number, rows)
+            for offset, (index, account_row) in enumerate(zip(indexes, rows)):
+                results[index] = (first_line + index, branch.get_number(), first_number + offset,
+                                  account_row[3], "")
+            summary.imported += len(rows)
+        return results
+
+    def _parse_row(self, row: List[str]) -> Tuple[Branch, tuple]:
+        """Validate a CSV row. Return its branch and the account row to save."""
+        if len(row) != len(self.HEADER):
+            raise BusinessException("exception.invalid.row")
+        branch_number, first_name, last_name, cpf, birthday, balance = row
+        try:
+            branch_number = int(branch_number)
+            cpf = int(cpf)
+            birthday = datetime.fromisoformat(birthday)
+            balance = float(balance)
+        except ValueError:
+            raise BusinessException("exception.invalid.row")
+        if not balance >= 0 or not math.isfinite(balance):
+            raise BusinessException("exception.invalid.amount")
+        return self._get_branch(branch_number), (first_name, last_name, cpf, self.random.next_string(),
+                                                 birthday, balance)
+
+    def _get_branch(self, number: int) -> Branch:
+        """Get a branch, validating each branch number once per import."""
+        if number not in self._branches:
+            operation_location = self.database.get_operation_location(number)
+            self._branches[number] = operation_location if isinstance(operation_location, Branch) else None
+        branch = self._branches[number]
+        if branch is None:
+            raise BusinessException("exception.invalid.branch")
+        return branch
@@ -0,0 +1,146 @@
+"""
+Asynchronous facade over the account operation service.
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import Executor
+from datetime import datetime
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from ..services import AccountOperationService
+from ..domain.batch_operation import BatchOperation, BatchResult
+from ..domain.current_account import CurrentAccount
+from ..domain.monthly_summary import MonthlySummary
+from ..domain.statement_page import StatementPage
+from ..domain.transaction import Transaction, Deposit, Withdrawal, Transfer
+
+
+class AsyncAccountOperationService:
+    """
+    Awaitable account operations for many concurrent sessions on one event loop.
+
+    Writes are serialized per account: each account with pending writes has
+    a queue, drained in order by a single task that exists only while the
+    queue is not empty. Transfers are queued on the source account; the
+    account locks keep the destination consistent. Reads run immediately.
+
+    Operations run on the given executor, or on the default executor of the
+    event loop, never on the loop thread: sessions do not block the loop
+    while waiting for account locks or write-ahead log durability.
+    """
+
+    def __init__(self, service: AccountOperationService, executor: Optional[Executor] = None):
+        self.service = service
+        self.executor = executor
+        self._queues: Dict[Tuple[int, int], Deque[Tuple[Callable, tuple, asyncio.Future]]] = {}
+        # The event loop only keeps weak references to tasks
+        self._drains: Set[asyncio.Task] = set()
+
+    async def login(self, branch: int, account_number: int, password: str) -> CurrentAccount:
+        """Client login."""
+        return await self._call(self.service.login, branch, account_number, password)
+
+    async def get_balance(self, branch: int, account_number: int) -> float:
+        """Get account balance."""
+        return await self._call(self.service.get_balance, branch, account_number)
+
+    async def get_balance_at(self, branch: int, account_number: int, when: datetime) -> float:
+        """Get the account balance right after the transactions dated up to when."""
+        return await self._call(self.service.get_balance_at, branch, account_number, when)
+
+    async def get_statement_by_date(self, branch: int, account_number: int,
+                                    begin: datetime, end: datetime) -> List[Transaction]:
+        """Get statement by date range."""
+        return await self._call(self.service.get_statement_by_date, branch, account_number, begin, end)
+
+    async def get_statement_by_month(self, branch: int, account_number: int,
+                                     month: int, year: int) -> List[Transaction]:
+        """Get statement by month."""
+        return await self._call(self.service.get_statement_by_month, branch, account_number, month, year)
+
+    async def iter_statement(self, branch: int, account_number: int, begin: datetime, end: datetime,
+                             page_size: int = 20, cursor: Optional[str] = None) -> AsyncIterator[StatementPage]:
+        """
+        Iterate over the statement of a date range, newest first, one page at a time.
+
+        Awaiting this call reports invalid arguments; the pages are then read
+        one at a time, with async for.
+        """
+        pages = await self._call(self.service.iter_statement, branch, account_number, begin, end, page_size, cursor)
+        return self._iter_pages(pages)
+
+    async def get_monthly_summary(self, branch: int, account_number: int,
+                                  month: int, year: int) -> MonthlySummary:
+        """Get the totals and opening and closing balances of a month."""
+        return await self._call(self.service.get_monthly_summary, branch, account_number, month, year)
+
+    async def deposit(self, operation_location: int, branch: int, account_number: int,
+                      envelope: int, amount: float, idempotency_key: Optional[str] = None) -> Deposit:
+        """Perform a deposit operation."""
+        return await self._write((branch, account_number), self.service.deposit,
+                                 operation_location, branch, account_number, envelope, amount, idempotency_key)
+
+    async def withdrawal(self, operation_location: int, branch: int, account_number: int,
+                         amount: float, idempotency_key: Optional[str] = None) -> Withdrawal:
+        """Perform a withdrawal operation."""
+        return await self._write((branch, account_number), self.service.withdrawal,
+                                 operation_location, branch, account_number, amount, idempotency_key)
+
+    async def transfer(self, operation_location: int, src_branch: int, src_account_number: int,
+                       dst_branch: int, dst_account_number: int, amount: float,
+                       idempotency_key: Optional[str] = None) -> Transfer:
+        """Perform a transfer operation."""
+        return await self._write((src_branch, src_account_number), self.service.transfer,
+                                 operation_location, src_branch, src_account_number,
+                                 dst_branch, dst_account_number, amount, idempotency_key)
+
+    async def apply_batch(self, operations: List[BatchOperation], atomic: bool = False,
+                          idempotency_key: Optional[str] = None) -> List[BatchResult]:
+        """Perform a batch of deposits, withdrawals and transfers, in order."""
+        return await self._call(self.service.apply_batch, operations, atomic, idempotency_key)
+
+    def get_pending_accounts(self) -> int:
+        """Get the number of accounts with queued writes."""
+        return len(self._queues)
+
+    async def _write(self, key: Tuple[int, int], function: Callable, *args: Any) -> Any:
+        """Queue a write on the account identified by key and wait for its result."""
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            task = asyncio.ensure_future(self._drain(key, queue))
+            self._drains.add(task)
+            task.add_done_callback(self._drains.discard)
+        queue.append((function, args, future))
+        return await future
+
+    async def _drain(self, key: Tuple[int, int], queue: Deque[Tuple[Callable, tuple, asyncio.Future]]) -> None:
+        """Run the queued writes of an account in order, then drop its queue."""
+        try:
+            while queue:
+                function, args, future = queue.popleft()
+                if future.cancelled():
+                    continue
+                try:
+                    result = await self._call(function, *args)
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+        finally:
+            del self._queues[key]
+
+    async def _iter_pages(self, pages: Iterator[StatementPage]) -> AsyncIterator[StatementPage]:
+        """Read the pages of a statement on the executor."""
+        while True:
+            page = await self._call(next, pages, None)
+            if page is None:
+                return
+            yield page
+
+    async def _call(self, function: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(function, *args))
@@ -0,0 +1,122 @@
+"""
+Policies choosing the ATM that serves an operation.
+"""
+import heapq
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..domain.operation_location import ATM
+from ...data.database import Database
+
+
+class ATMSelector(ABC):
+    """
+    Chooses an ATM of the database for each operation.
+
+    ATMs saved after the selector was created are picked up by the next
+    selection. select returns None when the database has no ATM.
+    """
+
+    def __init__(self, database: Database):
+        self.database = database
+        self._lock = threading.Lock()
+        self._atm_count = -1
+
+    @abstractmethod
+    def select(self) -> Optional[ATM]:
+        """Choose the ATM of the next operation."""
+        pass
+
+    def release(self, atm: ATM) -> None:
+        """Report that an operation started on atm with select has finished."""
+        pass
+
+    @contextmanager
+    def selected(self) -> Iterator[Optional[ATM]]:
+        """Choose an ATM for the duration of the block, releasing it at the end."""
+        atm = self.select()
+        try:
+            yield atm
+        finally:
+            if atm is not None:
+                self.release(atm)
+
+    def _atms_changed(self) -> bool:
+        """Check, in O(1), whether ATMs were saved since the last call. Must hold the lock."""
+        count = len(self.database.get_atms())
+        if count == self._atm_count:
+            return False
+        self._atm_count = count
+        return True
+
+
+class RoundRobinATMSelector(ATMSelector):
+    """
+    Cycles through the ATMs in number order.
+    """
+
+    def __init__(self, database: Database):
+        super().__init__(database)
+        self._atms: List[ATM] = []
+        self._next = 0
+
+    def select(self) -> Optional[ATM]:
+        with self._lock:
+            if self._atms_changed():
+                self._atms = sorted(self.database.get_atms(), key=ATM.get_number)
+            if not self._atms:
+                return None
+            atm = self._atms[self._next % len(self._atms)]
+            self._next += 1
+            return atm
+
+
+class LeastLoadedATMSelector(ATMSelector):
+    """
+    Chooses the ATM with the fewest operations in progress.
+
+    Loads are kept in a heap, so select and release cost O(log n) amortized.
+    Entries made stale by a load change stay in the heap until they reach
+    its top, or until the heap is rebuilt.
+    """
+
+    def __init__(self, database: Database):
+        super().__init__(database)
+        self._loads: Dict[int, int] = {}
+        self._heap: List[Tuple[int, int]] = []
+
+    def select(self) -> Optional[ATM]:
+        with self._lock:
+            if self._atms_changed():
+                for atm in self.database.get_atms():
+                    number = atm.get_number()
+                    if number not in self._loads:
+                        self._loads[number] = 0
+                        heapq.heappush(self._heap, (0, number))
+            while self._heap:
+                load, number = self._heap[0]
+                if self._loads.get(number) == load:
+                    break
+                heapq.heappop(self._heap)
+            else:
+                return None
+            self._loads[number] = load + 1
+            heapq.heapreplace(self._heap, (load + 1, number))
+            return self.database.get_operation_location(number)
+
+    def release(self, atm: ATM) -> None:
+        with self._lock:
+            number = atm.get_number()
+            if self._loads.get(number, 0) > 0:
+                self._loads[number] -= 1
+                heapq.heappush(self._heap, (self._loads[number], number))
+                if len(self._heap) > 4 * len(self._loads):
+                    # Drop the stale entries
+                    self._heap = [(load, number) for number, load in self._loads.items()]
+                    heapq.heapify(self._heap)
+
+    def get_load(self, atm: ATM) -> int:
+        """Get the number of operations in progress on atm."""
+        return self._loads.get(atm.get_number(), 0)
@@ -0,0 +1,121 @@
+"""
+Bounded cache of operation results by idempotency key.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from ..business_exception import BusinessException
+from ..domain.batch_operation import BatchOperation
+
+# Results kept, at most (about 50 MB when full), and for how long (seconds)
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_TTL = 24 * 60 * 60.0
+
+
+class IdempotencyCache:
+    """
+    Results of completed operations, by idempotency key, kept for ttl seconds and max_entries at most.
+
+    Every entry lives for the same time, so insertion order is also expiry
+    order: entries are kept in an OrderedDict, expired ones are dropped from
+    its front, and the oldest one is evicted when the cache is full. Lookups
+    and insertions cost O(1) amortized, and memory stays bounded by
+    max_entries however many keys are seen.
+
+    Keys are only kept in memory, about 0.5 KB each with a transaction as
+    the result, so a full cache of the default size takes about 50 MB, and
+    a restart forgets every key. The default covers a day of keys at about
+    one keyed call per second; a busier server passes a larger max_entries,
+    e.g. 5 million (about 2.5 GB) for 58 calls per second, and shares one
+    cache between its services. When more keys than max_entries arrive
+    within ttl, the oldest are evicted early and a retry of one of them is
+    applied again; get_evictions counts them, so the size can be raised
+    before that happens.
+
+    An entry remembers the request it answered, and reusing its key for a
+    different request raises BusinessException. Failed operations are not
+    cached, since they changed nothing: their retries run again. A retry
+    arriving while the operation of its key is still running waits for its
+    outcome.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_entries < 1 or ttl <= 0:
+            raise ValueError("max_entries and ttl must be positive")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        # Key -> (expiry time, request, result), oldest first
+        self._entries: 'OrderedDict[Hashable, Tuple[float, tuple, Any]]' = OrderedDict()
+        # Key -> request of the operations running
+        self._running: Dict[Hashable, tuple] = {}
+        self._lock = threading.Lock()
+        # Notified whenever a running operation completes
+        self._completed = threading.Condition(self._lock)
+        self.hits = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_hits(self) -> int:
+        """Get the number of calls answered from the cache."""
+        return self.hits
+
+    def get_evictions(self) -> int:
+        """Get the number of entries evicted by size before they expired."""
+        return self.evictions
+
+    def run(self, key: Hashable, request: tuple, function: Callable, *args: Any) -> Any:
+        """
+        Call function with args, unless key already has a result for request, which is then returned.
+
+        request describes the call, e.g. the method name and arguments.
+        """
+        with self._lock:
+            while True:
+                self._expire(self.clock())
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if entry[1] != request:
+                        raise BusinessException("exception.idempotency.key.reused")
+                    self.hits += 1
+                    return entry[2]
+                running = self._running.get(key)
+                if running is None:
+                    break
+                if running != request:
+                    raise BusinessException("exception.idempotency.key.reused")
+                self._completed.wait()
+            self._running[key] = request
+
+        try:
+            result = function(*args)
+        except BaseException:
+            with self._lock:
+                del self._running[key]
+                self._completed.notify_all()
+            raise
+        with self._lock:
+            del self._running[key]
+            self._entries[key] = (self.clock() + self.ttl, request, result)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._completed.notify_all()
+        return result
+
+    def _expire(self, now: float) -> None:
+        """Drop the expired entries. Must hold the lock."""
+        entries = self._entries
+        while entries and next(iter(entries.values()))[0] <= now:
+            entries.popitem(last=False)
+
+
+def batch_request(operations: List[BatchOperation], atomic: bool) -> tuple:
+    """Describe a batch as a request of the cache."""
+    return ("apply_batch", atomic) + tuple(tuple(getattr(operation, slot) for slot in BatchOperation.__slots__)
+                                          for operation in operations)
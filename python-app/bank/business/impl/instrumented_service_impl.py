@@ -0,0 +1,136 @@
+"""
+Services recording the latency and outcome of every call.
+"""
+from datetime import datetime
+from time import perf_counter_ns
+from typing import Any, Callable, Iterator, List, Optional
+
+from ..business_exception import BusinessException
+from ..services import AccountManagementService, AccountOperationService
+from ..domain.batch_operation import BatchOperation, BatchResult
+from ..domain.current_account import CurrentAccount
+from ..domain.employee import Employee
+from ..domain.monthly_summary import MonthlySummary
+from ..domain.statement_page import StatementPage
+from ..domain.transaction import Transaction, Deposit, Withdrawal, Transfer
+from ...util.metrics import MetricsRegistry
+
+
+class _Instrumented:
+    """
+    Times the calls made through _timed into the histograms of a registry.
+    """
+
+    SERVICE = ""
+
+    def __init__(self, registry: MetricsRegistry, methods: tuple):
+        self.registry = registry
+        # Histograms of successful calls, resolved once
+        self._ok = {method: registry.histogram(self.SERVICE, method, "ok") for method in methods}
+
+    def _timed(self, method: str, function: Callable, *args: Any) -> Any:
+        start = perf_counter_ns()
+        try:
+            result = function(*args)
+        except BusinessException as e:
+            self.registry.histogram(self.SERVICE, method, str(e)).record(perf_counter_ns() - start)
+            raise
+        except Exception:
+            self.registry.histogram(self.SERVICE, method, "exception.internal").record(perf_counter_ns() - start)
+            raise
+        self._ok[method].record(perf_counter_ns() - start)
+        return result
+
+
+class InstrumentedAccountOperationService(_Instrumented, AccountOperationService):
+    """
+    AccountOperationService recording each call in a MetricsRegistry, under the service name "operation".
+    """
+
+    SERVICE = "operation"
+    METHODS = ("deposit", "get_balance", "get_balance_at", "get_statement_by_date", "get_statement_by_month",
+               "iter_statement", "iter_statement.page", "get_monthly_summary", "login", "transfer", "withdrawal", "apply_batch")
+
+    def __init__(self, service: AccountOperationService, registry: MetricsRegistry):
+        super().__init__(registry, self.METHODS)
+        self.service = service
+
+    def deposit(self, operation_location: int, branch: int, account_number: int,
+                envelope: int, amount: float, idempotency_key: Optional[str] = None) -> Deposit:
+        return self._timed("deposit", self.service.deposit, operation_location, branch, account_number,
+                           envelope, amount, idempotency_key)
+
+    def get_balance(self, branch: int, account_number: int) -> float:
+        return self._timed("get_balance", self.service.get_balance, branch, account_number)
+
+    def get_balance_at(self, branch: int, account_number: int, when: datetime) -> float:
+        return self._timed("get_balance_at", self.service.get_balance_at, branch, account_number, when)
+
+    def get_statement_by_date(self, branch: int, account_number: int,
+                              begin: datetime, end: datetime) -> List[Transaction]:
+        return self._timed("get_statement_by_date", self.service.get_statement_by_date, branch,
+                           account_number, begin, end)
+
+    def get_statement_by_month(self, branch: int, account_number: int,
+                               month: int, year: int) -> List[Transaction]:
+        return self._timed("get_statement_by_month", self.service.get_statement_by_month, branch,
+                           account_number, month, year)
+
+    def iter_statement(self, branch: int, account_number: int, begin: datetime, end: datetime,
+                       page_size: int = 20, cursor: Optional[str] = None) -> Iterator[StatementPage]:
+        """Iterate over the statement, recording the time to start it and, as iter_statement.page, each page."""
+        pages = self._timed("iter_statement", self.service.iter_statement, branch, account_number,
+                            begin, end, page_size, cursor)
+        return self._iter_pages(pages)
+
+    def get_monthly_summary(self, branch: int, account_number: int,
+                            month: int, year: int) -> MonthlySummary:
+        return self._timed("get_monthly_summary", self.service.get_monthly_summary, branch,
+                           account_number, month, year)
+
+    def login(self, branch: int, account_number: int, password: str) -> CurrentAccount:
+        return self._timed("login", self.service.login, branch, account_number, password)
+
+    def transfer(self, operation_location: int, src_branch: int, src_account_number: int,
+                 dst_branch: int, dst_account_number: int, amount: float,
+                 idempotency_key: Optional[str] = None) -> Transfer:
+        return self._timed("transfer", self.service.transfer, operation_location, src_branch,
+                           src_account_number, dst_branch, dst_account_number, amount, idempotency_key)
+
+    def withdrawal(self, operation_location: int, branch: int, account_number: int,
+                   amount: float, idempotency_key: Optional[str] = None) -> Withdrawal:
+        return self._timed("withdrawal", self.service.withdrawal, operation_location, branch,
+                           account_number, amount, idempotency_key)
+
+    def apply_batch(self, operations: List[BatchOperation], atomic: bool = False,
+                    idempotency_key: Optional[str] = None) -> List[BatchResult]:
+        return self._timed("apply_batch", self.service.apply_batch, operations, atomic, idempotency_key)
+
+    def _iter_pages(self, pages: Iterator[StatementPage]) -> Iterator[StatementPage]:
+        while True:
+            page = self._timed("iter_statement.page", next, pages, None)
+            if page is None:
+                return
+            yield page
+
+
+class InstrumentedAccountManagementService(_Instrumented, AccountManagementService):
+    """
+    AccountManagementService recording each call in a MetricsRegistry, under the service name "management".
+    """
+
+    SERVICE = "management"
+    METHODS = ("create_current_account", "login")
+
+    def __init__(self, service: AccountManagementService, registry: MetricsRegistry):
+        super().__init__(registry, self.METHODS)
+        self.service = service
+
+    def create_current_account(self, branch: int, name: str, last_name: str,
+                               cpf: int, birthday: datetime, balance: float,
+                               idempotency_key: Optional[str] = None) -> CurrentAccount:
+        return self._timed("create_current_account", self.service.create_current_account, branch, name,
+                           last_name, cpf, birthday, balance, idempotency_key)
+
+    def login(self, username: str, password: str) -> Employee:
+        return self._timed("login", self.service.login, username, password)
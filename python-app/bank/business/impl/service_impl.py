@@ -2,17 +2,20 @@
 Implementation of business services.
 """
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from calendar import monthrange
 
 from ..business_exception import BusinessException
 from ..services import AccountManagementService, AccountOperationService
+from ..domain.batch_operation import BatchOperation, BatchResult
 from ..domain.employee import Employee
 from ..domain.client import Client
 from ..domain.current_account import CurrentAccount
-from ..domain.current_account_id import CurrentAccountId
+from ..domain.monthly_summary import MonthlySummary
 from ..domain.operation_location import Branch, OperationLocation
+from ..domain.statement_page import StatementPage, decode_cursor, encode_cursor
 from ..domain.transaction import Transaction, Deposit, Withdrawal, Transfer
+from .idempotency import IdempotencyCache, batch_request
 from ...data.database import Database
 from ...util.random_string import RandomString
 
@@ -20,15 +23,23 @@ from ...util.random_string import RandomString
 class AccountManagementServiceImpl(AccountManagementService):
     """
     Implementation of AccountManagementService.
+    
+    Results of calls with an idempotency key are kept in idempotency_cache.
     """
     
-    def __init__(self, database: Database):
+    def __init__(self, database: Database, idempotency_cache: Optional[IdempotencyCache] = None):
         self.database = database
         self.random = RandomString(8)
+        self.idempotency_cache = idempotency_cache if idempotency_cache is not None else IdempotencyCache()
     
     def create_current_account(self, branch: int, name: str, last_name: str, 
-                             cpf: int, birthday: datetime, balance: float) -> CurrentAccount:
+                             cpf: int, birthday: datetime, balance: float,
+                             idempotency_key: Optional[str] = None) -> CurrentAccount:
         """Create a new current account."""
+        if idempotency_key is not None:
+            request = ("create_current_account", branch, name, last_name, cpf, birthday, balance)
+            return self.idempotency_cache.run(idempotency_key, request, self.create_current_account,
+                                              *request[1:])
         operation_location = self.database.get_operation_location(branch)
         if operation_location is None or not isinstance(operation_location, Branch):
             raise BusinessException("exception.invalid.branch")
@@ -59,14 +70,20 @@ class AccountManagementServiceImpl(AccountManagementService):
 class AccountOperationServiceImpl(AccountOperationService):
     """
     Implementation of AccountOperationService.
+    
+    Results of calls with an idempotency key are kept in idempotency_cache.
     """
     
-    def __init__(self, database: Database):
+    def __init__(self, database: Database, idempotency_cache: Optional[IdempotencyCache] = None):
         self.database = database
+        self.idempotency_cache = idempotency_cache if idempotency_cache is not None else IdempotencyCache()
     
     def deposit(self, operation_location: int, branch: int, account_number: int, 
-               envelope: int, amount: float) -> Deposit:
+               envelope: int, amount: float, idempotency_key: Optional[str] = None) -> Deposit:
         """Perform a deposit operation."""
+        if idempotency_key is not None:
+            return self._idempotent(idempotency_key, "deposit", operation_location, branch, account_number,
+                                    envelope, amount)
         current_account = self._read_current_account(branch, account_number)
         deposit = current_account.deposit(
             self._get_operation_location(operation_location), 
@@ -79,6 +96,10 @@ class AccountOperationServiceImpl(AccountOperationService):
         """Get account balance."""
         return self._read_current_account(branch, account_number).get_balance()
     
+    def get_balance_at(self, branch: int, account_number: int, when: datetime) -> float:
+        """Get the account balance right after the transactions dated up to when."""
+        return self._read_current_account(branch, account_number).get_balance_at(when)
+    
     def get_statement_by_date(self, branch: int, account_number: int, 
                             begin: datetime, end: datetime) -> List[Transaction]:
         """Get statement by date range."""
@@ -97,6 +118,27 @@ class AccountOperationServiceImpl(AccountOperationService):
         
         return self._get_statement_by_date(current_account, first_day, last_day)
     
+    def iter_statement(self, branch: int, account_number: int, begin: datetime, end: datetime,
+                       page_size: int = 20, cursor: Optional[str] = None) -> Iterator[StatementPage]:
+        """
+        Iterate over the statement of a date range, newest first, one page at a time.
+        
+        Only one page of transactions is materialized at a time, and the
+        account is only locked while a page is read. Invalid arguments are
+        reported by this call, before any page is read.
+        """
+        if page_size < 1:
+            raise BusinessException("exception.invalid.page.size")
+        current_account = self._read_current_account(branch, account_number)
+        position = decode_cursor(cursor) if cursor is not None else None
+        return self._iter_statement(current_account, begin, end, page_size, position)
+    
+    def get_monthly_summary(self, branch: int, account_number: int, 
+                            month: int, year: int) -> MonthlySummary:
+        """Get the totals and opening and closing balances of a month."""
+        current_account = self._read_current_account(branch, account_number)
+        return current_account.get_monthly_summary(year, month)
+    
     def login(self, branch: int, account_number: int, password: str) -> CurrentAccount:
         """Client login."""
         current_account = self._read_current_account(branch, account_number)
@@ -106,8 +148,12 @@ class AccountOperationServiceImpl(AccountOperationService):
         return current_account
     
     def transfer(self, operation_location: int, src_branch: int, src_account_number: int,
-                dst_branch: int, dst_account_number: int, amount: float) -> Transfer:
+                dst_branch: int, dst_account_number: int, amount: float,
+                idempotency_key: Optional[str] = None) -> Transfer:
         """Perform a transfer operation."""
+        if idempotency_key is not None:
+            return self._idempotent(idempotency_key, "transfer", operation_location, src_branch,
+                                    src_account_number, dst_branch, dst_account_number, amount)
         source = self._read_current_account(src_branch, src_account_number)
         destination = self._read_current_account(dst_branch, dst_account_number)
         
@@ -119,8 +165,11 @@ class AccountOperationServiceImpl(AccountOperationService):
         return transfer
     
     def withdrawal(self, operation_location: int, branch: int, account_number: int, 
-                  amount: float) -> Withdrawal:
+                  amount: float, idempotency_key: Optional[str] = None) -> Withdrawal:
         """Perform a withdrawal operation."""
+        if idempotency_key is not None:
+            return self._idempotent(idempotency_key, "withdrawal", operation_location, branch, account_number,
+                                    amount)
         current_account = self._read_current_account(branch, account_number)
         withdrawal = current_account.withdrawal(
             self._get_operation_location(operation_location), 
@@ -128,11 +177,126 @@ class AccountOperationServiceImpl(AccountOperationService):
         )
         return withdrawal
     
+    def apply_batch(self, operations: List[BatchOperation], atomic: bool = False,
+                    idempotency_key: Optional[str] = None) -> List[BatchResult]:
+        """
+        Perform a batch of deposits, withdrawals and transfers, in order.
+        
+        Accounts and operation locations are resolved once per batch, and
+        every operation is validated before any is applied. The accounts of
+        the batch stay locked while it runs, and write-ahead log durability
+        is waited for once, at the end.
+        
+        Each operation gets a result with its transaction or the key of the
+        error that prevented it. When atomic is true, the batch is applied
+        only if every operation would succeed; otherwise nothing is applied
+        and the operations that would have succeeded fail with
+        "exception.batch.aborted".
+        """
+        if idempotency_key is not None:
+            return self.idempotency_cache.run(idempotency_key, batch_request(operations, atomic),
+                                              self.apply_batch, operations, atomic)
+        accounts: Dict[Tuple[int, int], Optional[CurrentAccount]] = {}
+        locations: Dict[int, Optional[OperationLocation]] = {}
+        resolved = []
+        errors: List[Optional[str]] = []
+        for operation in operations:
+            try:
+                resolved.append(self._resolve_batch_operation(operation, accounts, locations))
+                errors.append(None)
+            except BusinessException as e:
+                resolved.append(None)
+                errors.append(str(e))
+        
+        results = []
+        with CurrentAccount.locked(*(account for account in accounts.values() if account is not None)):
+            if atomic:
+                errors = self._check_batch_balances(resolved, errors)
+                if any(error is not None for error in errors):
+                    return [BatchResult(index, error=error or "exception.batch.aborted")
+                            for index, error in enumerate(errors)]
+            for index, (item, error) in enumerate(zip(resolved, errors)):
+                if error is not None:
+                    results.append(BatchResult(index, error=error))
+                    continue
+                try:
+                    results.append(BatchResult(index, self._apply_batch_operation(item)))
+                except BusinessException as e:
+                    results.append(BatchResult(index, error=str(e)))
+        return results
+    
+    def _resolve_batch_operation(self, operation: BatchOperation,
+                                 accounts: Dict[Tuple[int, int], Optional[CurrentAccount]],
+                                 locations: Dict[int, Optional[OperationLocation]]) -> tuple:
+        """Validate a batch operation and resolve its location and accounts through the batch caches."""
+        kind = operation.get_kind()
+        if kind not in (BatchOperation.DEPOSIT, BatchOperation.WITHDRAWAL, BatchOperation.TRANSFER):
+            raise BusinessException("exception.invalid.operation")
+        if not operation.get_amount() > 0:
+            raise BusinessException("exception.invalid.amount")
+        if kind == BatchOperation.DEPOSIT and operation.get_envelope() is None:
+            raise BusinessException("exception.invalid.envelope")
+        
+        number = operation.get_operation_location()
+        if number not in locations:
+            locations[number] = self.database.get_operation_location(number)
+        location = locations[number]
+        if location is None:
+            raise BusinessException("exception.invalid.operation.location")
+        
+        source = self._read_batch_account(operation.get_branch(), operation.get_account_number(), accounts)
+        destination = None
+        if kind == BatchOperation.TRANSFER:
+            destination = self._read_batch_account(operation.get_dst_branch(),
+                                                   operation.get_dst_account_number(), accounts)
+        return operation, location, source, destination
+    
+    def _read_batch_account(self, branch: int, account_number: int,
+                            accounts: Dict[Tuple[int, int], Optional[CurrentAccount]]) -> CurrentAccount:
+        key = (branch, account_number)
+        if key not in accounts:
+            accounts[key] = self.database.find_current_account(branch, account_number)
+        current_account = accounts[key]
+        if current_account is None:
+            raise BusinessException("exception.inexistent.account")
+        return current_account
+    
+    def _check_batch_balances(self, resolved: list, errors: List[Optional[str]]) -> List[Optional[str]]:
+        """Replay the balance effects of a batch, returning the errors with insufficient balances added."""
+        balances: Dict[CurrentAccount, float] = {}
+        checked = []
+        for item, error in zip(resolved, errors):
+            if error is None:
+                operation, _, source, destination = item
+                amount = operation.get_amount()
+                balance = balances.get(source, source.get_balance())
+                if operation.get_kind() == BatchOperation.DEPOSIT:
+                    balances[source] = balance + amount
+                elif amount > balance:
+                    error = "exception.insufficient.balance"
+                else:
+                    balances[source] = balance - amount
+                    if destination is not None:
+                        balances[destination] = balances.get(destination, destination.get_balance()) + amount
+            checked.append(error)
+        return checked
+    
+    def _apply_batch_operation(self, item: tuple) -> Transaction:
+        operation, location, source, destination = item
+        kind = operation.get_kind()
+        if kind == BatchOperation.DEPOSIT:
+            return source.deposit(location, operation.get_envelope(), operation.get_amount())
+        if kind == BatchOperation.WITHDRAWAL:
+            return source.withdrawal(location, operation.get_amount())
+        return source.transfer(location, destination, operation.get_amount())
+    
+    def _idempotent(self, idempotency_key: str, method: str, *args: Any) -> Any:
+        """Call a method at most once per idempotency key, returning the first result to retries."""
+        return self.idempotency_cache.run(idempotency_key, (method,) + args, getattr(self, method), *args)
+    
     def _read_current_account(self, branch: int, account_number: int) -> CurrentAccount:
         """Read current account by branch and account number."""
-        account_id = CurrentAccountId(Branch(branch), account_number)
-        current_account = self.database.get_current_account(account_id)
-        
+        current_account = self.database.find_current_account(branch, account_number)
         if current_account is None:
             raise BusinessException("exception.inexistent.account")
         
@@ -147,12 +311,14 @@ class AccountOperationServiceImpl(AccountOperationService):
     
     def _get_statement_by_date(self, current_account: CurrentAccount, 
                              begin: datetime, end: datetime) -> List[Transaction]:
-        """Get transactions by date range."""
-        transactions = current_account.get_transactions()
-        filtered_transactions = [
-            t for t in transactions 
-            if begin <= t.get_date() <= end
-        ]
-        # Sort by date descending
-        filtered_transactions.sort(key=lambda t: t.get_date(), reverse=True)
-        return filtered_transactions
\ No newline at end of file
+        """Get transactions by date range, sorted by date descending."""
+        return current_account.get_transactions_by_date(begin, end)
+    
+    def _iter_statement(self, current_account: CurrentAccount, begin: datetime, end: datetime,
+                        page_size: int, position: Optional[Tuple[int, int]]) -> Iterator[StatementPage]:
+        """Produce the pages of a statement, starting after a ledger position."""
+        while True:
+            transactions, position = current_account.get_statement_page(begin, end, page_size, position)
+            yield StatementPage(transactions, encode_cursor(position) if position is not None else None)
+            if position is None:
+                return
@@ -0,0 +1,772 @@
+"""
+Account operations sharded by branch across worker processes.
+"""
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from ..business_exception import BusinessException
+from ..services import AccountOperationService
+from ..domain.batch_operation import BatchOperation, BatchResult
+from ..domain.client import Client
+from ..domain.current_account import CurrentAccount
+from ..domain.monthly_summary import MonthlySummary
+from ..domain.operation_location import Branch, ATM, OperationLocation
+from ..domain.statement_page import StatementPage
+from ..domain.transaction import Transaction, Deposit, Withdrawal, Transfer
+from .idempotency import IdempotencyCache, batch_request
+from .service_impl import AccountOperationServiceImpl
+from ...data.database import Database
+
+
+# Accounts sent to a worker per message when the shards are loaded
+_LOAD_CHUNK = 10000
+
+# File of the branch assignment, in the write-ahead log directory
+_ASSIGNMENT_FILE = "shards.json"
+
+# Notes about transfers between shards, delivered with the next request to a shard
+_SETTLE = "settle"
+_FORGET = "forget"
+
+
+class ShardedAccountOperationService(AccountOperationService):
+    """
+    Account operations served by worker processes, each owning the accounts of some branches.
+
+    Every worker is a spawned process with its own in-memory Database,
+    sent every operation location and the accounts of its branches, with
+    their transaction history, so operations on different shards run in
+    parallel on different cores. Calls are routed by branch number; batches
+    are split by shard and the parts run concurrently. Accounts created in database after the
+    workers were loaded are sent to the shard of their branch the first time
+    they are routed; like the account services number them, their numbers
+    must be above those of the accounts loaded at startup.
+
+    database is only read: the operations are applied by the workers. With
+    a write-ahead log directory, each worker logs them to its own log there,
+    and replays it over the accounts loaded from database when restarted
+    with the same directory. The branch assignment is kept in the directory
+    too, so every branch is served by the shard holding its log.
+
+    A transfer between shards runs in two steps: the source shard debits
+    the source account (transfer_out), then the destination shard credits
+    the destination account (transfer_in) with the same date. If the credit
+    fails, for any reason, the source is refunded with a compensating
+    transfer_in; if the refund fails too, BusinessException
+    exception.transfer.compensation.failed is raised, chained to its error.
+    The compensation does not cover a router that dies between the steps:
+    that is what the shard logs are for. Both steps are logged with the id
+    of the transfer, and the source log keeps it pending until the credit is
+    confirmed, on the next request to the source shard. When the router is
+    restarted with the same log directory, the transfers still pending are
+    settled: credited unless the destination log already shows the credit,
+    or refunded if the destination account cannot be credited. Without a
+    log directory, a transfer interrupted by a crash is lost, like every
+    other operation.
+
+    Results are detached copies, sent as plain tuples and rebuilt by the
+    router: accounts carry their balance at the time of the call but no
+    transaction history. Idempotency keys are resolved by the router, in
+    idempotency_cache, so a retried transfer between shards is not sent to
+    either of them.
+    """
+
+    def __init__(self, database: Database, workers: Optional[int] = None,
+                 idempotency_cache: Optional[IdempotencyCache] = None, wal_directory: Optional[str] = None):
+        """
+        Start the workers and load them with the locations and accounts of database.
+
+        Account balances, client data and transaction history are copied.
+        When wal_directory is given, every worker then replays and appends
+        to its own write-ahead log there.
+        """
+        self.database = database
+        self.idempotency_cache = idempotency_cache if idempotency_cache is not None else IdempotencyCache()
+        self.wal_directory = wal_directory
+        # Guards the registration of branches and accounts created after startup
+        self._lock = threading.Lock()
+        assignment = self._read_assignment()
+        if assignment is not None and workers is not None and workers != assignment["workers"]:
+            raise ValueError(f"the shard logs in {wal_directory} were written by {assignment['workers']} workers")
+        branches = sorted(branch.get_number() for branch in database.get_branches())
+        if assignment is not None:
+            worker_count = assignment["workers"]
+        else:
+            worker_count = workers or max(min(len(branches), os.cpu_count() or 1), 1)
+        self._shards = [_Shard(database) for _ in range(worker_count)]
+        self._shard_of_branch: Dict[int, _Shard] = {}
+        if assignment is not None:
+            for branch, index in assignment["branches"].items():
+                self._shard_of_branch[int(branch)] = self._shards[index]
+        for branch in branches:
+            if branch not in self._shard_of_branch:
+                self._assign_branch(branch)
+        self._write_assignment()
+
+        self._locations: Set[int] = set()
+        self._send_locations()
+
+        # Accounts numbered from _first_new_number on are registered with their shard when first routed
+        self._first_new_number = 1
+        self._registered: Set[Tuple[int, int]] = set()
+        pending: Dict[_Shard, list] = {}
+        for current_account in database.get_all_current_accounts():
+            account_id = current_account.get_id()
+            self._first_new_number = max(self._first_new_number, account_id.get_number() + 1)
+            shard = self._shard_of_branch[account_id.get_branch().get_number()]
+            rows = pending.setdefault(shard, [])
+            rows.append(_account_row(current_account))
+            if len(rows) >= _LOAD_CHUNK:
+                shard.call("load_accounts", rows)
+                pending[shard] = []
+        for shard, rows in pending.items():
+            if rows:
+                shard.call("load_accounts", rows)
+
+        if wal_directory is not None:
+            for index, shard in enumerate(self._shards):
+                shard.call("attach_wal", os.path.join(wal_directory, f"shard-{index}.wal"))
+            self._settle_open_transfers()
+
+    def close(self) -> None:
+        """Deliver the queued transfer confirmations, then stop the worker processes."""
+        # Settling on a source shard queues the matching note on the destination shard
+        for _ in range(2):
+            for shard in self._shards:
+                shard.flush_notes()
+        for shard in self._shards:
+            shard.close()
+
+    def get_worker_count(self) -> int:
+        return len(self._shards)
+
+    def deposit(self, operation_location: int, branch: int, account_number: int,
+                envelope: int, amount: float, idempotency_key: Optional[str] = None) -> Deposit:
+        """Perform a deposit operation."""
+        if idempotency_key is not None:
+            return self._idempotent(idempotency_key, "deposit", operation_location, branch, account_number,
+                                    envelope, amount)
+        return self._shard(branch, account_number).call("deposit", operation_location, branch, account_number, envelope, amount)
+
+    def get_balance(self, branch: int, account_number: int) -> float:
+        """Get account balance."""
+        return self._shard(branch, account_number).call("get_balance", branch, account_number)
+
+    def get_balance_at(self, branch: int, account_number: int, when: datetime) -> float:
+        """Get the account balance right after the transactions dated up to when."""
+        return self._shard(branch, account_number).call("get_balance_at", branch, account_number, when)
+
+    def get_statement_by_date(self, branch: int, account_number: int,
+                              begin: datetime, end: datetime) -> List[Transaction]:
+        """Get statement by date range."""
+        return self._shard(branch, account_number).call("get_statement_by_date", branch, account_number, begin, end)
+
+    def get_statement_by_month(self, branch: int, account_number: int,
+                               month: int, year: int) -> List[Transaction]:
+        """Get statement by month."""
+        return self._shard(branch, account_number).call("get_statement_by_month", branch, account_number, month, year)
+
+    def iter_statement(self, branch: int, account_number: int, begin: datetime, end: datetime,
+                       page_size: int = 20, cursor: Optional[str] = None) -> Iterator[StatementPage]:
+        """Iterate over the statement of a date range, newest first, one page per worker request."""
+        shard = self._shard(branch, account_number)
+        page = shard.call("get_statement_page", branch, account_number, begin, end, page_size, cursor)
+        return self._iter_statement(shard, page, branch, account_number, begin, end, page_size)
+
+    def get_monthly_summary(self, branch: int, account_number: int,
+                            month: int, year: int) -> MonthlySummary:
+        """Get the totals and opening and closing balances of a month."""
+        return self._shard(branch, account_number).call("get_monthly_summary", branch, account_number, month, year)
+
+    def login(self, branch: int, account_number: int, password: str) -> CurrentAccount:
+        """Client login."""
+        return self._shard(branch, account_number).call("login", branch, account_number, password)
+
+    def transfer(self, operation_location: int, src_branch: int, src_account_number: int,
+                 dst_branch: int, dst_account_number: int, amount: float,
+                 idempotency_key: Optional[str] = None) -> Transfer:
+        """Perform a transfer operation."""
+        if idempotency_key is not None:
+            return self._idempotent(idempotency_key, "transfer", operation_location, src_branch,
+                                    src_account_number, dst_branch, dst_account_number, amount)
+        source = self._shard(src_branch, src_account_number)
+        destination = self._find_shard(dst_branch, dst_account_number) or source
+        if destination is source:
+            return source.call("transfer", operation_location, src_branch, src_account_number,
+                               dst_branch, dst_account_number, amount)
+        return self._transfer_between(source, destination, operation_location, src_branch,
+                                      src_account_number, dst_branch, dst_account_number, amount)
+
+    def withdrawal(self, operation_location: int, branch: int, account_number: int,
+                   amount: float, idempotency_key: Optional[str] = None) -> Withdrawal:
+        """Perform a withdrawal operation."""
+        if idempotency_key is not None:
+            return self._idempotent(idempotency_key, "withdrawal", operation_location, branch, account_number,
+                                    amount)
+        return self._shard(branch, account_number).call("withdrawal", operation_location, branch, account_number, amount)
+
+    def apply_batch(self, operations: List[BatchOperation], atomic: bool = False,
+                    idempotency_key: Optional[str] = None) -> List[BatchResult]:
+        """
+        Perform a batch of deposits, withdrawals and transfers, in order.
+
+        The operations of each shard are sent to it as one sub-batch, and the
+        sub-batches run concurrently. A transfer between shards is applied on
+        its own, after the operations that precede it. Atomic batches must
+        stay within one shard.
+        """
+        if idempotency_key is not None:
+            return self.idempotency_cache.run(idempotency_key, batch_request(operations, atomic),
+                                              self.apply_batch, operations, atomic)
+        if atomic:
+            shards = {self._find_shard(branch, account_number) for operation in operations
+                      for branch, account_number in ((operation.get_branch(), operation.get_account_number()),
+                                                     (operation.get_dst_branch(),
+                                                      operation.get_dst_account_number()))
+                      if branch is not None}
+            if len(shards) > 1 or None in shards:
+                raise BusinessException("exception.batch.cross.shard")
+            if not shards:
+                return []
+            return shards.pop().call("apply_batch", operations, True)
+
+        results: List[Optional[BatchResult]] = [None] * len(operations)
+        pending: Dict[_Shard, List[Tuple[int, BatchOperation]]] = {}
+        for index, operation in enumerate(operations):
+            source = self._find_shard(operation.get_branch(), operation.get_account_number())
+            if source is None:
+                results[index] = BatchResult(index, error="exception.inexistent.account")
+                continue
+            if operation.get_kind() == BatchOperation.TRANSFER:
+                destination = self._find_shard(operation.get_dst_branch(),
+                                               operation.get_dst_account_number()) or source
+            else:
+                destination = source
+            if destination is not source:
+                self._apply_sub_batches(pending, results)
+                try:
+                    transfer = self._transfer_between(
+                        source, destination, operation.get_operation_location(), operation.get_branch(),
+                        operation.get_account_number(), operation.get_dst_branch(),
+                        operation.get_dst_account_number(), operation.get_amount())
+                    results[index] = BatchResult(index, transfer)
+                except BusinessException as e:
+                    results[index] = BatchResult(index, error=str(e))
+                continue
+            pending.setdefault(source, []).append((index, operation))
+        self._apply_sub_batches(pending, results)
+        return results
+
+    def _apply_sub_batches(self, pending: Dict['_Shard', List[Tuple[int, BatchOperation]]],
+                           results: List[Optional[BatchResult]]) -> None:
+        """
+        Run the pending operations of every shard concurrently, storing their results.
+
+        The reply of every shard that was sent its part is read, even after
+        another shard failed, so that no shard is left reserved with an
+        unread reply; the first error is raised afterwards.
+        """
+        sent = []
+        error: Optional[BaseException] = None
+        try:
+            for shard, items in pending.items():
+                if items:
+                    shard.send("apply_batch", [operation for _, operation in items], False)
+                    sent.append(shard)
+        except BaseException as e:
+            error = e
+        for shard in sent:
+            try:
+                replies = shard.receive()
+            except BaseException as e:
+                error = error or e
+                continue
+            for (index, _), result in zip(pending[shard], replies):
+                result.index = index
+                results[index] = result
+        pending.clear()
+        if error is not None:
+            raise error
+
+    def _transfer_between(self, source: '_Shard', destination: '_Shard', operation_location: int,
+                          src_branch: int, src_account_number: int, dst_branch: int,
+                          dst_account_number: int, amount: float) -> Transfer:
+        """Transfer between accounts of different shards, in two steps."""
+        transfer_id = uuid.uuid4().hex
+        destination.call("check_account", dst_branch, dst_account_number)
+        debit = source.call("transfer_out", operation_location, src_branch, src_account_number,
+                            dst_branch, dst_account_number, amount, transfer_id)
+        try:
+            credit = destination.call("transfer_in", operation_location, src_branch, src_account_number,
+                                      dst_branch, dst_account_number, amount, debit.get_date(), transfer_id)
+        except BaseException:
+            # Compensate the debit, whatever made the credit fail; the refund settles the transfer
+            try:
+                source.call("transfer_in", operation_location, dst_branch, dst_account_number,
+                            src_branch, src_account_number, amount, None, transfer_id)
+            except BaseException as e:
+                raise BusinessException("exception.transfer.compensation.failed") from e
+            raise
+        source.note(_SETTLE, transfer_id, destination)
+        return Transfer(debit.get_location(), debit.get_account(), credit.get_destination_account(),
+                        amount, debit.get_date())
+
+    def _settle_open_transfers(self) -> None:
+        """Complete, or refund, the transfers between shards left pending by a previous router."""
+        received = {shard: set(shard.call("get_received_transfers")) for shard in self._shards}
+        for source in self._shards:
+            for (transfer_id, operation_location, src_branch, src_account_number, dst_branch,
+                 dst_account_number, amount, date) in source.call("get_pending_transfers"):
+                destination = self._shard_of_branch.get(dst_branch)
+                if destination is not None and transfer_id in received[destination]:
+                    received[destination].discard(transfer_id)
+                else:
+                    try:
+                        if destination is None:
+                            raise BusinessException("exception.inexistent.account")
+                        destination.call("transfer_in", operation_location, src_branch, src_account_number,
+                                         dst_branch, dst_account_number, amount, date, transfer_id)
+                    except BusinessException:
+                        source.call("transfer_in", operation_location, dst_branch, dst_account_number,
+                                    src_branch, src_account_number, amount, None, transfer_id)
+                        continue
+                source.call("settle_transfers", [transfer_id])
+                destination.call("forget_transfers", [transfer_id])
+        # Credits whose source settled them, but that were not forgotten before the previous router stopped
+        for shard, transfer_ids in received.items():
+            if transfer_ids:
+                shard.call("forget_transfers", list(transfer_ids))
+
+    def _iter_statement(self, shard: '_Shard', page: StatementPage, branch: int, account_number: int,
+                        begin: datetime, end: datetime, page_size: int) -> Iterator[StatementPage]:
+        """Produce the first page of a statement, then request the next ones from the worker."""
+        yield page
+        while page.has_next():
+            page = shard.call("get_statement_page", branch, account_number, begin, end, page_size,
+                              page.get_cursor())
+            yield page
+
+    def _idempotent(self, idempotency_key: str, method: str, *args: Any) -> Any:
+        """Call a method at most once per idempotency key, returning the first result to retries."""
+        return self.idempotency_cache.run(idempotency_key, (method,) + args, getattr(self, method), *args)
+
+    def _shard(self, branch: int, account_number: int) -> '_Shard':
+        shard = self._find_shard(branch, account_number)
+        if shard is None:
+            raise BusinessException("exception.inexistent.account")
+        return shard
+
+    def _find_shard(self, branch: int, account_number: int) -> Optional['_Shard']:
+        """Get the shard of an account's branch, first registering the account if created after startup."""
+        if account_number >= self._first_new_number and (branch, account_number) not in self._registered:
+            self._register(branch, account_number)
+        return self._shard_of_branch.get(branch)
+
+    def _register(self, branch: int, account_number: int) -> None:
+        """Load an account created in database after startup into the shard of its branch, if it exists."""
+        with self._lock:
+            if (branch, account_number) in self._registered:
+                return
+            current_account = self.database.find_current_account(branch, account_number)
+            if current_account is None:
+                return
+            shard = self._shard_of_branch.get(branch)
+            if shard is None:
+                shard = self._assign_branch(branch)
+                self._write_assignment()
+            self._send_locations()
+            shard.call("load_accounts", [_account_row(current_account)])
+            self._registered.add((branch, account_number))
+
+    def _assign_branch(self, branch: int) -> '_Shard':
+        """Assign a branch to the shard serving the fewest branches."""
+        counts = Counter(self._shard_of_branch.values())
+        shard = min(self._shards, key=lambda candidate: counts[candidate])
+        self._shard_of_branch[branch] = shard
+        return shard
+
+    def _send_locations(self) -> None:
+        """Send the operation locations of database that the workers do not have yet."""
+        locations = [(location.get_number(), isinstance(location, Branch),
+                      location.get_name() if isinstance(location, Branch) else None)
+                     for location in self.database.get_all_operation_locations()
+                     if location.get_number() not in self._locations]
+        if locations:
+            for shard in self._shards:
+                shard.call("load_locations", locations)
+            self._locations.update(number for number, _, _ in locations)
+
+    def _read_assignment(self) -> Optional[dict]:
+        """Read the branch assignment kept with the shard logs, if any."""
+        if self.wal_directory is None:
+            return None
+        path = os.path.join(self.wal_directory, _ASSIGNMENT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as assignment_file:
+            return json.load(assignment_file)
+
+    def _write_assignment(self) -> None:
+        """Keep the branch assignment with the shard logs, replacing the file atomically."""
+        if self.wal_directory is None:
+            return
+        indexes = {shard: index for index, shard in enumerate(self._shards)}
+        path = os.path.join(self.wal_directory, _ASSIGNMENT_FILE)
+        with open(path + ".tmp", 'w', encoding='utf-8') as assignment_file:
+            json.dump({"workers": len(self._shards),
+                       "branches": {str(branch): indexes[shard] for branch, shard in self._shard_of_branch.items()}},
+                      assignment_file)
+            assignment_file.flush()
+            os.fsync(assignment_file.fileno())
+        os.replace(path + ".tmp", path)
+
+
+class _Shard:
+    """
+    Connection to one worker process. One request at a time is in flight per shard.
+
+    Notes queued on the shard (settle or forget a transfer between shards)
+    are sent along with its next request, and applied by the worker before
+    it. Once a settle note is applied, the matching forget note is queued
+    on the shard of the transfer's destination.
+    """
+
+    def __init__(self, database: Database):
+        self.database = database
+        # Spawned, not forked: a fork of the multithreaded router could inherit a held lock
+        context = multiprocessing.get_context('spawn')
+        self._connection, worker_connection = context.Pipe()
+        self._process = context.Process(target=_serve, args=(worker_connection,), name="bank-shard", daemon=True)
+        self._process.start()
+        worker_connection.close()
+        self._lock = threading.Lock()
+        # Notes to send: (note, transfer id, shard told to forget the transfer once settled)
+        self._notes: List[Tuple[str, str, Optional['_Shard']]] = []
+        self._notes_lock = threading.Lock()
+        # Notes sent with the request in flight
+        self._sent_notes: List[Tuple[str, str, Optional['_Shard']]] = []
+
+    def call(self, method: str, *args: Any) -> Any:
+        """Run a method on the worker and return its result."""
+        self.send(method, *args)
+        return self.receive()
+
+    def note(self, note: str, transfer_id: str, destination: Optional['_Shard'] = None) -> None:
+        """Queue a note for the next request."""
+        with self._notes_lock:
+            self._notes.append((note, transfer_id, destination))
+
+    def flush_notes(self) -> None:
+        """Send the queued notes now, if any."""
+        if self._notes:
+            self.call("sync")
+
+    def send(self, method: str, *args: Any) -> None:
+        """Send a request. The shard stays reserved until receive is called."""
+        self._lock.acquire()
+        with self._notes_lock:
+            notes, self._notes = self._notes, []
+        try:
+            self._connection.send((method, args, [(note, transfer_id) for note, transfer_id, _ in notes]))
+        except BaseException:
+            with self._notes_lock:
+                self._notes[:0] = notes
+            self._lock.release()
+            raise
+        self._sent_notes = notes
+
+    def receive(self) -> Any:
+        """Receive the result of the request sent last, raising its error if it failed."""
+        notes, self._sent_notes = self._sent_notes, []
+        try:
+            success, value, noted = self._connection.recv()
+        finally:
+            self._lock.release()
+        if noted:
+            for note, transfer_id, destination in notes:
+                if note == _SETTLE and destination is not None:
+                    destination.note(_FORGET, transfer_id)
+        if not success:
+            raise value
+        accounts, body = value
+        return _ResultDecoder(self.database, accounts).decode(body)
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._connection.send(None)
+            except OSError:
+                pass
+            self._connection.close()
+        self._process.join()
+
+
+class _ShardWorker:
+    """
+    State of a worker process: its database and service.
+    """
+
+    def __init__(self):
+        self.database = Database(init_data=False)
+        self.service = AccountOperationServiceImpl(self.database)
+
+    def call(self, method: str, args: tuple) -> Any:
+        handler = getattr(self, method, None)
+        if handler is None:
+            handler = getattr(self.service, method)
+        return _ResultEncoder().encode(handler(*args))
+
+    def load_locations(self, locations: List[tuple]) -> None:
+        for number, is_branch, name in locations:
+            self.database.save_operation_location(Branch(number, name) if is_branch else ATM(number))
+
+    def load_accounts(self, rows: List[tuple]) -> None:
+        for branch, number, first_name, last_name, cpf, password, birthday, balance, columns, counterparties in rows:
+            client = Client(first_name, last_name, cpf, password, birthday)
+            current_account = CurrentAccount(self.database.get_operation_location(branch), number, client, balance)
+            if len(columns['timestamps']):
+                # Counterparties may be loaded later, so the history is decoded on first use
+                current_account.set_transaction_loader(
+                    lambda account, columns=columns, counterparties=counterparties:
+                    self._load_history(account, columns, counterparties))
+            self.database.load_current_account(current_account)
+
+    def attach_wal(self, wal_path: str) -> None:
+        self.database.attach_wal(wal_path)
+
+    def sync(self) -> None:
+        """Do nothing: a request that only delivers notes."""
+
+    def apply_notes(self, notes: List[Tuple[str, str]]) -> None:
+        if notes:
+            self.database.settle_transfers([transfer_id for note, transfer_id in notes if note == _SETTLE])
+            self.database.forget_transfers([transfer_id for note, transfer_id in notes if note == _FORGET])
+
+    def settle_transfers(self, transfer_ids: List[str]) -> None:
+        self.database.settle_transfers(transfer_ids)
+
+    def forget_transfers(self, transfer_ids: List[str]) -> None:
+        self.database.forget_transfers(transfer_ids)
+
+    def get_pending_transfers(self) -> List[tuple]:
+        return [(transfer_id, record["location"], record["branch"], record["number"], record["dst_branch"],
+                 record["dst_number"], record["amount"], datetime.fromisoformat(record["date"]))
+                for transfer_id, record in self.database.pending_transfers.items()]
+
+    def get_received_transfers(self) -> List[str]:
+        return list(self.database.received_transfers)
+
+    def check_account(self, branch: int, account_number: int) -> None:
+        self._read_account(branch, account_number)
+
+    def get_statement_page(self, branch: int, account_number: int, begin: datetime, end: datetime,
+                           page_size: int, cursor: Optional[str]) -> StatementPage:
+        return next(self.service.iter_statement(branch, account_number, begin, end, page_size, cursor))
+
+    def transfer_out(self, operation_location: int, src_branch: int, src_account_number: int,
+                     dst_branch: int, dst_account_number: int, amount: float, transfer_id: str) -> Transfer:
+        source = self._read_account(src_branch, src_account_number)
+        location = self._get_location(operation_location)
+        with self.database.tracking_transfer(transfer_id):
+            return source.transfer_out(location, self.database.get_remote_account(dst_branch, dst_account_number),
+                                       amount)
+
+    def transfer_in(self, operation_location: int, src_branch: int, src_account_number: int,
+                    dst_branch: int, dst_account_number: int, amount: float,
+                    date: Optional[datetime], transfer_id: str) -> Transfer:
+        destination = self._read_account(dst_branch, dst_account_number)
+        location = self._get_location(operation_location)
+        with self.database.tracking_transfer(transfer_id):
+            return destination.transfer_in(location, self.database.get_remote_account(src_branch, src_account_number),
+                                           amount, date)
+
+    def _load_history(self, current_account: CurrentAccount, columns: Dict[str, Any],
+                      counterparties: List[Tuple[int, int]]) -> None:
+        """Fill the ledger of an account with the columns it had in the router database."""
+        locations = {number: self.database.get_operation_location(number) for number in set(columns['locations'])}
+        current_account.ledger.set_columns(
+            columns, locations, [self.database.find_current_account(branch, number)
+                                 or self.database.get_remote_account(branch, number)
+                                 for branch, number in counterparties])
+
+    def _read_account(self, branch: int, account_number: int) -> CurrentAccount:
+        current_account = self.database.find_current_account(branch, account_number)
+        if current_account is None:
+            raise BusinessException("exception.inexistent.account")
+        return current_account
+
+    def _get_location(self, number: int) -> OperationLocation:
+        operation_location = self.database.get_operation_location(number)
+        if operation_location is None:
+            raise BusinessException("exception.invalid.operation.location")
+        return operation_location
+
+
+class _ResultEncoder:
+    """
+    Encodes the results of a worker as plain tuples, much cheaper to send than object graphs.
+
+    Accounts are sent once per result, in a table referenced by index.
+    """
+
+    def __init__(self):
+        self.accounts: List[tuple] = []
+        self._account_indexes: Dict[int, int] = {}
+
+    def encode(self, value: Any) -> tuple:
+        if isinstance(value, Transaction):
+            body = ("transaction", self._encode_transaction(value))
+        elif isinstance(value, CurrentAccount):
+            body = ("account", self._encode_account(value))
+        elif isinstance(value, list) and value and isinstance(value[0], BatchResult):
+            body = ("results", [(result.get_index(),
+                                 self._encode_transaction(result.get_transaction())
+                                 if result.get_transaction() is not None else None,
+                                 result.get_error()) for result in value])
+        elif isinstance(value, list) and value and isinstance(value[0], Transaction):
+            body = ("transactions", [self._encode_transaction(transaction) for transaction in value])
+        elif isinstance(value, StatementPage):
+            body = ("page", ([self._encode_transaction(transaction) for transaction in value.get_transactions()],
+                             value.get_cursor()))
+        else:
+            body = ("value", value)
+        return self.accounts, body
+
+    def _encode_account(self, current_account: CurrentAccount) -> int:
+        index = self._account_indexes.get(id(current_account))
+        if index is None:
+            account_id = current_account.get_id()
+            client = current_account.get_client()
+            index = self._account_indexes[id(current_account)] = len(self.accounts)
+            self.accounts.append((account_id.get_branch().get_number(), account_id.get_branch().get_name(),
+                                  account_id.get_number(), client.get_first_name(), client.get_last_name(),
+                                  client.get_cpf(), client.get_password(), client.get_birthday(),
+                                  current_account.get_balance()))
+        return index
+
+    def _encode_transaction(self, transaction: Transaction) -> tuple:
+        common = (transaction.get_location().get_number(), self._encode_account(transaction.get_account()),
+                  transaction.get_amount(), transaction.get_date(), transaction.get_row())
+        if isinstance(transaction, Deposit):
+            return (BatchOperation.DEPOSIT,) + common + (transaction.get_envelope(),)
+        if isinstance(transaction, Withdrawal):
+            return (BatchOperation.WITHDRAWAL,) + common
+        return (BatchOperation.TRANSFER,) + common + (
+            self._encode_account(transaction.get_destination_account()), transaction.get_destination_row())
+
+
+class _ResultDecoder:
+    """
+    Rebuilds the results encoded by _ResultEncoder as detached domain objects.
+    """
+
+    def __init__(self, database: Database, accounts: List[tuple]):
+        self.database = database
+        self.account_rows = accounts
+        self._accounts: Dict[int, CurrentAccount] = {}
+
+    def decode(self, body: tuple) -> Any:
+        kind, value = body
+        if kind == "transaction":
+            return self._decode_transaction(value)
+        if kind == "account":
+            return self._decode_account(value)
+        if kind == "results":
+            return [_EncodedBatchResult(index, error, self, transaction) for index, transaction, error in value]
+        if kind == "transactions":
+            return [self._decode_transaction(transaction) for transaction in value]
+        if kind == "page":
+            transactions, cursor = value
+            return StatementPage([self._decode_transaction(transaction) for transaction in transactions], cursor)
+        return value
+
+    def decode_transaction(self, value: Optional[tuple]) -> Optional[Transaction]:
+        return self._decode_transaction(value) if value is not None else None
+
+    def _decode_account(self, index: int) -> CurrentAccount:
+        current_account = self._accounts.get(index)
+        if current_account is None:
+            (branch_number, branch_name, number, first_name, last_name, cpf, password, birthday,
+             balance) = self.account_rows[index]
+            client = Client(first_name, last_name, cpf, password, birthday)
+            current_account = self._accounts[index] = CurrentAccount(Branch(branch_number, branch_name),
+                                                                     number, client, balance)
+        return current_account
+
+    def _decode_transaction(self, value: tuple) -> Transaction:
+        kind, location, account, amount, date, row = value[:6]
+        location = self.database.get_operation_location(location)
+        account = self._decode_account(account)
+        if kind == BatchOperation.DEPOSIT:
+            transaction = Deposit(location, account, value[6], amount, date)
+        elif kind == BatchOperation.WITHDRAWAL:
+            transaction = Withdrawal(location, account, amount, date)
+        else:
+            transaction = Transfer(location, account, self._decode_account(value[6]), amount, date)
+            transaction.destination_row = value[7]
+        transaction.row = row
+        return transaction
+
+
+class _EncodedBatchResult(BatchResult):
+    """
+    Batch result whose transaction is only rebuilt when asked for.
+
+    Clearing jobs mostly check the outcome only, and rebuilding every
+    transaction would make the router the bottleneck.
+    """
+
+    __slots__ = ('_decoder', '_encoded')
+
+    def __init__(self, index: int, error: Optional[str], decoder: _ResultDecoder, encoded: Optional[tuple]):
+        super().__init__(index, None, error)
+        self._decoder = decoder
+        self._encoded = encoded
+
+    def get_transaction(self) -> Optional[Transaction]:
+        if self._encoded is not None:
+            self.transaction = self._decoder.decode_transaction(self._encoded)
+            self._encoded = None
+        return self.transaction
+
+
+def _account_row(current_account: CurrentAccount) -> tuple:
+    """Describe an account, with its ledger columns and counterparties, for load_accounts."""
+    account_id = current_account.get_id()
+    client = current_account.get_client()
+    ledger = current_account.get_ledger()
+    counterparties = [(counterparty.get_id().get_branch().get_number(), counterparty.get_id().get_number())
+                      for counterparty in ledger.counterparty_table]
+    return (account_id.get_branch().get_number(), account_id.get_number(), client.get_first_name(),
+            client.get_last_name(), client.get_cpf(), client.get_password(), client.get_birthday(),
+            current_account.get_balance(), ledger.get_columns(), counterparties)
+
+
+def _serve(connection) -> None:
+    """Main loop of a worker process."""
+    worker = _ShardWorker()
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        method, args, notes = message
+        try:
+            worker.apply_notes(notes)
+        except Exception as e:
+            connection.send((False, e, False))
+            continue
+        try:
+            connection.send((True, worker.call(method, args), True))
+        except Exception as e:
+            connection.send((False, e, True))
+    worker.database.close()
+    connection.close()
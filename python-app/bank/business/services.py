@@ -3,22 +3,30 @@ Service interfaces for the banking system.
 """
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List
+from typing import Iterator, List, Optional
 
 from .business_exception import BusinessException
+from .domain.batch_operation import BatchOperation, BatchResult
 from .domain.employee import Employee
 from .domain.current_account import CurrentAccount
+from .domain.monthly_summary import MonthlySummary
+from .domain.statement_page import StatementPage
 from .domain.transaction import Transaction, Deposit, Withdrawal, Transfer
 
 
 class AccountManagementService(ABC):
     """
     Interface for account management operations.
+    
+    Account creation accepts an optional idempotency key, like the
+    operations of AccountOperationService: a retry returns the account
+    created by the first call instead of creating another one.
     """
     
     @abstractmethod
     def create_current_account(self, branch: int, name: str, last_name: str, 
-                             cpf: int, birthday: datetime, balance: float) -> CurrentAccount:
+                             cpf: int, birthday: datetime, balance: float,
+                             idempotency_key: Optional[str] = None) -> CurrentAccount:
         """Create a new current account."""
         pass
     
@@ -31,11 +39,15 @@ class AccountManagementService(ABC):
 class AccountOperationService(ABC):
     """
     Interface for account operations.
+    
+    Operations moving money accept an optional idempotency key: a call
+    repeating the key of a completed call, e.g. a retry after a timeout,
+    returns the result of the first one instead of applying it again.
     """
     
     @abstractmethod
     def deposit(self, operation_location: int, branch: int, account_number: int, 
-               envelope: int, amount: float) -> Deposit:
+               envelope: int, amount: float, idempotency_key: Optional[str] = None) -> Deposit:
         """Perform a deposit operation."""
         pass
     
@@ -44,6 +56,11 @@ class AccountOperationService(ABC):
         """Get account balance."""
         pass
     
+    @abstractmethod
+    def get_balance_at(self, branch: int, account_number: int, when: datetime) -> float:
+        """Get the account balance right after the transactions dated up to when."""
+        pass
+    
     @abstractmethod
     def get_statement_by_date(self, branch: int, account_number: int, 
                             begin: datetime, end: datetime) -> List[Transaction]:
@@ -56,6 +73,23 @@ class AccountOperationService(ABC):
         """Get statement by month."""
         pass
     
+    @abstractmethod
+    def iter_statement(self, branch: int, account_number: int, begin: datetime, end: datetime,
+                       page_size: int = 20, cursor: Optional[str] = None) -> Iterator[StatementPage]:
+        """
+        Iterate over the statement of a date range, newest first, one page at a time.
+
+        The cursor of a page resumes the statement after it, also in a later
+        call. At least one page, possibly empty, is produced.
+        """
+        pass
+    
+    @abstractmethod
+    def get_monthly_summary(self, branch: int, account_number: int, 
+                            month: int, year: int) -> MonthlySummary:
+        """Get the totals and opening and closing balances of a month."""
+        pass
+    
     @abstractmethod
     def login(self, branch: int, account_number: int, password: str) -> CurrentAccount:
         """Client login."""
@@ -63,12 +97,19 @@ class AccountOperationService(ABC):
     
     @abstractmethod
     def transfer(self, operation_location: int, src_branch: int, src_account_number: int,
-                dst_branch: int, dst_account_number: int, amount: float) -> Transfer:
+                dst_branch: int, dst_account_number: int, amount: float,
+                idempotency_key: Optional[str] = None) -> Transfer:
         """Perform a transfer operation."""
         pass
     
     @abstractmethod
     def withdrawal(self, operation_location: int, branch: int, account_number: int, 
-                  amount: float) -> Withdrawal:
+                  amount: float, idempotency_key: Optional[str] = None) -> Withdrawal:
         """Perform a withdrawal operation."""
-        pass
\ No newline at end of file
+        pass
+    
+    @abstractmethod
+    def apply_batch(self, operations: List[BatchOperation], atomic: bool = False,
+                    idempotency_key: Optional[str] = None) -> List[BatchResult]:
+        """Perform a batch of deposits, withdrawals and transfers, in order."""
+        pass
@@ -0,0 +1,275 @@
+"""
+Aggregations over the transaction history of all accounts.
+"""
+import threading
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ..business.domain.account_listener import AccountListener
+from ..business.domain.current_account import CurrentAccount
+from ..business.domain.ledger import Ledger, DEPOSIT, WITHDRAWAL, TRANSFER_OUT, TRANSFER_IN, encode_timestamp
+from ..business.domain.transaction import Transaction, Transfer
+from .database import Database
+
+_DAY = 24 * 60 * 60 * 1000000
+_EPOCH = date(1970, 1, 1)
+
+
+class LedgerAnalytics(AccountListener):
+    """
+    Columnar copy of every ledger row of a database, for group-by queries.
+
+    The rows of all accounts are exported into one set of typed arrays
+    when the analytics are created, and kept up to date afterwards as a
+    listener of the accounts. Each row also records the branch of its
+    account, so a transfer contributes a TRANSFER_OUT row to the branch of
+    its source and a TRANSFER_IN row to the branch of its destination.
+
+    Queries group rows by any combination of GROUP_KEYS and return the
+    number and total amount of the rows of each group. They run as
+    vectorized reductions when numpy is installed, and as a plain loop
+    over the arrays otherwise.
+    """
+
+    GROUP_KEYS = ('location', 'kind', 'branch', 'day', 'month')
+
+    def __init__(self, database: Database, use_numpy: bool = True):
+        self.database = database
+        self.use_numpy = use_numpy and numpy is not None
+        self.timestamps = array('q')
+        self.kinds = array('b')
+        self.amounts = array('d')
+        self.locations = array('i')
+        self.branches = array('i')
+        # Row of each ledger row of the tracked accounts, or -1 if missing
+        self._rows: Dict[CurrentAccount, array] = {}
+        self._lock = threading.Lock()
+        self._sync_accounts()
+
+    def aggregate(self, group_by: Sequence[str], kinds: Optional[Iterable[int]] = None,
+                  begin: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[tuple, Tuple[int, float]]:
+        """
+        Get the row count and total amount of each group of rows.
+
+        Rows can be restricted to some kinds (ledger row types) and to a
+        date range (inclusive). Groups are keyed by a tuple with one value
+        per group_by key, in order: the operation location number, the row
+        kind, the branch number of the account, the day (a date), or the
+        month (a date on its first day).
+        """
+        for key in group_by:
+            if key not in self.GROUP_KEYS:
+                raise ValueError(f"unknown group key: {key}")
+        kinds = tuple(kinds) if kinds is not None else None
+        low = encode_timestamp(begin) if begin is not None else None
+        high = encode_timestamp(end) if end is not None else None
+        self._sync_accounts()
+        with self._lock:
+            if self.use_numpy:
+                return self._aggregate_numpy(group_by, kinds, low, high)
+            return self._aggregate_python(group_by, kinds, low, high)
+
+    def get_totals_by_branch(self, begin: Optional[datetime] = None,
+                             end: Optional[datetime] = None) -> Dict[tuple, Tuple[int, float]]:
+        """Get the count and total of each row kind, by branch of the accounts."""
+        return self.aggregate(('branch', 'kind'), begin=begin, end=end)
+
+    def get_daily_cash_out(self, begin: Optional[datetime] = None,
+                           end: Optional[datetime] = None) -> Dict[tuple, Tuple[int, float]]:
+        """Get the count and total of withdrawals, by operation location and day."""
+        return self.aggregate(('location', 'day'), (WITHDRAWAL,), begin, end)
+
+    def get_deposit_volume(self, period: str = 'month', begin: Optional[datetime] = None,
+                           end: Optional[datetime] = None) -> Dict[tuple, Tuple[int, float]]:
+        """Get the count and total of deposits, by day or by month."""
+        return self.aggregate((period,), (DEPOSIT,), begin, end)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def transaction_recorded(self, account: CurrentAccount, transaction: Transaction) -> None:
+        """Add the rows of a new transaction."""
+        with self._lock:
+            if transaction.get_account() is not account:
+                # Destination side of a transfer from an account held elsewhere
+                self._append(account, transaction.get_destination_row(), TRANSFER_IN, account.ledger,
+                             transaction.get_destination_row())
+                return
+            row = transaction.get_row()
+            self._append(account, row, account.ledger.kinds[row], account.ledger, row)
+            if isinstance(transaction, Transfer) and transaction.get_destination_row() >= 0:
+                self._append(transaction.get_destination_account(), transaction.get_destination_row(),
+                             TRANSFER_IN, account.ledger, row)
+
+    def transaction_date_changed(self, account: CurrentAccount, transaction: Transaction,
+                                 old_date: datetime) -> None:
+        """Move the rows of a transaction to its new date."""
+        timestamp = encode_timestamp(transaction.get_date())
+        with self._lock:
+            for owner, row in ((account, transaction.get_row()),
+                               (getattr(transaction, 'destination_account', None),
+                                getattr(transaction, 'destination_row', -1))):
+                rows = self._rows.get(owner)
+                if rows is not None and 0 <= row < len(rows) and rows[row] >= 0:
+                    self.timestamps[rows[row]] = timestamp
+
+    def _sync_accounts(self) -> None:
+        """Export the rows of the accounts of the database that are not tracked yet."""
+        accounts = self.database.get_all_current_accounts()
+        if len(accounts) == len(self._rows):
+            return
+        late = bool(self._rows)
+        for account in list(accounts):
+            if account in self._rows:
+                continue
+            with CurrentAccount.locked(account), self._lock:
+                ledger = account.get_ledger()
+                first = len(self.kinds)
+                self.timestamps.extend(ledger.timestamps)
+                self.kinds.extend(ledger.kinds)
+                self.amounts.extend(ledger.amounts)
+                self.locations.extend(ledger.locations)
+                self.branches.extend(array('i', [account.get_id().get_branch().get_number()]) * len(ledger))
+                self._rows[account] = array('q', range(first, len(self.kinds)))
+                account.add_listener(self)
+                if late:
+                    self._add_missed_transfers(ledger)
+
+    def _add_missed_transfers(self, ledger: Ledger) -> None:
+        """
+        Add the destination rows of the transfers of a newly tracked account.
+
+        Its transfers were not reported to the analytics before it was
+        tracked, so transfers to already tracked accounts are missing there.
+        """
+        for row in range(len(ledger)):
+            if ledger.kinds[row] != TRANSFER_OUT or ledger.links[row] < 0:
+                continue
+            destination = ledger.get_counterparty(row)
+            rows = self._rows.get(destination)
+            link = ledger.links[row]
+            if rows is not None and (link >= len(rows) or rows[link] < 0):
+                self._append(destination, link, TRANSFER_IN, ledger, row)
+
+    def _append(self, account: CurrentAccount, row: int, kind: int, source: Ledger, source_row: int) -> None:
+        """Add a row of a tracked account, copying its date, amount and location from a ledger row."""
+        rows = self._rows.get(account)
+        if rows is None:
+            # Not exported yet; its whole ledger is copied when it is
+            return
+        if row >= len(rows):
+            rows.extend(array('q', [-1]) * (row + 1 - len(rows)))
+        rows[row] = len(self.kinds)
+        self.timestamps.append(source.timestamps[source_row])
+        self.kinds.append(kind)
+        self.amounts.append(source.amounts[source_row])
+        self.locations.append(source.locations[source_row])
+        self.branches.append(account.get_id().get_branch().get_number())
+
+    def _aggregate_numpy(self, group_by: Sequence[str], kinds: Optional[tuple],
+                         low: Optional[int], high: Optional[int]) -> Dict[tuple, Tuple[int, float]]:
+        # The array buffers must not be resized while viewed, so views only live in this call
+        timestamps = numpy.frombuffer(self.timestamps, dtype=numpy.int64)
+        row_kinds = numpy.frombuffer(self.kinds, dtype=numpy.int8)
+        amounts = numpy.frombuffer(self.amounts, dtype=numpy.float64)
+        mask = numpy.ones(len(timestamps), dtype=bool)
+        if kinds is not None:
+            mask &= numpy.isin(row_kinds, kinds)
+        if low is not None:
+            mask &= timestamps >= low
+        if high is not None:
+            mask &= timestamps <= high
+        if not mask.any():
+            return {}
+        if not group_by:
+            return {(): (int(mask.sum()), float(amounts[mask].sum()))}
+
+        columns = []
+        for key in group_by:
+            if key == 'location':
+                column = numpy.frombuffer(self.locations, dtype=numpy.int32)[mask].astype(numpy.int64)
+            elif key == 'kind':
+                column = row_kinds[mask].astype(numpy.int64)
+            elif key == 'branch':
+                column = numpy.frombuffer(self.branches, dtype=numpy.int32)[mask].astype(numpy.int64)
+            elif key == 'day':
+                column = timestamps[mask] // _DAY
+            else:
+                column = timestamps[mask].astype('datetime64[us]').astype('datetime64[M]').astype(numpy.int64)
+            columns.append(column)
+
+        # One integer key per row, combining the group columns in mixed radix
+        combined = numpy.zeros(int(mask.sum()), dtype=numpy.int64)
+        bases = []
+        for column in columns:
+            base = int(column.min())
+            radix = int(column.max()) - base + 1
+            combined = combined * radix + (column - base)
+            bases.append((base, radix))
+        keys, inverse = numpy.unique(combined, return_inverse=True)
+        counts = numpy.bincount(inverse)
+        totals = numpy.bincount(inverse, weights=amounts[mask])
+
+        decoded = []
+        for (base, radix), key in reversed(list(zip(bases, group_by))):
+            decoded.append([_group_value(key, int(value) + base) for value in keys % radix])
+            keys = keys // radix
+        decoded.reverse()
+        return {tuple(values): (int(count), float(total))
+                for values, count, total in zip(zip(*decoded), counts, totals)}
+
+    def _aggregate_python(self, group_by: Sequence[str], kinds: Optional[tuple],
+                          low: Optional[int], high: Optional[int]) -> Dict[tuple, Tuple[int, float]]:
+        timestamps = self.timestamps
+        getters = []
+        for key in group_by:
+            if key in ('day', 'month'):
+                # Rows are grouped by day, and days by month afterwards
+                getters.append(lambda row: timestamps[row] // _DAY)
+            else:
+                getters.append({'location': self.locations, 'kind': self.kinds,
+                                'branch': self.branches}[key].__getitem__)
+        groups: Dict[tuple, List[float]] = {}
+        for row in range(len(self.kinds)):
+            if kinds is not None and self.kinds[row] not in kinds:
+                continue
+            if (low is not None and timestamps[row] < low) or (high is not None and timestamps[row] > high):
+                continue
+            raw = tuple(getter(row) for getter in getters)
+            totals = groups.get(raw)
+            if totals is None:
+                totals = groups[raw] = [0, 0.0]
+            totals[0] += 1
+            totals[1] += self.amounts[row]
+
+        # Dates are derived once per group instead of once per row
+        result: Dict[tuple, Tuple[int, float]] = {}
+        for raw, (count, total) in groups.items():
+            key = tuple(_group_value(name, _month_of_day(value) if name == 'month' else value)
+                        for name, value in zip(group_by, raw))
+            if key in result:
+                previous_count, previous_total = result[key]
+                count, total = count + previous_count, total + previous_total
+            result[key] = (count, total)
+        return result
+
+
+def _group_value(key: str, value: int):
+    """Convert the integer form of a group column (days or months since the epoch) to its public value."""
+    if key == 'day':
+        return _EPOCH + timedelta(days=value)
+    if key == 'month':
+        return date(1970 + value // 12, value % 12 + 1, 1)
+    return value
+
+
+def _month_of_day(day: int) -> int:
+    """Get the month since the epoch of a day since the epoch."""
+    value = _EPOCH + timedelta(days=day)
+    return (value.year - 1970) * 12 + value.month - 1
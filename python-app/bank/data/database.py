@@ -1,35 +1,139 @@
 """
 In-memory database for the banking system.
 """
+import os
 import random
+import threading
 from calendar import Calendar
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, Collection, Optional
+from typing import Dict, Collection, Iterable, Iterator, Optional, Sequence, Set, Tuple
 
+from ..business.domain.account_listener import AccountListener
+from ..business.domain.account_locks import ACCOUNT_LOCKS
 from ..business.domain.operation_location import OperationLocation, Branch, ATM
 from ..business.domain.employee import Employee
 from ..business.domain.client import Client
 from ..business.domain.current_account import CurrentAccount
 from ..business.domain.current_account_id import CurrentAccountId
 from ..business.domain.transaction import Transaction, Deposit, Withdrawal, Transfer
+from .snapshot import Snapshot, write_snapshot
+from .wal import WriteAheadLog
 
 
-class Database:
+class Database(AccountListener):
     """
     In-memory database for the banking system.
+    
+    When a write-ahead log path is given, every mutation is appended to the
+    log and the log is replayed into the in-memory structures on startup.
+    
+    When an existing snapshot path is given, the database is loaded from the
+    snapshot instead: accounts are read from it on first access, and only the
+    write-ahead log records appended after the snapshot are replayed.
+    
+    Sample data is only created when there is neither a snapshot nor a
+    non-empty log to load from.
+    
+    Transactions are appended to the log while the account locks are held,
+    so the log order matches the order they were applied in, but their
+    durability is waited for only after the locks are released.
     """
     
-    def __init__(self, init_data: bool = True):
+    def __init__(self, init_data: bool = True, wal_path: Optional[str] = None,
+                 commit_window: float = 0.002, snapshot_path: Optional[str] = None):
         self.current_accounts: Dict[CurrentAccountId, CurrentAccount] = {}
+        # The same accounts by branch number and account number, for lookups without building an id
+        self.account_index: Dict[int, Dict[int, CurrentAccount]] = {}
         self.employees: Dict[str, Employee] = {}
         self.operation_locations: Dict[int, OperationLocation] = {}
+        # The same locations by type
+        self.branches: Dict[int, Branch] = {}
+        self.atms: Dict[int, ATM] = {}
+        # Stand-ins for accounts held by other databases, e.g. other shards
+        self.remote_accounts: Dict[Tuple[int, int], CurrentAccount] = {}
+        # Tagged transfers to other databases debited here and not settled yet: their log records, by transfer id
+        self.pending_transfers: Dict[str, dict] = {}
+        # Tagged transfers from other databases credited here and not forgotten yet
+        self.received_transfers: Set[str] = set()
         self._next_account_number = 1
+        self.wal: Optional[WriteAheadLog] = None
+        self._snapshot: Optional[Snapshot] = None
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._snapshot_stop = threading.Event()
+        self._lock = threading.RLock()
+        # Sequence number of the last record logged by each thread
+        self._logged = threading.local()
+        
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            self._load_snapshot(snapshot_path)
+            init_data = False
+        
+        if wal_path is not None and self.attach_wal(wal_path, commit_window):
+            init_data = False
         
         if init_data:
             self._init_data()
     
+    def close(self) -> None:
+        """Stop periodic snapshots and flush and close the write-ahead log, if any."""
+        self.stop_periodic_snapshots()
+        if self.wal is not None:
+            self.wal.close()
+    
+    def attach_wal(self, wal_path: str, commit_window: float = 0.002) -> bool:
+        """
+        Replay the write-ahead log at wal_path over the current contents, then log every later mutation to it.
+        
+        Return whether the log had any record to replay.
+        """
+        wal = WriteAheadLog(wal_path, commit_window)
+        start = self._snapshot.get_wal_position() if self._snapshot is not None else 0
+        replayed = self._replay_wal(wal, start)
+        self.wal = wal
+        return replayed
+    
+    def save_snapshot(self, path: str, truncate_wal: bool = True) -> None:
+        """
+        Write a snapshot of the database to path.
+        
+        The snapshot records the current write-ahead log position, so that
+        reopening the database with both files only replays newer records.
+        Once the snapshot is in place, the records it holds are dropped from
+        the log, so the log only grows with the operations since the last
+        snapshot and reopening only reads those. A copy that will not replace
+        the snapshot the database restarts from, e.g. a temporary one, must
+        be written with truncate_wal=False.
+        """
+        with ACCOUNT_LOCKS.hold_all(), self._lock:
+            wal_position = self.wal.get_position() if self.wal is not None else 0
+            write_snapshot(self, path, self._next_account_number, wal_position)
+        if self.wal is not None and truncate_wal:
+            self.wal.truncate(wal_position)
+    
+    def start_periodic_snapshots(self, path: str, interval: float) -> None:
+        """Write a snapshot to path every interval seconds, in a background thread."""
+        self.stop_periodic_snapshots()
+        self._snapshot_stop.clear()
+        
+        def run() -> None:
+            while not self._snapshot_stop.wait(interval):
+                self.save_snapshot(path)
+        
+        self._snapshot_thread = threading.Thread(target=run, name="snapshot-writer", daemon=True)
+        self._snapshot_thread.start()
+    
+    def stop_periodic_snapshots(self) -> None:
+        """Stop the periodic snapshot thread, if running."""
+        if self._snapshot_thread is not None:
+            self._snapshot_stop.set()
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+    
     def get_all_current_accounts(self) -> Collection[CurrentAccount]:
         """Get all current accounts."""
+        if self._snapshot is not None:
+            self._load_all_snapshot_accounts()
         return self.current_accounts.values()
     
     def get_all_employees(self) -> Collection[Employee]:
@@ -40,9 +144,76 @@ class Database:
         """Get all operation locations."""
         return self.operation_locations.values()
     
+    def get_branches(self) -> Collection[Branch]:
+        """Get all branches."""
+        return self.branches.values()
+    
+    def get_atms(self) -> Collection[ATM]:
+        """Get all ATMs."""
+        return self.atms.values()
+    
     def get_current_account(self, current_account_id: CurrentAccountId) -> Optional[CurrentAccount]:
         """Get current account by ID."""
-        return self.current_accounts.get(current_account_id)
+        return self.find_current_account(current_account_id.get_branch().get_number(),
+                                         current_account_id.get_number())
+    
+    def find_current_account(self, branch: int, number: int) -> Optional[CurrentAccount]:
+        """Get current account by branch number and account number, without allocating an id."""
+        accounts = self.account_index.get(branch)
+        current_account = accounts.get(number) if accounts is not None else None
+        if current_account is None and self._snapshot is not None:
+            current_account = self._load_snapshot_account(branch, number)
+        return current_account
+    
+    def get_remote_account(self, branch: int, number: int) -> CurrentAccount:
+        """
+        Get a stand-in for an account held by another database, such as another shard.
+        
+        Stand-ins only carry the account id; they are counterparties of
+        transfer_in and transfer_out and are never stored.
+        """
+        key = (branch, number)
+        current_account = self.remote_accounts.get(key)
+        if current_account is None:
+            client = Client("", "", 0, "", None)
+            current_account = self.remote_accounts[key] = CurrentAccount(Branch(branch), number, client)
+        return current_account
+    
+    @contextmanager
+    def tracking_transfer(self, transfer_id: str) -> Iterator[None]:
+        """
+        Tag the transfer_out or transfer_in recorded by this thread within the block with transfer_id.
+        
+        Only logged transfers are tagged. A tagged transfer_out stays in
+        pending_transfers until settle_transfers. A tagged transfer_in is
+        kept in received_transfers until forget_transfers, unless it refunds
+        a pending transfer_out of this database, which it settles. Both are
+        rebuilt from the log on restart, so they are lost if it is truncated
+        by save_snapshot.
+        """
+        self._logged.transfer = transfer_id
+        try:
+            yield
+        finally:
+            self._logged.transfer = None
+    
+    def settle_transfers(self, transfer_ids: Iterable[str]) -> None:
+        """Drop transfers credited where they were sent from pending_transfers, waiting until that is durable."""
+        lsn = None
+        with self._lock:
+            for transfer_id in transfer_ids:
+                if self.pending_transfers.pop(transfer_id, None) is not None:
+                    lsn = self.wal.append({"op": "transfer_settled", "transfer": transfer_id}, wait=False)
+        if lsn is not None:
+            self.wal.wait_durable(lsn)
+    
+    def forget_transfers(self, transfer_ids: Iterable[str]) -> None:
+        """Drop transfers settled where they were sent from received_transfers."""
+        with self._lock:
+            for transfer_id in transfer_ids:
+                if transfer_id in self.received_transfers:
+                    self.received_transfers.discard(transfer_id)
+                    self.wal.append({"op": "transfer_forgotten", "transfer": transfer_id}, wait=False)
     
     def get_employee(self, username: str) -> Optional[Employee]:
         """Get employee by username."""
@@ -54,26 +225,292 @@ class Database:
     
     def get_next_current_account_number(self) -> int:
         """Get next available account number."""
-        number = self._next_account_number
-        self._next_account_number += 1
+        return self.reserve_account_numbers(1)
+    
+    def reserve_account_numbers(self, count: int) -> int:
+        """Reserve a block of count consecutive account numbers. Return the first one."""
+        with self._lock:
+            number = self._next_account_number
+            self._next_account_number += count
         return number
     
     def save_current_account(self, current_account: CurrentAccount) -> None:
         """Save current account."""
-        self.current_accounts[current_account.get_id()] = current_account
+        lsn = None
+        with self._lock:
+            is_new = self.get_current_account(current_account.get_id()) is None
+            self._index_account(current_account)
+            if self.wal is not None:
+                current_account.add_listener(self)
+                if is_new:
+                    lsn = self._log_account(current_account)
+            
+            # Update next account number if necessary
+            account_number = current_account.get_id().get_number()
+            if account_number >= self._next_account_number:
+                self._next_account_number = account_number + 1
+        if lsn is not None:
+            self.wal.wait_durable(lsn)
+    
+    def load_current_account(self, current_account: CurrentAccount) -> None:
+        """
+        Store an account whose creation is durable elsewhere, e.g. in the database a shard is loaded from.
+        
+        The creation is not logged; the transactions applied from then on are.
+        """
+        with self._lock:
+            self._index_account(current_account)
+            if self.wal is not None:
+                current_account.add_listener(self)
+            account_number = current_account.get_id().get_number()
+            if account_number >= self._next_account_number:
+                self._next_account_number = account_number + 1
+    
+    def save_new_current_accounts(self, branch: Branch, first_number: int, rows: Sequence[tuple]) -> None:
+        """
+        Save a block of new accounts, numbered consecutively from first_number.
         
-        # Update next account number if necessary
-        account_number = current_account.get_id().get_number()
-        if account_number >= self._next_account_number:
-            self._next_account_number = account_number + 1
+        Each row holds the first name, last name, CPF, password, birthday
+        and initial balance of one account. Durability of the logged
+        accounts is waited for once, for the whole block.
+        """
+        lsn = None
+        with self._lock:
+            for offset, (first_name, last_name, cpf, password, birthday, balance) in enumerate(rows):
+                client = Client(first_name, last_name, cpf, password, birthday)
+                current_account = CurrentAccount(branch, first_number + offset, client, balance)
+                self._index_account(current_account)
+                if self.wal is not None:
+                    current_account.add_listener(self)
+                    lsn = self._log_account(current_account)
+            if first_number + len(rows) > self._next_account_number:
+                self._next_account_number = first_number + len(rows)
+        if lsn is not None:
+            self.wal.wait_durable(lsn)
     
     def save_employee(self, employee: Employee) -> None:
         """Save employee."""
         self.employees[employee.get_username()] = employee
+        if self.wal is not None:
+            self.wal.append({
+                "op": "employee",
+                "first_name": employee.get_first_name(),
+                "last_name": employee.get_last_name(),
+                "username": employee.get_username(),
+                "password": employee.get_password(),
+                "birthday": _encode_date(employee.get_birthday()),
+            })
     
     def save_operation_location(self, operation_location: OperationLocation) -> None:
         """Save operation location."""
-        self.operation_locations[operation_location.get_number()] = operation_location
+        self._index_location(operation_location)
+        if self.wal is not None:
+            record = {"op": "location", "number": operation_location.get_number()}
+            if isinstance(operation_location, Branch):
+                record["type"] = "branch"
+                record["name"] = operation_location.get_name()
+            else:
+                record["type"] = "atm"
+            self.wal.append(record)
+    
+    def transaction_recorded(self, account: CurrentAccount, transaction: Transaction) -> None:
+        """Log a transaction applied to one of the stored accounts."""
+        if self.wal is None:
+            return
+        account_id = account.get_id()
+        record = {
+            "op": _transaction_kind(transaction),
+            "branch": account_id.get_branch().get_number(),
+            "number": account_id.get_number(),
+            "location": transaction.get_location().get_number(),
+            "amount": transaction.get_amount(),
+            "date": _encode_date(transaction.get_date()),
+        }
+        if isinstance(transaction, Deposit):
+            record["envelope"] = transaction.get_envelope()
+        elif transaction.get_account() is not account:
+            # Destination side of a transfer from an account held elsewhere
+            source_id = transaction.get_account().get_id()
+            record["op"] = "transfer_in"
+            record["src_branch"] = source_id.get_branch().get_number()
+            record["src_number"] = source_id.get_number()
+        elif isinstance(transaction, Transfer):
+            destination_id = transaction.get_destination_account().get_id()
+            record["dst_branch"] = destination_id.get_branch().get_number()
+            record["dst_number"] = destination_id.get_number()
+            if transaction.get_destination_row() < 0:
+                # Source side of a transfer to an account held elsewhere
+                record["op"] = "transfer_out"
+        transfer_id = getattr(self._logged, 'transfer', None)
+        if transfer_id is not None and record["op"] in ("transfer_out", "transfer_in"):
+            record["transfer"] = transfer_id
+            self._track_transfer(record)
+        self._logged.lsn = self.wal.append(record, wait=False)
+    
+    def transaction_date_changed(self, account: CurrentAccount, transaction: Transaction,
+                                 old_date: datetime) -> None:
+        """Log a date change of a transaction of one of the stored accounts."""
+        if self.wal is None:
+            return
+        account_id = account.get_id()
+        self._logged.lsn = self.wal.append({
+            "op": "set_date",
+            "branch": account_id.get_branch().get_number(),
+            "number": account_id.get_number(),
+            "row": transaction.get_row(),
+            "date": _encode_date(transaction.get_date()),
+        }, wait=False)
+    
+    def account_unlocked(self, account: CurrentAccount) -> None:
+        """Wait until the records logged by this thread are durable."""
+        lsn = getattr(self._logged, 'lsn', None)
+        if self.wal is not None and lsn is not None:
+            self._logged.lsn = None
+            self.wal.wait_durable(lsn)
+    
+    def _log_account(self, current_account: CurrentAccount) -> int:
+        """Log the creation of a current account, without waiting. Return the record sequence number."""
+        account_id = current_account.get_id()
+        client = current_account.get_client()
+        return self.wal.append({
+            "op": "account",
+            "branch": account_id.get_branch().get_number(),
+            "number": account_id.get_number(),
+            "first_name": client.get_first_name(),
+            "last_name": client.get_last_name(),
+            "cpf": client.get_cpf(),
+            "password": client.get_password(),
+            "birthday": _encode_date(client.get_birthday()),
+            "balance": current_account.get_balance(),
+        }, wait=False)
+    
+    def _index_location(self, operation_location: OperationLocation) -> None:
+        """Store an operation location in the map of all locations and in the map of its type."""
+        number = operation_location.get_number()
+        self.operation_locations[number] = operation_location
+        self.branches.pop(number, None)
+        self.atms.pop(number, None)
+        if isinstance(operation_location, Branch):
+            self.branches[number] = operation_location
+        elif isinstance(operation_location, ATM):
+            self.atms[number] = operation_location
+    
+    def _index_account(self, current_account: CurrentAccount) -> None:
+        """Store an account in both account maps."""
+        account_id = current_account.get_id()
+        self.current_accounts[account_id] = current_account
+        accounts = self.account_index.get(account_id.get_branch().get_number())
+        if accounts is None:
+            accounts = self.account_index[account_id.get_branch().get_number()] = {}
+        accounts[account_id.get_number()] = current_account
+    
+    def _load_snapshot(self, path: str) -> None:
+        """Open a snapshot and load its operation locations and employees."""
+        self._snapshot = Snapshot(path)
+        locations, employees = self._snapshot.load_catalog()
+        for location in locations:
+            self._index_location(location)
+        for employee in employees:
+            self.employees[employee.get_username()] = employee
+        self._next_account_number = self._snapshot.get_next_account_number()
+    
+    def _load_snapshot_account(self, branch: int, number: int) -> Optional[CurrentAccount]:
+        """Load an account from the snapshot, if present there."""
+        offset = self._snapshot.find_account(branch, number)
+        if offset is None:
+            return None
+        with self._lock:
+            # Another thread may have loaded it meanwhile
+            accounts = self.account_index.get(branch)
+            current_account = accounts.get(number) if accounts is not None else None
+            if current_account is None:
+                current_account = self._register_snapshot_account(offset)
+        return current_account
+    
+    def _load_all_snapshot_accounts(self) -> None:
+        """Load every account of the snapshot that has not been loaded yet."""
+        with self._lock:
+            for branch, number, offset in self._snapshot.iter_accounts():
+                if number not in self.account_index.get(branch, ()):
+                    self._register_snapshot_account(offset)
+    
+    def _register_snapshot_account(self, offset: int) -> CurrentAccount:
+        current_account = self._snapshot.load_account(offset, self)
+        self._index_account(current_account)
+        if self.wal is not None:
+            current_account.add_listener(self)
+        return current_account
+    
+    def _replay_wal(self, wal: WriteAheadLog, start: int = 0) -> bool:
+        """Replay the write-ahead log from start. Return whether it had any record."""
+        replayed = False
+        for record in wal.read_records(start):
+            self._apply_log_record(record)
+            replayed = True
+        for current_account in self.current_accounts.values():
+            current_account.add_listener(self)
+        return replayed
+    
+    def _apply_log_record(self, record: dict) -> None:
+        """Apply a single write-ahead log record to the in-memory structures."""
+        op = record["op"]
+        if op == "location":
+            if record["type"] == "branch":
+                self.save_operation_location(Branch(record["number"], record["name"]))
+            else:
+                self.save_operation_location(ATM(record["number"]))
+        elif op == "employee":
+            self.save_employee(Employee(record["first_name"], record["last_name"],
+                                        record["username"], record["password"],
+                                        _decode_date(record["birthday"])))
+        elif op == "account":
+            client = Client(record["first_name"], record["last_name"], record["cpf"],
+                            record["password"], _decode_date(record["birthday"]))
+            branch = self.operation_locations[record["branch"]]
+            self.save_current_account(CurrentAccount(branch, record["number"], client,
+                                                     record["balance"]))
+        elif op == "set_date":
+            account = self._get_logged_account(record["branch"], record["number"])
+            transaction = account.get_ledger().get_transaction(record["row"])
+            transaction.set_date(_decode_date(record["date"]))
+        elif op == "transfer_settled":
+            self.pending_transfers.pop(record["transfer"], None)
+        elif op == "transfer_forgotten":
+            self.received_transfers.discard(record["transfer"])
+        else:
+            account = self._get_logged_account(record["branch"], record["number"])
+            location = self.operation_locations[record["location"]]
+            if op == "deposit":
+                transaction = account.deposit(location, record["envelope"], record["amount"])
+            elif op == "withdrawal":
+                transaction = account.withdrawal(location, record["amount"])
+            elif op == "transfer":
+                destination = self._get_logged_account(record["dst_branch"], record["dst_number"])
+                transaction = account.transfer(location, destination, record["amount"])
+            elif op == "transfer_out":
+                destination = self.get_remote_account(record["dst_branch"], record["dst_number"])
+                transaction = account.transfer_out(location, destination, record["amount"])
+            elif op == "transfer_in":
+                source = self.get_remote_account(record["src_branch"], record["src_number"])
+                transaction = account.transfer_in(location, source, record["amount"])
+            else:
+                raise ValueError(f"unknown write-ahead log record: {op}")
+            transaction.set_date(_decode_date(record["date"]))
+            if "transfer" in record:
+                self._track_transfer(record)
+    
+    def _track_transfer(self, record: dict) -> None:
+        """Record a tagged transfer_out as pending, or a tagged transfer_in as received or as a refund."""
+        transfer_id = record["transfer"]
+        with self._lock:
+            if record["op"] == "transfer_out":
+                self.pending_transfers[transfer_id] = record
+            elif self.pending_transfers.pop(transfer_id, None) is None:
+                self.received_transfers.add(transfer_id)
+    
+    def _get_logged_account(self, branch: int, number: int) -> CurrentAccount:
+        """Get an account referenced by a write-ahead log record."""
+        return self.find_current_account(branch, number)
     
     def _init_data(self) -> None:
         """Initialize database with sample data."""
@@ -155,4 +592,21 @@ class Database:
                     transfer = account.transfer(location, dest_account, amount)
                     transfer.set_date(transaction_date)
                 except:
-                    pass  # Skip if insufficient balance
\ No newline at end of file
+                    pass  # Skip if insufficient balance
+
+
+def _transaction_kind(transaction: Transaction) -> str:
+    """Get the write-ahead log name of a transaction type."""
+    if isinstance(transaction, Deposit):
+        return "deposit"
+    if isinstance(transaction, Withdrawal):
+        return "withdrawal"
+    return "transfer"
+
+
+def _encode_date(date: Optional[datetime]) -> Optional[str]:
+    return date.isoformat() if date is not None else None
+
+
+def _decode_date(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
@@ -0,0 +1,272 @@
+"""
+Streaming export of account statements to CSV or a compact binary format.
+"""
+import csv
+import gzip
+import io
+import multiprocessing
+import os
+import shutil
+import struct
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Iterable, List, Optional, Tuple
+
+from ..business.domain.current_account import CurrentAccount
+from ..business.domain.ledger import DEPOSIT, NO_COUNTERPARTY, decode_timestamp
+from .database import Database
+
+CSV = "csv"
+BINARY = "binary"
+FORMATS = (CSV, BINARY)
+
+CSV_HEADER = ("branch", "account", "date", "type", "amount", "location", "envelope",
+              "counterparty_branch", "counterparty_account")
+TYPE_NAMES = ("deposit", "withdrawal", "transfer_out", "transfer_in")
+
+# Binary format: a header, then one fixed-width record per transaction, little-endian
+BINARY_MAGIC = b"BKST"
+BINARY_VERSION = 1
+# Magic, version, record size
+BINARY_HEADER = struct.Struct('<4sHH')
+# Branch, account, timestamp (microseconds since the epoch), type, amount, location, envelope,
+# counterparty branch and account (-1 if none)
+BINARY_RECORD = struct.Struct('<iiqbdiqii')
+
+# Database of an export worker process, opened from the snapshot of the export
+_worker_database: Optional[Database] = None
+
+
+class ExportSummary:
+    """
+    Outcome of an export: what was written, and how fast.
+
+    Accounts that were asked for but do not exist are not counted.
+    """
+
+    __slots__ = ('accounts', 'rows', 'data_bytes', 'file_bytes', 'seconds')
+
+    def __init__(self, accounts: int, rows: int, data_bytes: int, file_bytes: int, seconds: float):
+        self.accounts = accounts
+        self.rows = rows
+        self.data_bytes = data_bytes
+        self.file_bytes = file_bytes
+        self.seconds = seconds
+
+    def get_accounts(self) -> int:
+        return self.accounts
+
+    def get_rows(self) -> int:
+        return self.rows
+
+    def get_data_bytes(self) -> int:
+        """Get the size of the exported data, before compression."""
+        return self.data_bytes
+
+    def get_file_bytes(self) -> int:
+        """Get the size of the output file."""
+        return self.file_bytes
+
+    def get_seconds(self) -> float:
+        return self.seconds
+
+    def get_rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def get_megabytes_per_second(self) -> float:
+        """Get the throughput in megabytes of exported data (before compression) per second."""
+        return self.data_bytes / 1e6 / self.seconds if self.seconds else 0.0
+
+
+class StatementExporter:
+    """
+    Writes the statements of many accounts to one file, oldest transaction first per account.
+
+    Rows are encoded straight from the ledger columns, chunk_rows at a
+    time, so neither Transaction objects nor whole statements are ever
+    built. The account is locked only while a chunk is encoded.
+
+    With workers > 1, accounts are split into tasks run by a pool of
+    spawned processes; each opens a snapshot of the database, which loads
+    only the accounts it exports, and writes a part file per task. The
+    parts are then concatenated in order (gzip allows concatenated
+    members). The snapshot is snapshot_path, if it holds the same data as
+    the database, or else a temporary copy written at the start of the
+    export, so the export shows the accounts as they were at that point.
+    With workers <= 1, accounts are exported in this process.
+    """
+
+    def __init__(self, database: Database, output_format: str = CSV, compress: bool = False,
+                 chunk_rows: int = 65536, workers: Optional[int] = None, snapshot_path: Optional[str] = None):
+        if output_format not in FORMATS:
+            raise ValueError(f"unknown format: {output_format}")
+        self.database = database
+        self.snapshot_path = snapshot_path
+        self.output_format = output_format
+        self.compress = compress
+        self.chunk_rows = chunk_rows
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+
+    def export(self, path: str, accounts: Optional[Iterable[Tuple[int, int]]] = None,
+               begin: Optional[datetime] = None, end: Optional[datetime] = None) -> ExportSummary:
+        """
+        Export the statements of some accounts (branch and account numbers), or of all of them.
+
+        Only transactions dated between begin and end (inclusive) are
+        exported, if given. Accounts that do not exist are skipped.
+        """
+        start = time.perf_counter()
+        if accounts is None:
+            accounts = sorted((account.get_id().get_branch().get_number(), account.get_id().get_number())
+                              for account in self.database.get_all_current_accounts())
+        else:
+            accounts = list(accounts)
+
+        with open(path, 'wb') as output:
+            data_bytes = self._write_header(output)
+            if self.workers > 1 and len(accounts) > 1:
+                exported, rows, part_bytes = self._export_parallel(output, accounts, begin, end)
+            else:
+                exported, rows, part_bytes = self._export_accounts(output, accounts, begin, end)
+            data_bytes += part_bytes
+            file_bytes = output.tell()
+        return ExportSummary(exported, rows, data_bytes, file_bytes, time.perf_counter() - start)
+
+    def _write_header(self, output: BinaryIO) -> int:
+        """Write the header of the export. Return its size before compression."""
+        if self.output_format == CSV:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(CSV_HEADER)
+            header = buffer.getvalue().encode('utf-8')
+        else:
+            header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, BINARY_RECORD.size)
+        output.write(gzip.compress(header) if self.compress else header)
+        return len(header)
+
+    def _export_parallel(self, output: BinaryIO, accounts: List[Tuple[int, int]],
+                         begin: Optional[datetime], end: Optional[datetime]) -> Tuple[int, int, int]:
+        """Export the accounts in spawned worker processes, appending their part files to output in order."""
+        # A few tasks per worker, so uneven accounts balance out
+        task_size = max(1, -(-len(accounts) // (self.workers * 4)))
+        tasks = [accounts[index:index + task_size] for index in range(0, len(accounts), task_size)]
+        exported = rows = data_bytes = 0
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output.name))) as directory:
+            snapshot_path = self.snapshot_path
+            if snapshot_path is None:
+                snapshot_path = os.path.join(directory, "export.snap")
+                self.database.save_snapshot(snapshot_path, truncate_wal=False)
+            with ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'),
+                                     initializer=_open_worker_database, initargs=(snapshot_path,)) as pool:
+                parts = [os.path.join(directory, f"part-{index:06d}") for index in range(len(tasks))]
+                results = pool.map(_export_task, [(self.output_format, self.compress, self.chunk_rows, part,
+                                                   task, begin, end) for part, task in zip(parts, tasks)])
+                for part, (task_accounts, task_rows, task_bytes) in zip(parts, results):
+                    with open(part, 'rb') as part_file:
+                        shutil.copyfileobj(part_file, output, 1 << 20)
+                    os.remove(part)
+                    exported += task_accounts
+                    rows += task_rows
+                    data_bytes += task_bytes
+        return exported, rows, data_bytes
+
+    def _export_accounts(self, output: BinaryIO, accounts: Iterable[Tuple[int, int]],
+                         begin: Optional[datetime], end: Optional[datetime]) -> Tuple[int, int, int]:
+        """
+        Export accounts to output.
+
+        Return the number of accounts exported, and of rows and bytes
+        (before compression) written.
+        """
+        exported = rows = data_bytes = 0
+        stream = gzip.GzipFile(fileobj=output, mode='wb', compresslevel=6) if self.compress else output
+        try:
+            for branch, number in accounts:
+                account = self.database.find_current_account(branch, number)
+                if account is None:
+                    continue
+                exported += 1
+                for count, chunk in self._encode_account(account, begin, end):
+                    stream.write(chunk)
+                    rows += count
+                    data_bytes += len(chunk)
+        finally:
+            if stream is not output:
+                stream.close()
+        return exported, rows, data_bytes
+
+    def _encode_account(self, account: CurrentAccount, begin: Optional[datetime],
+                        end: Optional[datetime]) -> Iterable[Tuple[int, bytes]]:
+        """Encode the statement of an account, one chunk of rows at a time."""
+        account_id = account.get_id()
+        branch, number = account_id.get_branch().get_number(), account_id.get_number()
+        with CurrentAccount.locked(account):
+            ledger = account.get_ledger()
+            # Row numbers only: 4 bytes per transaction
+            rows = ledger.rows_between(begin or datetime.min, end or datetime.max)
+        counterparties = None
+        for start in range(0, len(rows), self.chunk_rows):
+            with CurrentAccount.locked(account):
+                if counterparties is None or len(counterparties) < len(ledger.counterparty_table):
+                    counterparties = [(counterparty.get_id().get_branch().get_number(),
+                                       counterparty.get_id().get_number())
+                                      for counterparty in ledger.counterparty_table]
+                chunk = rows[start:start + self.chunk_rows]
+                if self.output_format == CSV:
+                    encoded = self._encode_csv(ledger, chunk, branch, number, counterparties)
+                else:
+                    encoded = self._encode_binary(ledger, chunk, branch, number, counterparties)
+            yield len(chunk), encoded
+
+    @staticmethod
+    def _encode_csv(ledger, rows, branch: int, number: int, counterparties: List[Tuple[int, int]]) -> bytes:
+        timestamps, kinds, amounts = ledger.timestamps, ledger.kinds, ledger.amounts
+        locations, envelopes, references = ledger.locations, ledger.envelopes, ledger.counterparties
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            reference = references[row]
+            counterparty = counterparties[reference] if reference != NO_COUNTERPARTY else ("", "")
+            kind = kinds[row]
+            writer.writerow((branch, number, decode_timestamp(timestamps[row]).isoformat(sep=' '),
+                             TYPE_NAMES[kind], f"{amounts[row]:.2f}", locations[row],
+                             envelopes[row] if kind == DEPOSIT else "", counterparty[0], counterparty[1]))
+        return buffer.getvalue().encode('utf-8')
+
+    @staticmethod
+    def _encode_binary(ledger, rows, branch: int, number: int, counterparties: List[Tuple[int, int]]) -> bytes:
+        timestamps, kinds, amounts = ledger.timestamps, ledger.kinds, ledger.amounts
+        locations, envelopes, references = ledger.locations, ledger.envelopes, ledger.counterparties
+        pack = BINARY_RECORD.pack
+        return b"".join([pack(branch, number, timestamps[row], kinds[row], amounts[row], locations[row],
+                              envelopes[row],
+                              *(counterparties[references[row]] if references[row] != NO_COUNTERPARTY
+                                else (-1, -1)))
+                         for row in rows])
+
+
+def read_binary(stream: BinaryIO) -> Iterable[tuple]:
+    """Read the records of a binary export, as tuples in BINARY_RECORD field order."""
+    magic, version, record_size = BINARY_HEADER.unpack(stream.read(BINARY_HEADER.size))
+    if magic != BINARY_MAGIC or version != BINARY_VERSION or record_size != BINARY_RECORD.size:
+        raise ValueError("not a statement export")
+    while True:
+        block = stream.read(record_size * 4096)
+        if not block:
+            return
+        yield from BINARY_RECORD.iter_unpack(block)
+
+
+def _open_worker_database(snapshot_path: str) -> None:
+    """Open the snapshot of the export, in a worker process."""
+    global _worker_database
+    _worker_database = Database(init_data=False, snapshot_path=snapshot_path)
+
+
+def _export_task(task: tuple) -> Tuple[int, int, int]:
+    """Export some accounts to a part file, in a worker process."""
+    output_format, compress, chunk_rows, path, accounts, begin, end = task
+    exporter = StatementExporter(_worker_database, output_format, compress, chunk_rows, workers=0)
+    with open(path, 'wb') as output:
+        return exporter._export_accounts(output, accounts, begin, end)
@@ -0,0 +1,286 @@
+"""
+Compact binary snapshots of the database, loaded lazily through mmap.
+
+Layout (little endian):
+
+    header      magic, WAL position, next account number,
+                account count, directory offset
+    catalog     operation locations and employees
+    accounts    one block per account: account and client fields, the
+                counterparty table and the raw ledger columns
+    directory   (branch, number, block offset) entries sorted by id
+
+Only the header and the catalog are read when a snapshot is opened. Accounts
+are found by binary search over the directory and their transaction history
+is decoded the first time it is needed, so restart cost grows with the
+accounts touched instead of the total history.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
+
+from ..business.domain.client import Client
+from ..business.domain.current_account import CurrentAccount
+from ..business.domain.employee import Employee
+from ..business.domain.ledger import Ledger, encode_timestamp, decode_timestamp
+from ..business.domain.operation_location import OperationLocation, Branch, ATM
+from .wal import sync_directory
+
+if TYPE_CHECKING:
+    from .database import Database
+
+
+MAGIC = b'BANKSNP2'
+
+_HEADER = struct.Struct('<8sqqqq')
+_COUNT = struct.Struct('<q')
+_LOCATION = struct.Struct('<Bq')
+_DATE = struct.Struct('<q')
+_STRING_LENGTH = struct.Struct('<i')
+_ACCOUNT = struct.Struct('<qqdqq')
+_HISTORY = struct.Struct('<qq')
+_COUNTERPARTY = struct.Struct('<qq')
+_DIRECTORY_ENTRY = struct.Struct('<qqq')
+
+_BRANCH_TYPE = 0
+_ATM_TYPE = 1
+
+_NO_DATE = -2 ** 63
+
+
+def write_snapshot(database: 'Database', path: str, next_account_number: int,
+                   wal_position: int = 0) -> None:
+    """
+    Write a snapshot of the whole database to path.
+
+    The file is written next to path and atomically renamed over it, so a
+    crash while writing never leaves a truncated snapshot behind. The rename
+    is made durable before returning, since the caller may then drop the
+    records the snapshot holds from the write-ahead log.
+    """
+    temporary_path = path + '.tmp'
+    accounts = sorted(database.get_all_current_accounts(),
+                      key=lambda a: (a.get_id().get_branch().get_number(), a.get_id().get_number()))
+    directory = bytearray()
+
+    with open(temporary_path, 'wb') as snapshot_file:
+        snapshot_file.write(_HEADER.pack(MAGIC, 0, 0, 0, 0))
+        snapshot_file.write(_encode_catalog(database))
+        for account in accounts:
+            account_id = account.get_id()
+            directory += _DIRECTORY_ENTRY.pack(account_id.get_branch().get_number(),
+                                               account_id.get_number(), snapshot_file.tell())
+            snapshot_file.write(_encode_account(account))
+        directory_offset = snapshot_file.tell()
+        snapshot_file.write(directory)
+        snapshot_file.seek(0)
+        snapshot_file.write(_HEADER.pack(MAGIC, wal_position,
+                                         next_account_number,
+                                         len(accounts), directory_offset))
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+
+    os.replace(temporary_path, path)
+    sync_directory(path)
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view of a snapshot file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.wal_position, self.next_account_number,
+         self.account_count, self.directory_offset) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"not a bank snapshot: {path}")
+
+    def get_wal_position(self) -> int:
+        return self.wal_position
+
+    def get_next_account_number(self) -> int:
+        return self.next_account_number
+
+    def close(self) -> None:
+        """Unmap and close the snapshot file."""
+        self._map.close()
+        self._file.close()
+
+    def load_catalog(self) -> Tuple[List[OperationLocation], List[Employee]]:
+        """Decode the operation locations and employees."""
+        offset = _HEADER.size
+        locations: List[OperationLocation] = []
+        (count,) = _COUNT.unpack_from(self._map, offset)
+        offset += _COUNT.size
+        for _ in range(count):
+            location_type, number = _LOCATION.unpack_from(self._map, offset)
+            offset += _LOCATION.size
+            name, offset = self._read_string(offset)
+            locations.append(Branch(number, name) if location_type == _BRANCH_TYPE else ATM(number))
+
+        employees: List[Employee] = []
+        (count,) = _COUNT.unpack_from(self._map, offset)
+        offset += _COUNT.size
+        for _ in range(count):
+            first_name, offset = self._read_string(offset)
+            last_name, offset = self._read_string(offset)
+            username, offset = self._read_string(offset)
+            password, offset = self._read_string(offset)
+            (birthday,) = _DATE.unpack_from(self._map, offset)
+            offset += _DATE.size
+            employees.append(Employee(first_name, last_name, username, password,
+                                      _decode_date(birthday)))
+        return locations, employees
+
+    def find_account(self, branch: int, number: int) -> Optional[int]:
+        """Binary search the directory. Return the offset of the account block, if present."""
+        key = (branch, number)
+        low, high = 0, self.account_count
+        while low < high:
+            middle = (low + high) // 2
+            entry_branch, entry_number, offset = _DIRECTORY_ENTRY.unpack_from(
+                self._map, self.directory_offset + middle * _DIRECTORY_ENTRY.size)
+            entry_key = (entry_branch, entry_number)
+            if entry_key == key:
+                return offset
+            if entry_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def iter_accounts(self) -> Iterator[Tuple[int, int, int]]:
+        """Iterate over (branch, number, block offset) of every account in the snapshot."""
+        for index in range(self.account_count):
+            yield _DIRECTORY_ENTRY.unpack_from(
+                self._map, self.directory_offset + index * _DIRECTORY_ENTRY.size)
+
+    def load_account(self, offset: int, database: 'Database') -> CurrentAccount:
+        """
+        Decode the account block at offset.
+
+        The transaction history is not decoded here: it is deferred to the
+        first time the account's transactions are needed.
+        """
+        branch_number, number, balance, cpf, birthday = _ACCOUNT.unpack_from(self._map, offset)
+        offset += _ACCOUNT.size
+        first_name, offset = self._read_string(offset)
+        last_name, offset = self._read_string(offset)
+        password, offset = self._read_string(offset)
+
+        client = Client(first_name, last_name, cpf, password, _decode_date(birthday))
+        branch = database.get_operation_location(branch_number)
+        account = CurrentAccount(branch, number, client, balance)
+        history_offset = offset
+        account.set_transaction_loader(
+            lambda a: self._load_transactions(a, history_offset, database))
+        return account
+
+    def _load_transactions(self, account: CurrentAccount, offset: int, database: 'Database') -> None:
+        """Decode the ledger of an account."""
+        rows, counterparty_count = _HISTORY.unpack_from(self._map, offset)
+        offset += _HISTORY.size
+
+        counterparties = []
+        for branch, number in _COUNTERPARTY.iter_unpack(
+                self._map[offset:offset + counterparty_count * _COUNTERPARTY.size]):
+            counterparties.append(database.find_current_account(branch, number))
+        offset += counterparty_count * _COUNTERPARTY.size
+
+        columns = {}
+        for name, typecode in Ledger.COLUMNS:
+            column = array(typecode)
+            size = rows * column.itemsize
+            column.frombytes(self._map[offset:offset + size])
+            if sys.byteorder != 'little':
+                column.byteswap()
+            columns[name] = column
+            offset += size
+
+        locations = {number: database.get_operation_location(number)
+                     for number in set(columns['locations'])}
+        account.ledger.set_columns(columns, locations, counterparties)
+
+    def _read_string(self, offset: int) -> Tuple[Optional[str], int]:
+        (length,) = _STRING_LENGTH.unpack_from(self._map, offset)
+        offset += _STRING_LENGTH.size
+        if length < 0:
+            return None, offset
+        return self._map[offset:offset + length].decode('utf-8'), offset + length
+
+
+def _encode_catalog(database: 'Database') -> bytes:
+    """Encode the operation locations and employees of the database."""
+    data = bytearray()
+    locations = list(database.get_all_operation_locations())
+    data += _COUNT.pack(len(locations))
+    for location in locations:
+        if isinstance(location, Branch):
+            data += _LOCATION.pack(_BRANCH_TYPE, location.get_number())
+            data += _encode_string(location.get_name())
+        else:
+            data += _LOCATION.pack(_ATM_TYPE, location.get_number())
+            data += _encode_string(None)
+
+    employees = list(database.get_all_employees())
+    data += _COUNT.pack(len(employees))
+    for employee in employees:
+        data += _encode_string(employee.get_first_name())
+        data += _encode_string(employee.get_last_name())
+        data += _encode_string(employee.get_username())
+        data += _encode_string(employee.get_password())
+        data += _DATE.pack(_encode_date(employee.get_birthday()))
+    return bytes(data)
+
+
+def _encode_account(account: CurrentAccount) -> bytes:
+    """Encode an account block, including its whole ledger."""
+    account_id = account.get_id()
+    client = account.get_client()
+    ledger = account.get_ledger()
+
+    data = bytearray(_ACCOUNT.pack(account_id.get_branch().get_number(), account_id.get_number(),
+                                   account.get_balance(), client.get_cpf(),
+                                   _encode_date(client.get_birthday())))
+    data += _encode_string(client.get_first_name())
+    data += _encode_string(client.get_last_name())
+    data += _encode_string(client.get_password())
+    data += _HISTORY.pack(len(ledger), len(ledger.counterparty_table))
+    for counterparty in ledger.counterparty_table:
+        counterparty_id = counterparty.get_id()
+        data += _COUNTERPARTY.pack(counterparty_id.get_branch().get_number(), counterparty_id.get_number())
+
+    for name, column in ledger.get_columns().items():
+        if sys.byteorder != 'little':
+            column = array(column.typecode, column)
+            column.byteswap()
+        data += column.tobytes()
+    return bytes(data)
+
+
+def _encode_string(value: Optional[str]) -> bytes:
+    if value is None:
+        return _STRING_LENGTH.pack(-1)
+    encoded = value.encode('utf-8')
+    return _STRING_LENGTH.pack(len(encoded)) + encoded
+
+
+def _encode_date(date: Optional[datetime]) -> int:
+    """Encode a naive datetime as microseconds since the epoch."""
+    if date is None:
+        return _NO_DATE
+    return encode_timestamp(date)
+
+
+def _decode_date(value: int) -> Optional[datetime]:
+    if value == _NO_DATE:
+        return None
+    return decode_timestamp(value)
@@ -0,0 +1,465 @@
+"""
+SQLite storage backend for the banking system.
+"""
+import queue
+import sqlite3
+from array import array
+from bisect import bisect_left
+import threading
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Collection, Dict, Iterator, Optional, Sequence
+
+from ..business.domain.account_listener import AccountListener
+from ..business.domain.client import Client
+from ..business.domain.current_account import CurrentAccount
+from ..business.domain.current_account_id import CurrentAccountId
+from ..business.domain.employee import Employee
+from ..business.domain.ledger import DEPOSIT, WITHDRAWAL, TRANSFER_OUT, TRANSFER_IN
+from ..business.domain.operation_location import OperationLocation, Branch, ATM
+from ..business.domain.transaction import Transaction, Deposit, Withdrawal
+from .database import Database
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS operation_locations (
+    number INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS employees (
+    username TEXT PRIMARY KEY,
+    first_name TEXT,
+    last_name TEXT,
+    password TEXT,
+    birthday TEXT
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    branch INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    first_name TEXT,
+    last_name TEXT,
+    cpf INTEGER,
+    password TEXT,
+    birthday TEXT,
+    balance REAL NOT NULL,
+    PRIMARY KEY (branch, number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    branch INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    location INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    date TEXT NOT NULL,
+    envelope INTEGER,
+    dst_branch INTEGER,
+    dst_number INTEGER
+);
+CREATE INDEX IF NOT EXISTS transactions_by_account
+    ON transactions (branch, number, date);
+CREATE INDEX IF NOT EXISTS transactions_by_destination
+    ON transactions (dst_branch, dst_number, date) WHERE dst_branch IS NOT NULL;
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Statements are kept as constants so every pooled connection reuses its
+# compiled form from the sqlite3 statement cache.
+_SELECT_LOCATIONS = "SELECT number, type, name FROM operation_locations"
+_INSERT_LOCATION = "INSERT OR REPLACE INTO operation_locations (number, type, name) VALUES (?, ?, ?)"
+_SELECT_EMPLOYEE = ("SELECT first_name, last_name, username, password, birthday "
+                    "FROM employees WHERE username = ?")
+_SELECT_EMPLOYEES = "SELECT first_name, last_name, username, password, birthday FROM employees"
+_INSERT_EMPLOYEE = ("INSERT OR REPLACE INTO employees (username, first_name, last_name, password, birthday) "
+                    "VALUES (?, ?, ?, ?, ?)")
+_SELECT_ACCOUNT = ("SELECT branch, number, first_name, last_name, cpf, password, birthday, balance "
+                   "FROM accounts WHERE branch = ? AND number = ?")
+_SELECT_ACCOUNTS = ("SELECT branch, number, first_name, last_name, cpf, password, birthday, balance "
+                    "FROM accounts")
+_INSERT_ACCOUNT = ("INSERT OR REPLACE INTO accounts "
+                   "(branch, number, first_name, last_name, cpf, password, birthday, balance) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+_UPDATE_BALANCE = "UPDATE accounts SET balance = ? WHERE branch = ? AND number = ?"
+_INSERT_TRANSACTION = ("INSERT INTO transactions "
+                       "(kind, branch, number, location, amount, date, envelope, dst_branch, dst_number) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+_UPDATE_TRANSACTION_DATE = "UPDATE transactions SET date = ? WHERE id = ?"
+_SELECT_HISTORY = ("SELECT id, 0 AS incoming, kind, branch, number, location, amount, date, envelope, "
+                   "dst_branch, dst_number FROM transactions WHERE branch = ?1 AND number = ?2 "
+                   "UNION ALL "
+                   "SELECT id, 1 AS incoming, kind, branch, number, location, amount, date, envelope, "
+                   "dst_branch, dst_number FROM transactions WHERE dst_branch = ?1 AND dst_number = ?2 "
+                   "ORDER BY id, incoming")
+_SELECT_COUNTER = "SELECT value FROM counters WHERE name = ?"
+_UPSERT_COUNTER = ("INSERT INTO counters (name, value) VALUES (?, ?) "
+                   "ON CONFLICT (name) DO UPDATE SET value = excluded.value")
+
+_NEXT_ACCOUNT_NUMBER = "next_account_number"
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections shareable across threads.
+    """
+
+    def __init__(self, path: str, size: int = 4):
+        self._connections: queue.Queue = queue.Queue()
+        for _ in range(size):
+            connection = sqlite3.connect(path, check_same_thread=False, uri=path.startswith('file:'),
+                                         timeout=30, isolation_level=None, cached_statements=256)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            self._connections.put(connection)
+        self.size = size
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of the block."""
+        connection = self._connections.get()
+        try:
+            yield connection
+        finally:
+            self._connections.put(connection)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection and run the block in a single write transaction."""
+        with self.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        for _ in range(self.size):
+            self._connections.get().close()
+
+
+class SqliteDatabase(AccountListener):
+    """
+    SQLite-backed database with the same interface as Database.
+
+    Accounts are materialized on demand and kept in an identity map only
+    while referenced, and their transaction history is loaded the first time
+    it is needed, so the services run unchanged against datasets that do not
+    fit in memory. Mutations made through the domain objects are written
+    back as they happen.
+
+    Each materialized account gets its own Branch instance, so
+    Branch.get_accounts() only lists accounts created through it.
+    """
+
+    def __init__(self, path: str, init_data: bool = True, pool_size: int = 4):
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.connection() as connection:
+            connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._accounts: 'weakref.WeakValueDictionary[CurrentAccountId, CurrentAccount]' = \
+            weakref.WeakValueDictionary()
+        # Transaction ids of the ledger rows of each account, in row order
+        self._row_ids: 'weakref.WeakKeyDictionary[CurrentAccount, array]' = weakref.WeakKeyDictionary()
+        self.operation_locations: Dict[int, OperationLocation] = {}
+        # The same locations by type
+        self.branches: Dict[int, Branch] = {}
+        self.atms: Dict[int, ATM] = {}
+        self.employees: Dict[str, Employee] = {}
+
+        with self.pool.connection() as connection:
+            for number, location_type, name in connection.execute(_SELECT_LOCATIONS):
+                self._index_location(Branch(number, name) if location_type == "branch" else ATM(number))
+            row = connection.execute(_SELECT_COUNTER, (_NEXT_ACCOUNT_NUMBER,)).fetchone()
+        self._next_account_number = row[0] if row is not None else 1
+
+        if init_data and not self.operation_locations:
+            self._init_data()
+
+    def close(self) -> None:
+        """Close the connection pool."""
+        self.pool.close()
+
+    def get_all_current_accounts(self) -> Collection[CurrentAccount]:
+        """Get all current accounts."""
+        with self.pool.connection() as connection:
+            rows = connection.execute(_SELECT_ACCOUNTS).fetchall()
+        return [self._materialize_account(row) for row in rows]
+
+    def get_all_employees(self) -> Collection[Employee]:
+        """Get all employees."""
+        with self.pool.connection() as connection:
+            for row in connection.execute(_SELECT_EMPLOYEES):
+                if row[2] not in self.employees:
+                    self.employees[row[2]] = _employee_from_row(row)
+        return self.employees.values()
+
+    def get_all_operation_locations(self) -> Collection[OperationLocation]:
+        """Get all operation locations."""
+        return self.operation_locations.values()
+
+    def get_branches(self) -> Collection[Branch]:
+        """Get all branches."""
+        return self.branches.values()
+
+    def get_atms(self) -> Collection[ATM]:
+        """Get all ATMs."""
+        return self.atms.values()
+
+    def get_current_account(self, current_account_id: CurrentAccountId) -> Optional[CurrentAccount]:
+        """Get current account by ID."""
+        current_account = self._accounts.get(current_account_id)
+        if current_account is not None:
+            return current_account
+        with self.pool.connection() as connection:
+            row = connection.execute(_SELECT_ACCOUNT, (current_account_id.get_branch().get_number(),
+                                                       current_account_id.get_number())).fetchone()
+        if row is None:
+            return None
+        return self._materialize_account(row)
+
+    def find_current_account(self, branch: int, number: int) -> Optional[CurrentAccount]:
+        """Get current account by branch number and account number."""
+        location = self.operation_locations.get(branch)
+        if not isinstance(location, Branch):
+            return None
+        # The stored Branch serves as the id's branch, so no Branch is built per lookup
+        return self.get_current_account(CurrentAccountId(location, number))
+
+    def get_employee(self, username: str) -> Optional[Employee]:
+        """Get employee by username."""
+        employee = self.employees.get(username)
+        if employee is None:
+            with self.pool.connection() as connection:
+                row = connection.execute(_SELECT_EMPLOYEE, (username,)).fetchone()
+            if row is not None:
+                employee = self.employees.setdefault(username, _employee_from_row(row))
+        return employee
+
+    def get_operation_location(self, number: int) -> Optional[OperationLocation]:
+        """Get operation location by number."""
+        return self.operation_locations.get(number)
+
+    def get_next_current_account_number(self) -> int:
+        """Get next available account number."""
+        return self.reserve_account_numbers(1)
+
+    def reserve_account_numbers(self, count: int) -> int:
+        """Reserve a block of count consecutive account numbers. Return the first one."""
+        with self._lock:
+            number = self._next_account_number
+            self._set_next_account_number(number + count)
+        return number
+
+    def save_current_account(self, current_account: CurrentAccount) -> None:
+        """Save current account."""
+        account_id = current_account.get_id()
+        client = current_account.get_client()
+        with self.pool.transaction() as connection:
+            connection.execute(_INSERT_ACCOUNT, (
+                account_id.get_branch().get_number(), account_id.get_number(),
+                client.get_first_name(), client.get_last_name(), client.get_cpf(),
+                client.get_password(), _encode_date(client.get_birthday()),
+                current_account.get_balance(),
+            ))
+        with self._lock:
+            self._accounts[account_id] = current_account
+            if current_account not in self._row_ids:
+                self._row_ids[current_account] = array('q')
+            if account_id.get_number() >= self._next_account_number:
+                self._set_next_account_number(account_id.get_number() + 1)
+        current_account.add_listener(self)
+
+    def save_new_current_accounts(self, branch: Branch, first_number: int, rows: Sequence[tuple]) -> None:
+        """
+        Save a block of new accounts, numbered consecutively from first_number.
+
+        Each row holds the first name, last name, CPF, password, birthday
+        and initial balance of one account. The rows are inserted in a
+        single transaction, without materializing the accounts.
+        """
+        branch_number = branch.get_number()
+        with self.pool.transaction() as connection:
+            connection.executemany(_INSERT_ACCOUNT, (
+                (branch_number, first_number + offset, first_name, last_name, cpf, password,
+                 _encode_date(birthday), balance)
+                for offset, (first_name, last_name, cpf, password, birthday, balance) in enumerate(rows)))
+        with self._lock:
+            if first_number + len(rows) > self._next_account_number:
+                self._set_next_account_number(first_number + len(rows))
+
+    def save_employee(self, employee: Employee) -> None:
+        """Save employee."""
+        with self.pool.transaction() as connection:
+            connection.execute(_INSERT_EMPLOYEE, (
+                employee.get_username(), employee.get_first_name(), employee.get_last_name(),
+                employee.get_password(), _encode_date(employee.get_birthday()),
+            ))
+        self.employees[employee.get_username()] = employee
+
+    def save_operation_location(self, operation_location: OperationLocation) -> None:
+        """Save operation location."""
+        if isinstance(operation_location, Branch):
+            row = (operation_location.get_number(), "branch", operation_location.get_name())
+        else:
+            row = (operation_location.get_number(), "atm", None)
+        with self.pool.transaction() as connection:
+            connection.execute(_INSERT_LOCATION, row)
+        self._index_location(operation_location)
+
+    def transaction_recorded(self, account: CurrentAccount, transaction: Transaction) -> None:
+        """
+        Write a transaction and the resulting balances.
+
+        For a transfer with an account held elsewhere, the stand-in of the
+        remote account has no row, so only the local balance changes.
+        """
+        source = transaction.get_account()
+        account_id = source.get_id()
+        envelope = dst_branch = dst_number = None
+        destination = None
+        if isinstance(transaction, Deposit):
+            kind = "deposit"
+            envelope = transaction.get_envelope()
+        elif isinstance(transaction, Withdrawal):
+            kind = "withdrawal"
+        else:
+            kind = "transfer"
+            destination = transaction.get_destination_account()
+            dst_branch = destination.get_id().get_branch().get_number()
+            dst_number = destination.get_id().get_number()
+
+        with self.pool.transaction() as connection:
+            cursor = connection.execute(_INSERT_TRANSACTION, (
+                kind, account_id.get_branch().get_number(), account_id.get_number(),
+                transaction.get_location().get_number(), transaction.get_amount(),
+                _encode_date(transaction.get_date()), envelope, dst_branch, dst_number,
+            ))
+            connection.execute(_UPDATE_BALANCE, (source.get_balance(),
+                                                 account_id.get_branch().get_number(),
+                                                 account_id.get_number()))
+            if destination is not None:
+                connection.execute(_UPDATE_BALANCE, (destination.get_balance(), dst_branch, dst_number))
+        for recorded_account in (source, destination):
+            row_ids = self._row_ids.get(recorded_account) if recorded_account is not None else None
+            if row_ids is not None:
+                row_ids.append(cursor.lastrowid)
+
+    def transaction_date_changed(self, account: CurrentAccount, transaction: Transaction,
+                                 old_date: datetime) -> None:
+        """Write the new date of a transaction."""
+        row_ids = self._row_ids.get(account)
+        if row_ids is None or not 0 <= transaction.get_row() < len(row_ids):
+            return
+        transaction_id = row_ids[transaction.get_row()]
+        with self.pool.transaction() as connection:
+            connection.execute(_UPDATE_TRANSACTION_DATE,
+                               (_encode_date(transaction.get_date()), transaction_id))
+
+    def _index_location(self, operation_location: OperationLocation) -> None:
+        """Store an operation location in the map of all locations and in the map of its type."""
+        number = operation_location.get_number()
+        self.operation_locations[number] = operation_location
+        self.branches.pop(number, None)
+        self.atms.pop(number, None)
+        if isinstance(operation_location, Branch):
+            self.branches[number] = operation_location
+        elif isinstance(operation_location, ATM):
+            self.atms[number] = operation_location
+
+    def _materialize_account(self, row: tuple) -> CurrentAccount:
+        """Get the account of a row from the identity map, or build it."""
+        branch_number, number, first_name, last_name, cpf, password, birthday, balance = row
+        location = self.operation_locations[branch_number]
+        account_id = CurrentAccountId(location, number)
+        with self._lock:
+            current_account = self._accounts.get(account_id)
+            if current_account is not None:
+                return current_account
+            client = Client(first_name, last_name, cpf, password, _decode_date(birthday))
+            current_account = CurrentAccount(Branch(branch_number, location.get_name()), number,
+                                             client, balance)
+            current_account.set_transaction_loader(self._load_transactions)
+            current_account.add_listener(self)
+            self._accounts[account_id] = current_account
+        return current_account
+
+    def _load_transactions(self, account: CurrentAccount) -> None:
+        """Load the transaction history of an account into its ledger."""
+        account_id = account.get_id()
+        with self.pool.connection() as connection:
+            rows = connection.execute(_SELECT_HISTORY, (account_id.get_branch().get_number(),
+                                                        account_id.get_number())).fetchall()
+        ledger = account.ledger
+        row_ids = array('q')
+        for (transaction_id, incoming, kind, branch, number, location, amount, date,
+             envelope, dst_branch, dst_number) in rows:
+            location = self.operation_locations[location]
+            date = _decode_date(date)
+            if kind == "deposit":
+                ledger.append(DEPOSIT, date, amount, location, envelope)
+            elif kind == "withdrawal":
+                ledger.append(WITHDRAWAL, date, amount, location)
+            elif incoming:
+                source = self._get_account(branch, number)
+                row = ledger.append(TRANSFER_IN, date, amount, location, counterparty=source)
+                self._link_transfer(account, row, source, transaction_id, row_ids)
+            else:
+                destination = self._get_account(dst_branch, dst_number)
+                row = ledger.append(TRANSFER_OUT, date, amount, location, counterparty=destination)
+                self._link_transfer(account, row, destination, transaction_id, row_ids)
+            row_ids.append(transaction_id)
+        self._row_ids[account] = row_ids
+
+    def _link_transfer(self, account: CurrentAccount, row: int, counterparty: CurrentAccount,
+                       transaction_id: int, row_ids: array) -> None:
+        """
+        Link a transfer row to the row of the same transfer in the counterparty ledger.
+
+        The link can only be made once both ledgers are loaded; it is made by
+        whichever of the two is loaded last.
+        """
+        if counterparty is account:
+            # Both sides of a transfer to the same account are adjacent rows
+            if row > 0 and row_ids and row_ids[-1] == transaction_id:
+                account.ledger.set_link(row, row - 1)
+                account.ledger.set_link(row - 1, row)
+            return
+        counterparty_ids = self._row_ids.get(counterparty)
+        if counterparty_ids is None:
+            return
+        counterparty_row = bisect_left(counterparty_ids, transaction_id)
+        if counterparty_row < len(counterparty_ids) and counterparty_ids[counterparty_row] == transaction_id:
+            account.ledger.set_link(row, counterparty_row)
+            counterparty.ledger.set_link(counterparty_row, row)
+
+    def _get_account(self, branch: int, number: int) -> CurrentAccount:
+        return self.find_current_account(branch, number)
+
+    def _set_next_account_number(self, value: int) -> None:
+        self._next_account_number = value
+        with self.pool.transaction() as connection:
+            connection.execute(_UPSERT_COUNTER, (_NEXT_ACCOUNT_NUMBER, value))
+
+    # Sample data is shared with the in-memory database
+    _init_data = Database._init_data
+    _create_sample_transactions = Database._create_sample_transactions
+
+
+def _employee_from_row(row: tuple) -> Employee:
+    first_name, last_name, username, password, birthday = row
+    return Employee(first_name, last_name, username, password, _decode_date(birthday))
+
+
+def _encode_date(date: Optional[datetime]) -> Optional[str]:
+    return date.isoformat() if date is not None else None
+
+
+def _decode_date(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
@@ -0,0 +1,390 @@
+"""
+Seeded generator of large synthetic datasets for performance work.
+"""
+import random
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+from itertools import accumulate, chain, repeat
+from typing import Dict, List
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ..business.domain.client import Client
+from ..business.domain.current_account import CurrentAccount
+from ..business.domain.employee import Employee
+from ..business.domain.ledger import (DEPOSIT, WITHDRAWAL, TRANSFER_OUT, TRANSFER_IN, NO_COUNTERPARTY,
+                                      NO_LINK, BALANCE_SIGNS, CHECKPOINT_INTERVAL, encode_timestamp)
+from ..business.domain.operation_location import OperationLocation, Branch, ATM
+from .database import Database
+
+# Row types drawn, by the index of their cumulative weight
+_KIND_OF_DRAW = bytes((DEPOSIT, WITHDRAWAL, TRANSFER_OUT)) + bytes(253)
+
+
+class SyntheticDataGenerator:
+    """
+    Builds branches, ATMs, employees, accounts and their transaction history.
+
+    The same seed and parameters always produce the same data, for the
+    same use_numpy value. Columns are generated in bulk and loaded into each
+    ledger at once, with no Transaction objects and no per-transaction
+    listener calls. When numpy is installed, every column of every account,
+    and the ledger indexes over them, are computed at once with vectorized
+    operations; otherwise row types and
+    locations are drawn for all the transactions at once, from raw random
+    bytes, and timestamps and amounts, which need Python arithmetic on every
+    value, per account. The two ways draw different data from the same seed.
+
+    Every transaction is a deposit, withdrawal or transfer between two
+    distinct accounts, dated between start and end. Balances never go
+    negative: the opening balance of each account covers the lowest point of
+    its own deposits, withdrawals and outgoing transfers, and incoming
+    transfers only add to it.
+
+    Every client and employee has the password PASSWORD.
+    """
+
+    PASSWORD = "123"
+    FIRST_NAMES = ("Ana", "Bruno", "Carla", "Diego", "Elisa", "Fabio", "Gabriela", "Hugo",
+                   "Ingrid", "Joao", "Karen", "Lucas", "Marina", "Nuno", "Olivia", "Pedro")
+    LAST_NAMES = ("Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Costa", "Nunes",
+                  "Almeida", "Ferreira", "Rocha", "Gomes")
+
+    def __init__(self, seed: int = 0, branches: int = 10, atms: int = 50, employees: int = 20,
+                 accounts: int = 10000, transactions: int = 1000000,
+                 start: datetime = datetime(2024, 1, 1), end: datetime = datetime(2025, 1, 1),
+                 deposit_weight: float = 0.4, withdrawal_weight: float = 0.3,
+                 transfer_weight: float = 0.3, max_amount: float = 500.0, use_numpy: bool = True):
+        if branches < 1 or accounts < 2:
+            raise ValueError("at least one branch and two accounts are needed")
+        self.seed = seed
+        self.branches = branches
+        self.atms = atms
+        self.employees = employees
+        self.accounts = accounts
+        self.transactions = transactions
+        self.start = start
+        self.end = end
+        self.kind_weights = (deposit_weight, withdrawal_weight, transfer_weight)
+        self.max_amount = max_amount
+        self.use_numpy = use_numpy and numpy is not None
+
+    def populate(self, database: Database) -> None:
+        """
+        Add the generated data to an empty database.
+
+        Generated transactions are not written to the write-ahead log, so
+        the database must not have one; save a snapshot to persist them.
+        """
+        if database.wal is not None:
+            raise ValueError("synthetic data cannot be written to a write-ahead log")
+        rng = random.Random(self.seed)
+
+        branches = [Branch(number, f"Agência {number}") for number in range(1, self.branches + 1)]
+        atms = [ATM(number) for number in range(self.branches + 1, self.branches + self.atms + 1)]
+        for location in branches + atms:
+            database.save_operation_location(location)
+        for index in range(self.employees):
+            database.save_employee(Employee(rng.choice(self.FIRST_NAMES), rng.choice(self.LAST_NAMES),
+                                            f"employee{index + 1}", self.PASSWORD, self._birthday(rng)))
+
+        first_number = database.reserve_account_numbers(self.accounts)
+        accounts = []
+        for index in range(self.accounts):
+            client = Client(rng.choice(self.FIRST_NAMES), rng.choice(self.LAST_NAMES), 10000000000 + index,
+                            self.PASSWORD, self._birthday(rng))
+            accounts.append(CurrentAccount(branches[index % len(branches)], first_number + index, client))
+
+        location_table = {location.get_number(): location for location in branches + atms}
+        if self.use_numpy:
+            self._fill_ledgers_numpy(rng, accounts, location_table)
+        else:
+            self._fill_ledgers(rng, accounts, location_table)
+        for account in accounts:
+            database.save_current_account(account)
+
+    def _fill_ledgers(self, rng: random.Random, accounts: List[CurrentAccount],
+                      location_table: Dict[int, OperationLocation]) -> None:
+        """Generate the ledger columns and balances of every account."""
+        location_numbers = list(location_table)
+        count = len(accounts)
+        first_timestamp = encode_timestamp(self.start)
+        span = encode_timestamp(self.end) - first_timestamp
+        cents = int(self.max_amount * 100)
+        random_value = rng.random
+
+        # Transactions originated by each account: an even split, with the remainder spread at random
+        own_counts = [self.transactions // count] * count
+        for index in rng.sample(range(count), self.transactions % count):
+            own_counts[index] += 1
+
+        # Kinds and locations of all the own rows, drawn a whole column at a time
+        kind_weights = list(accumulate(self.kind_weights))
+        thresholds = [int(weight / kind_weights[-1] * 2 ** 32) for weight in kind_weights[:-1]]
+        all_kinds = bytes(map(bisect_right, repeat(thresholds), _draw_uint32(rng, self.transactions)))
+        all_kinds = all_kinds.translate(_KIND_OF_DRAW)
+        all_locations = array('i', map(location_numbers.__getitem__,
+                                       map(len(location_numbers).__rmod__, _draw_uint32(rng, self.transactions))))
+        first_row = 0
+
+        # Own rows of every account, and the transfers they originate, in account order
+        ledger_columns = []
+        balances = []
+        transfer_source = array('i')
+        transfer_source_row = array('i')
+        transfer_destination = array('i')
+        for index, rows in enumerate(own_counts):
+            timestamps = [first_timestamp + int(random_value() * span) for _ in range(rows)]
+            timestamps.sort()
+            kinds = all_kinds[first_row:first_row + rows]
+            amounts = [(int(random_value() * cents) + 1) / 100 for _ in range(rows)]
+            envelopes = [1000 + int(random_value() * 9000) if kind == DEPOSIT else 0 for kind in kinds]
+            for row, kind in enumerate(kinds):
+                if kind == TRANSFER_OUT:
+                    # Any account but this one
+                    destination = int(random_value() * (count - 1))
+                    transfer_source.append(index)
+                    transfer_source_row.append(row)
+                    transfer_destination.append(destination + (destination >= index))
+
+            # Opening balance covering the lowest point of the own rows
+            running = list(accumulate((amount if kind == DEPOSIT else -amount
+                                       for kind, amount in zip(kinds, amounts)), initial=0.0))
+            balances.append(int(random_value() * cents) / 100 - min(running) + running[-1])
+
+            ledger_columns.append({
+                'timestamps': array('q', timestamps),
+                'kinds': array('b', kinds),
+                'amounts': array('d', amounts),
+                'locations': all_locations[first_row:first_row + rows],
+                'envelopes': array('q', envelopes),
+                'counterparties': array('i', [NO_COUNTERPARTY]) * rows,
+                'links': array('i', [NO_LINK]) * rows,
+            })
+            first_row += rows
+
+        # Incoming transfers of each account follow its own rows, in transfer order
+        incoming: List[List[int]] = [[] for _ in range(count)]
+        for transfer, destination in enumerate(transfer_destination):
+            incoming[destination].append(transfer)
+        destination_row = array('i', bytes(4 * len(transfer_destination)))
+        for destination, transfers in enumerate(incoming):
+            for row, transfer in enumerate(transfers, own_counts[destination]):
+                destination_row[transfer] = row
+
+        counterparty_tables: List[List[int]] = []
+        first_transfer = 0
+        for index in range(count):
+            columns = ledger_columns[index]
+            last_transfer = first_transfer + columns['kinds'].count(TRANSFER_OUT)
+            destinations = transfer_destination[first_transfer:last_transfer]
+            sources = [transfer_source[transfer] for transfer in incoming[index]]
+            source_rows = [transfer_source_row[transfer] for transfer in incoming[index]]
+            counterparties = list(dict.fromkeys(chain(destinations, sources)))
+            positions = {counterparty: position for position, counterparty in enumerate(counterparties)}
+            counterparty_tables.append(counterparties)
+
+            # Source side of the transfers of this account
+            for transfer, destination in enumerate(destinations, first_transfer):
+                row = transfer_source_row[transfer]
+                columns['counterparties'][row] = positions[destination]
+                columns['links'][row] = destination_row[transfer]
+            first_transfer = last_transfer
+
+            # Destination side of the transfers to this account, copied from their source rows
+            for name in ('timestamps', 'amounts', 'locations'):
+                columns[name].extend([ledger_columns[source][name][row]
+                                      for source, row in zip(sources, source_rows)])
+            columns['kinds'].extend(array('b', [TRANSFER_IN]) * len(sources))
+            columns['envelopes'].extend(array('q', bytes(8 * len(sources))))
+            columns['counterparties'].extend([positions[source] for source in sources])
+            columns['links'].extend(source_rows)
+            balances[index] += sum(columns['amounts'][own_counts[index]:])
+
+        for index, account in enumerate(accounts):
+            account.balance = round(balances[index], 2)
+            # Every ledger shares the table of all locations
+            account.ledger.set_columns(ledger_columns[index], location_table,
+                                       [accounts[counterparty] for counterparty in counterparty_tables[index]])
+            ledger_columns[index] = None
+
+    def _fill_ledgers_numpy(self, rng: random.Random, accounts: List[CurrentAccount],
+                            location_table: Dict[int, OperationLocation]) -> None:
+        """Generate the ledger columns and balances of every account, each column of all of them at once."""
+        generator = numpy.random.default_rng(rng.getrandbits(64))
+        count = len(accounts)
+        total = self.transactions
+        first_timestamp = encode_timestamp(self.start)
+        span = encode_timestamp(self.end) - first_timestamp
+        cents = int(self.max_amount * 100)
+
+        # Transactions originated by each account: an even split, with the remainder spread at random
+        own_counts = numpy.full(count, total // count, dtype=numpy.int64)
+        own_counts[generator.choice(count, total % count, replace=False)] += 1
+        own_starts = _starts(own_counts)
+        owner = numpy.repeat(numpy.arange(count), own_counts)
+
+        # Own rows of every account, in account order; timestamps sorted within each account
+        offsets = (generator.random(total) * span).astype(numpy.int64)
+        timestamps = first_timestamp + offsets[_order_within(owner, offsets, count, span)]
+        kind_weights = numpy.cumsum(self.kind_weights)
+        kinds = numpy.array((DEPOSIT, WITHDRAWAL, TRANSFER_OUT), dtype=numpy.int8)[
+            numpy.searchsorted(kind_weights[:-1] / kind_weights[-1], generator.random(total), side='right')]
+        amounts = (generator.integers(0, cents, total) + 1) / 100
+        locations = numpy.array(list(location_table), dtype=numpy.int32)[
+            generator.integers(0, len(location_table), total)]
+        envelopes = numpy.where(kinds == DEPOSIT, generator.integers(1000, 10000, total), 0)
+
+        # Opening balance covering the lowest point of the own rows
+        running = numpy.concatenate(([0.0], numpy.cumsum(numpy.where(kinds == DEPOSIT, amounts, -amounts))))
+        before = running[own_starts]
+        lowest = numpy.zeros(count)
+        present = own_counts > 0
+        if total:
+            lowest[present] = numpy.minimum(
+                numpy.minimum.reduceat(running[1:] - before[owner], own_starts[present]), 0.0)
+        balances = (generator.integers(0, cents, count) / 100 - lowest
+                    + running[own_starts + own_counts] - before)
+
+        # Transfers, in the order of their source rows, to any account but their source
+        out_rows = numpy.flatnonzero(kinds == TRANSFER_OUT)
+        transfers = len(out_rows)
+        sources = owner[out_rows]
+        source_rows = out_rows - own_starts[sources]
+        destinations = generator.integers(0, count - 1, transfers)
+        destinations += destinations >= sources
+        balances += numpy.bincount(destinations, weights=amounts[out_rows], minlength=count)
+
+        # Incoming transfers of each account follow its own rows, in transfer order
+        by_destination = numpy.argsort(destinations, kind='stable')
+        in_counts = numpy.bincount(destinations, minlength=count)
+        rank = numpy.empty(transfers, dtype=numpy.int64)
+        rank[by_destination] = numpy.arange(transfers) - _starts(in_counts)[destinations[by_destination]]
+        destination_rows = own_counts[destinations] + rank
+
+        # Counterparty table of each account: destinations of its transfers, then sources of the
+        # transfers to it, each once, in order of first appearance
+        entry_accounts = numpy.concatenate((sources, destinations[by_destination]))
+        entry_counterparties = numpy.concatenate((destinations, sources[by_destination]))
+        entry_order = numpy.argsort(entry_accounts, kind='stable')
+        sorted_accounts = entry_accounts[entry_order]
+        sorted_counterparties = entry_counterparties[entry_order]
+        pairs, first_entries, pair_of_entry = numpy.unique(sorted_accounts * count + sorted_counterparties,
+                                                           return_index=True, return_inverse=True)
+        is_first = numpy.zeros(len(sorted_accounts), dtype=bool)
+        is_first[first_entries] = True
+        table_sizes = numpy.bincount(sorted_accounts[is_first], minlength=count)
+        pair_positions = (numpy.cumsum(is_first)[first_entries] - 1) - _starts(table_sizes)[pairs // count]
+        entry_positions = numpy.empty(len(sorted_accounts), dtype=numpy.int32)
+        entry_positions[entry_order] = pair_positions[pair_of_entry.ravel()]
+        incoming_positions = numpy.empty(transfers, dtype=numpy.int32)
+        incoming_positions[by_destination] = entry_positions[transfers:]
+        tables = numpy.split(sorted_counterparties[is_first], numpy.cumsum(table_sizes)[:-1])
+
+        # All the rows, by account: its own rows, then the transfers to it
+        row_counts = own_counts + in_counts
+        starts = _starts(row_counts)
+        own_targets = numpy.arange(total) + (starts - own_starts)[owner]
+        out_targets = own_targets[out_rows]
+        in_targets = starts[destinations] + destination_rows
+        size = total + transfers
+        columns = {
+            'timestamps': numpy.empty(size, dtype=numpy.int64),
+            'kinds': numpy.full(size, TRANSFER_IN, dtype=numpy.int8),
+            'amounts': numpy.empty(size, dtype=numpy.float64),
+            'locations': numpy.empty(size, dtype=numpy.int32),
+            'envelopes': numpy.zeros(size, dtype=numpy.int64),
+            'counterparties': numpy.full(size, NO_COUNTERPARTY, dtype=numpy.int32),
+            'links': numpy.full(size, NO_LINK, dtype=numpy.int32),
+        }
+        for name, values in (('timestamps', timestamps), ('amounts', amounts), ('locations', locations)):
+            columns[name][own_targets] = values
+            columns[name][in_targets] = values[out_rows]
+        columns['kinds'][own_targets] = kinds
+        columns['envelopes'][own_targets] = envelopes
+        columns['counterparties'][out_targets] = entry_positions[:transfers]
+        columns['counterparties'][in_targets] = incoming_positions
+        columns['links'][out_targets] = destination_rows
+        columns['links'][in_targets] = source_rows
+
+        # Ledger indexes: rows of each account by timestamp, with their running balance changes
+        row_accounts = numpy.repeat(numpy.arange(count), row_counts)
+        time_order = _order_within(row_accounts, columns['timestamps'] - first_timestamp, count, span)
+        sorted_timestamps = columns['timestamps'][time_order]
+        sorted_kinds = columns['kinds'][time_order]
+        sorted_amounts = columns['amounts'][time_order]
+        positions = numpy.arange(size) - starts[row_accounts]
+        changes = numpy.concatenate(([0.0], numpy.cumsum(
+            numpy.array(BALANCE_SIGNS, dtype=numpy.float64)[sorted_kinds] * sorted_amounts)))
+        at_checkpoint = (positions + 1) % CHECKPOINT_INTERVAL == 0
+        checkpoints = changes[1:][at_checkpoint] - changes[starts][row_accounts[at_checkpoint]]
+        checkpoint_ends = numpy.cumsum(row_counts // CHECKPOINT_INTERVAL).tolist()
+        time_order = (time_order - starts[row_accounts]).astype(numpy.int32)
+
+        # Monthly rollups: groups of rows of the same account and month, in time order
+        first_month = self.start.year * 12 + self.start.month - 1
+        month_starts = [encode_timestamp(datetime(key // 12, key % 12 + 1, 1))
+                        for key in range(first_month + 1, self.end.year * 12 + self.end.month)]
+        month_keys = first_month + numpy.searchsorted(month_starts, sorted_timestamps, side='right')
+        group_starts = numpy.flatnonzero(numpy.concatenate(
+            ([size > 0], (row_accounts[1:] != row_accounts[:-1]) | (month_keys[1:] != month_keys[:-1]))))
+        group_totals = [numpy.diff(numpy.append(group_starts, size)).tolist()]
+        for kind in (DEPOSIT, WITHDRAWAL, TRANSFER_OUT, TRANSFER_IN):
+            kind_amounts = numpy.where(sorted_kinds == kind, sorted_amounts, 0.0)
+            group_totals.append(numpy.add.reduceat(kind_amounts, group_starts).tolist() if size else [])
+        group_rollups = list(zip(month_keys[group_starts].tolist(), map(list, zip(*group_totals))))
+        group_ends = numpy.cumsum(numpy.bincount(row_accounts[group_starts], minlength=count)).tolist()
+
+        group_start = checkpoint_start = 0
+        ends = (starts + row_counts).tolist()
+        for index, (account, start, end) in enumerate(zip(accounts, starts.tolist(), ends)):
+            account.balance = round(float(balances[index]), 2)
+            ledger_columns = {}
+            for name, code in account.ledger.COLUMNS:
+                ledger_columns[name] = _to_array(code, columns[name][start:end])
+            indexes = (_to_array('i', time_order[start:end]), _to_array('q', sorted_timestamps[start:end]),
+                       dict(group_rollups[group_start:group_ends[index]]),
+                       _to_array('d', checkpoints[checkpoint_start:checkpoint_ends[index]]))
+            group_start = group_ends[index]
+            checkpoint_start = checkpoint_ends[index]
+            # Every ledger shares the table of all locations
+            account.ledger.set_columns(ledger_columns, location_table,
+                                       [accounts[counterparty] for counterparty in tables[index].tolist()], indexes)
+
+    @staticmethod
+    def _birthday(rng: random.Random) -> datetime:
+        return datetime(1950 + rng.randrange(55), rng.randrange(1, 13), rng.randrange(1, 29))
+
+
+def _draw_uint32(rng: random.Random, count: int) -> array:
+    """Draw count uniform 32-bit unsigned integers at once."""
+    values = array('I')
+    values.frombytes(rng.randbytes(values.itemsize * count))
+    return values
+
+
+def _starts(counts: 'numpy.ndarray') -> 'numpy.ndarray':
+    """Get the offset of each group of rows, given the number of rows of every group."""
+    starts = numpy.zeros(len(counts), dtype=numpy.int64)
+    numpy.cumsum(counts[:-1], out=starts[1:])
+    return starts
+
+
+def _order_within(groups: 'numpy.ndarray', values: 'numpy.ndarray', group_count: int,
+                  bound: int) -> 'numpy.ndarray':
+    """Get the order of rows by group, then by value, for values in [0, bound); ties keep their order."""
+    if group_count * bound < 2 ** 63:
+        # A single sort key is several times faster than a lexsort of two
+        return numpy.argsort(groups * bound + values, kind='stable')
+    return numpy.lexsort((values, groups))
+
+
+def _to_array(code: str, values: 'numpy.ndarray') -> array:
+    """Copy a numpy column into a typed array of the given type code, and of the same item type."""
+    column = array(code)
+    column.frombytes(values.tobytes())
+    return column
@@ -0,0 +1,212 @@
+"""
+Append-only write-ahead log with group commit.
+"""
+import json
+import os
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+
+
+class WriteAheadLog:
+    """
+    Append-only log of JSON records, one record per line.
+
+    Writers append records to an in-memory buffer and a background flusher
+    writes and fsyncs everything buffered within a commit window at once, so
+    concurrent operations share a single fsync instead of paying one each.
+
+    Records are numbered from 1 in append order. Once their effects are
+    stored elsewhere, e.g. in a snapshot, the records up to a number can be
+    dropped with truncate: the log is rewritten with the remaining ones,
+    after a first line recording the number of the last dropped record.
+    """
+
+    def __init__(self, path: str, commit_window: float = 0.002, sync: bool = True):
+        self.path = path
+        self.commit_window = commit_window
+        self.sync = sync
+        self._base, record_count = self._recover()
+        self._file = open(path, 'ab')
+        self._lock = threading.Lock()
+        # Serializes writing to the file with replacing it
+        self._write_lock = threading.Lock()
+        self._pending = threading.Condition(self._lock)
+        self._durable = threading.Condition(self._lock)
+        self._buffer: List[bytes] = []
+        self._appended_lsn = self._base + record_count
+        self._durable_lsn = self._base + record_count
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+        self._flusher.start()
+
+    def read_records(self, start: int = 0) -> Iterator[dict]:
+        """
+        Read the records currently in the log numbered after start, in append order.
+
+        Raise ValueError if some of them were dropped by truncate.
+        """
+        with self._lock:
+            base = self._base
+        if start < base:
+            raise ValueError(f"write-ahead log records {start + 1} to {base} were truncated")
+        with open(self.path, 'rb') as log_file:
+            if base > 0:
+                log_file.readline()
+            for number, line in enumerate(log_file, base + 1):
+                if number > start:
+                    yield json.loads(line)
+
+    def truncate(self, lsn: int) -> None:
+        """
+        Drop the records numbered up to lsn, e.g. once a snapshot holds their effects.
+
+        The log is rewritten next to its path and atomically renamed over
+        it, so a crash leaves either the old or the new log behind. Appends
+        proceed meanwhile; their records are written once it is replaced.
+        """
+        # Everything up to lsn must be in the file, not in the buffer
+        self.flush()
+        with self._write_lock:
+            base = self._base
+            if lsn <= base:
+                return
+            temporary_path = self.path + '.tmp'
+            with open(self.path, 'rb') as log_file, open(temporary_path, 'wb') as new_file:
+                if base > 0:
+                    log_file.readline()
+                new_file.write(_encode({"op": "base", "lsn": lsn}))
+                for number, line in enumerate(log_file, base + 1):
+                    if number > lsn:
+                        new_file.write(line)
+                new_file.flush()
+                os.fsync(new_file.fileno())
+            os.replace(temporary_path, self.path)
+            sync_directory(self.path)
+            self._file.close()
+            self._file = open(self.path, 'ab')
+            with self._lock:
+                self._base = lsn
+
+    def get_position(self) -> int:
+        """Get the sequence number of the last appended record (the number of records in the log)."""
+        with self._lock:
+            return self._appended_lsn
+
+    def append(self, record: dict, wait: bool = True) -> int:
+        """
+        Append a record to the log and return its sequence number.
+
+        When wait is true and the log is synchronous, block until the record
+        has been made durable by a group commit.
+        """
+        data = _encode(record)
+        with self._lock:
+            if self._closed:
+                raise ValueError("write-ahead log is closed")
+            self._buffer.append(data)
+            self._appended_lsn += 1
+            lsn = self._appended_lsn
+            self._pending.notify()
+        if wait and self.sync:
+            self.wait_durable(lsn)
+        return lsn
+
+    def wait_durable(self, lsn: int) -> None:
+        """Block until the record with the given sequence number is durable."""
+        with self._lock:
+            while self._durable_lsn < lsn and self._error is None:
+                self._durable.wait()
+            if self._error is not None:
+                raise IOError("write-ahead log flush failed") from self._error
+
+    def flush(self) -> None:
+        """Block until every record appended so far is durable."""
+        with self._lock:
+            lsn = self._appended_lsn
+        self.wait_durable(lsn)
+
+    def close(self) -> None:
+        """Flush pending records and stop the flusher thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._pending.notify()
+        self._flusher.join()
+        self._file.close()
+
+    def _flush_loop(self) -> None:
+        """Background loop performing group commits."""
+        while True:
+            with self._lock:
+                while not self._buffer and not self._closed:
+                    self._pending.wait()
+                if not self._buffer and self._closed:
+                    return
+            if self.commit_window > 0 and not self._closed:
+                # Give concurrent writers a chance to join this commit
+                time.sleep(self.commit_window)
+            with self._lock:
+                batch = self._buffer
+                self._buffer = []
+                lsn = self._appended_lsn
+            try:
+                with self._write_lock:
+                    self._file.write(b''.join(batch))
+                    self._file.flush()
+                    if self.sync:
+                        os.fsync(self._file.fileno())
+            except BaseException as e:
+                with self._lock:
+                    self._error = e
+                    self._durable.notify_all()
+                return
+            with self._lock:
+                self._durable_lsn = lsn
+                self._durable.notify_all()
+
+    def _recover(self) -> Tuple[int, int]:
+        """
+        Truncate a torn record left at the end of the log by a crash.
+
+        Return the number of the last record dropped by truncate and the
+        number of valid records in the log.
+        """
+        if not os.path.exists(self.path):
+            return 0, 0
+        base = 0
+        record_count = 0
+        with open(self.path, 'rb+') as log_file:
+            valid_size = 0
+            for index, line in enumerate(log_file):
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                valid_size += len(line)
+                if index == 0 and record.get("op") == "base":
+                    base = record["lsn"]
+                else:
+                    record_count += 1
+            log_file.truncate(valid_size)
+        return base, record_count
+
+
+def _encode(record: dict) -> bytes:
+    """Encode a record as one line of the log."""
+    return json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def sync_directory(path: str) -> None:
+    """Make a rename into the directory of path durable, where the platform supports it."""
+    if os.name != 'posix':
+        return
+    directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
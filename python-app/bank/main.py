@@ -1,19 +1,46 @@
 """
 Main application entry point for the banking system.
+
+Only the menu utilities are imported up front: the interfaces, their
+services and the database are imported and built when first used, so the
+first menu appears as soon as possible.
 """
+from typing import TYPE_CHECKING, Optional
+
 from .ui.text.ui_utils import Menu, SimpleCommand, MessageDisplay
-from .ui.text.branch_interface import BranchInterface
-from .ui.text.atm_interface import ATMInterface
-from .data.database import Database
+
+if TYPE_CHECKING:
+    from .business.impl.idempotency import IdempotencyCache
+    from .data.database import Database
 
 
 class BankingApplication:
     """Main banking application."""
     
-    def __init__(self):
-        self.database = Database()
+    def __init__(self, sample_data: bool = True):
+        self.sample_data = sample_data
+        self._database: Optional['Database'] = None
+        self._idempotency_cache: Optional['IdempotencyCache'] = None
         self.setup_menu()
     
+    def get_database(self) -> 'Database':
+        """Get the database, creating it (and its sample data, if enabled) on first use."""
+        if self._database is None:
+            from .data.database import Database
+            
+            self._database = Database(init_data=self.sample_data)
+            if self.sample_data:
+                MessageDisplay.show_info("Banco de dados inicializado com dados de exemplo")
+        return self._database
+    
+    def get_idempotency_cache(self) -> 'IdempotencyCache':
+        """Get the idempotency cache shared by the services of every interface, creating it on first use."""
+        if self._idempotency_cache is None:
+            from .business.impl.idempotency import IdempotencyCache
+            
+            self._idempotency_cache = IdempotencyCache()
+        return self._idempotency_cache
+    
     def setup_menu(self) -> None:
         """Setup the main application menu."""
         self.main_menu = Menu("Sistema Bancário")
@@ -29,9 +56,9 @@ class BankingApplication:
         print("=" * 50)
         print()
         
-        MessageDisplay.show_info("Banco de dados inicializado com dados de exemplo")
-        MessageDisplay.show_info("Use as credenciais padrão para teste")
-        print()
+        if self.sample_data:
+            MessageDisplay.show_info("Use as credenciais padrão para teste")
+            print()
         
         self.main_menu.show()
         
@@ -39,12 +66,16 @@ class BankingApplication:
     
     def start_branch_interface(self) -> None:
         """Start the branch interface."""
-        branch_interface = BranchInterface(self.database)
+        from .ui.text.branch_interface import BranchInterface
+        
+        branch_interface = BranchInterface(self.get_database(), self.get_idempotency_cache())
         branch_interface.start()
     
     def start_atm_interface(self) -> None:
         """Start the ATM interface."""
-        atm_interface = ATMInterface(self.database)
+        from .ui.text.atm_interface import ATMInterface
+        
+        atm_interface = ATMInterface(self.get_database(), idempotency_cache=self.get_idempotency_cache())
         atm_interface.start()
     
     def show_about(self) -> None:
@@ -80,10 +111,10 @@ class BankingApplication:
         print("=" * 50)
 
 
-def main():
+def main(sample_data: bool = True):
     """Main entry point."""
     try:
-        app = BankingApplication()
+        app = BankingApplication(sample_data)
         app.run()
     except KeyboardInterrupt:
         print("\n\nAplicação encerrada pelo usuário.")
@@ -0,0 +1 @@
+# JSON network interface
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+Client library for the JSON-lines bank server.
+"""
+import json
+import socket
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from ...business.business_exception import BusinessException
+
+
+class BankClient:
+    """
+    Blocking client holding one keep-alive connection to a BankServer.
+
+    call sends one request and waits for its response. call_many pipelines
+    several requests on the connection before reading any response. Results
+    are the decoded JSON values; failed requests raise BusinessException
+    with the error key sent by the server.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, timeout: Optional[float] = 30.0):
+        self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._socket.makefile('rb')
+        self._next_id = 0
+
+    def close(self) -> None:
+        self._reader.close()
+        self._socket.close()
+
+    def __enter__(self) -> 'BankClient':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def call(self, service: str, method: str, **params: Any) -> Any:
+        """Perform one request and return its result."""
+        return self.call_many([(service, method, params)])[0]
+
+    def call_many(self, requests: List[Tuple[str, str, Dict[str, Any]]],
+                  raise_errors: bool = True) -> List[Any]:
+        """
+        Pipeline requests of (service, method, params) and return their results, in request order.
+
+        When raise_errors is false, failed requests give a BusinessException
+        in the results instead of raising it.
+        """
+        ids = []
+        lines = []
+        for service, method, params in requests:
+            self._next_id += 1
+            ids.append(self._next_id)
+            lines.append(json.dumps({"id": self._next_id, "service": service, "method": method,
+                                     "params": _encode_params(params)}, separators=(',', ':')))
+        self._socket.sendall(('\n'.join(lines) + '\n').encode('utf-8'))
+
+        responses = {}
+        while len(responses) < len(ids):
+            line = self._reader.readline()
+            if not line:
+                raise ConnectionError("connection closed by the server")
+            response = json.loads(line)
+            responses[response["id"]] = response
+
+        results = []
+        for request_id in ids:
+            response = responses[request_id]
+            if "error" in response:
+                error = BusinessException(response["error"])
+                if raise_errors:
+                    raise error
+                results.append(error)
+            else:
+                results.append(response["result"])
+        return results
+
+    # Account operations
+
+    def login(self, branch: int, account_number: int, password: str) -> Dict[str, Any]:
+        return self.call("operation", "login", branch=branch, account_number=account_number, password=password)
+
+    def get_balance(self, branch: int, account_number: int) -> float:
+        return self.call("operation", "get_balance", branch=branch, account_number=account_number)
+
+    def get_balance_at(self, branch: int, account_number: int, when: datetime) -> float:
+        return self.call("operation", "get_balance_at", branch=branch, account_number=account_number, when=when)
+
+    def deposit(self, operation_location: int, branch: int, account_number: int,
+                envelope: int, amount: float, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        return self.call("operation", "deposit", operation_location=operation_location, branch=branch,
+                         account_number=account_number, envelope=envelope, amount=amount,
+                         idempotency_key=idempotency_key)
+
+    def withdrawal(self, operation_location: int, branch: int, account_number: int,
+                   amount: float, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        return self.call("operation", "withdrawal", operation_location=operation_location, branch=branch,
+                         account_number=account_number, amount=amount, idempotency_key=idempotency_key)
+
+    def transfer(self, operation_location: int, src_branch: int, src_account_number: int,
+                 dst_branch: int, dst_account_number: int, amount: float,
+                 idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        return self.call("operation", "transfer", operation_location=operation_location,
+                         src_branch=src_branch, src_account_number=src_account_number,
+                         dst_branch=dst_branch, dst_account_number=dst_account_number, amount=amount,
+                         idempotency_key=idempotency_key)
+
+    def get_statement_by_month(self, branch: int, account_number: int,
+                               month: int, year: int) -> List[Dict[str, Any]]:
+        return self.call("operation", "get_statement_by_month", branch=branch, account_number=account_number,
+                         month=month, year=year)
+
+    # Account management
+
+    def create_current_account(self, branch: int, name: str, last_name: str, cpf: int,
+                               birthday, balance: float, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        return self.call("management", "create_current_account", branch=branch, name=name,
+                         last_name=last_name, cpf=cpf, birthday=birthday, balance=balance,
+                         idempotency_key=idempotency_key)
+
+
+def _encode_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Encode dates as ISO 8601 strings and batch operations as dictionaries."""
+    encoded = {}
+    for name, value in params.items():
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        elif name == "operations":
+            value = [operation if isinstance(operation, dict)
+                     else {slot: getattr(operation, slot) for slot in operation.__slots__}
+                     for operation in value]
+        encoded[name] = value
+    return encoded
@@ -0,0 +1,293 @@
+"""
+JSON-lines TCP server exposing the banking services.
+"""
+import asyncio
+import inspect
+import ipaddress
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from ...business.business_exception import BusinessException
+from ...business.domain.batch_operation import BatchOperation, BatchResult
+from ...business.domain.current_account import CurrentAccount
+from ...business.domain.employee import Employee
+from ...business.domain.monthly_summary import MonthlySummary
+from ...business.domain.transaction import Transaction, Deposit, Transfer
+from ...business.impl.async_service_impl import AsyncAccountOperationService
+from ...business.impl.idempotency import IdempotencyCache
+from ...business.impl.instrumented_service_impl import (InstrumentedAccountManagementService,
+                                                        InstrumentedAccountOperationService)
+from ...business.impl.service_impl import AccountManagementServiceImpl, AccountOperationServiceImpl
+from ...data.database import Database
+from ...util.metrics import MetricsRegistry
+
+
+# Methods callable through the server, per service
+OPERATION_METHODS = ("login", "get_balance", "get_balance_at", "deposit", "withdrawal", "transfer",
+                     "get_statement_by_date", "get_statement_by_month", "get_monthly_summary", "apply_batch")
+MANAGEMENT_METHODS = ("create_current_account", "login")
+
+# Parameters received as ISO 8601 strings
+_DATE_PARAMS = ("begin", "end", "birthday", "when")
+
+# Requests of one connection being processed at the same time, at most
+_MAX_PIPELINED = 256
+
+# Size of a request line, at most, by default: room for batches of tens of thousands of operations
+DEFAULT_MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+# Id at the start of a request line, read from requests too long to be decoded
+_REQUEST_ID = re.compile(rb'\s*\{\s*"id"\s*:\s*(-?\d+|"[^"\\]*")')
+
+
+class BankServer:
+    """
+    Asyncio TCP server speaking JSON lines.
+
+    Each request is one line: {"id": ..., "service": "operation" or
+    "management", "method": ..., "params": {...}}. Each response is one
+    line: {"id": ..., "result": ...} or {"id": ..., "error": <error key>}.
+
+    Connections are kept alive, and a client may pipeline requests without
+    waiting for the responses. Requests of a connection start in the order
+    received; responses are sent as each completes, so clients match them
+    by id. Writes to the same account keep their order (see
+    AsyncAccountOperationService).
+
+    Requests are not authenticated: account creation needs no credentials,
+    so the server only listens on loopback addresses (ValueError otherwise)
+    and is meant to sit behind a local, authenticating front end.
+
+    Malformed requests (invalid JSON, unknown or missing parameters,
+    undecodable dates or batch operations) are answered with
+    exception.invalid.request; any other unexpected error raised by a call
+    with exception.internal. So are request lines longer than
+    max_request_bytes, which are skipped without being decoded; the
+    connection stays open, and the response carries the id found at the
+    start of the line, if any. Every connection may buffer up to
+    max_request_bytes.
+
+    With workers > 0, service calls run on a pool of that many threads, so
+    write-ahead log durability waits overlap; with 0, they run on the
+    default executor of the event loop.
+
+    With a metrics registry, the duration and outcome of every service call
+    are recorded in it.
+
+    Deposits, withdrawals, transfers, batches and account creations may
+    carry an "idempotency_key" parameter; the results of keyed calls are
+    kept in idempotency_cache (a default-sized one if not given).
+    """
+
+    def __init__(self, database: Database, host: str = "127.0.0.1", port: int = 0, workers: int = 4,
+                 metrics: Optional[MetricsRegistry] = None, idempotency_cache: Optional[IdempotencyCache] = None,
+                 max_request_bytes: int = DEFAULT_MAX_REQUEST_BYTES):
+        if not is_loopback_host(host):
+            raise ValueError(f"the server has no authentication and only listens on loopback addresses: {host}")
+        self.database = database
+        self.host = host
+        self.port = port
+        self.max_request_bytes = max_request_bytes
+        self.metrics = metrics
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="bank-server") if workers > 0 else None
+        if idempotency_cache is None:
+            idempotency_cache = IdempotencyCache()
+        operation_service = AccountOperationServiceImpl(database, idempotency_cache)
+        self.management_service = AccountManagementServiceImpl(database, idempotency_cache)
+        if metrics is not None:
+            operation_service = InstrumentedAccountOperationService(operation_service, metrics)
+            self.management_service = InstrumentedAccountManagementService(self.management_service, metrics)
+        self.operation_service = AsyncAccountOperationService(operation_service, self.executor)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Start listening. The actual port is available from get_port afterwards."""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  limit=self.max_request_bytes)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        """Stop accepting connections and shut the worker pool down."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def get_port(self) -> int:
+        return self.port
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        slots = asyncio.Semaphore(_MAX_PIPELINED)
+        pending = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError as e:
+                    # The connection was closed, possibly after a last request without its newline
+                    line = e.partial
+                    if not line:
+                        break
+                except asyncio.LimitOverrunError as e:
+                    request_id = await _skip_line(reader, e.consumed)
+                    await self._send(writer, {"id": request_id, "error": "exception.invalid.request"})
+                    continue
+                await slots.acquire()
+                task = asyncio.ensure_future(self._handle_request(line, writer))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                task.add_done_callback(lambda _: slots.release())
+            if pending:
+                await asyncio.gather(*pending)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, line: bytes, writer: asyncio.StreamWriter) -> None:
+        request_id = None
+        try:
+            request = _decode_request(line)
+            request_id = request.get("id")
+            function = self._resolve(request.get("service"), request.get("method"))
+            params = _decode_params(function, request.get("params"))
+            if request.get("service") == "management":
+                result = await self._run(function, **params)
+            else:
+                result = await function(**params)
+            result = _encode_result(result)
+            if isinstance(result, dict) and request.get("method") != "create_current_account":
+                # Only a newly created account reports its generated password
+                result.pop("password", None)
+            response = {"id": request_id, "result": result}
+        except BusinessException as e:
+            response = {"id": request_id, "error": str(e)}
+        except Exception:
+            response = {"id": request_id, "error": "exception.internal"}
+        await self._send(writer, response)
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, response: Dict[str, Any]) -> None:
+        writer.write(json.dumps(response, separators=(',', ':')).encode('utf-8') + b'\n')
+        await writer.drain()
+
+    def _resolve(self, service: str, method: str) -> Callable:
+        """Get the function serving a request: a coroutine function for the operation service."""
+        if service == "operation" and method in OPERATION_METHODS:
+            return getattr(self.operation_service, method)
+        if service == "management" and method in MANAGEMENT_METHODS:
+            return getattr(self.management_service, method)
+        raise BusinessException("exception.unknown.method")
+
+    async def _run(self, function: Callable, **params: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, lambda: function(**params))
+
+
+def is_loopback_host(host: str) -> bool:
+    """Tell whether host is "localhost" or a loopback address."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+async def _skip_line(reader: asyncio.StreamReader, consumed: int) -> Any:
+    """
+    Discard a request line longer than the limit of reader, consumed bytes of which are buffered.
+
+    Return the id at the start of the line, or None if it has none.
+    """
+    match = _REQUEST_ID.match(await reader.readexactly(consumed))
+    while True:
+        try:
+            await reader.readuntil(b'\n')
+            break
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(e.consumed)
+    return json.loads(match.group(1)) if match is not None else None
+
+
+def _decode_request(line: bytes) -> Dict[str, Any]:
+    try:
+        request = json.loads(line)
+    except ValueError:
+        raise BusinessException("exception.invalid.request")
+    if not isinstance(request, dict):
+        raise BusinessException("exception.invalid.request")
+    return request
+
+
+def _decode_params(function: Callable, params: Any) -> Dict[str, Any]:
+    """
+    Convert the parameters of a request to the arguments of function.
+
+    Only malformed requests raise exception.invalid.request: unknown or
+    missing parameters, and dates or batch operations that cannot be
+    decoded. Errors raised by the call itself are not masked.
+    """
+    if params is None:
+        params = {}
+    if not isinstance(params, dict):
+        raise BusinessException("exception.invalid.request")
+    params = dict(params)
+    try:
+        inspect.signature(function).bind(**params)
+        for name in _DATE_PARAMS:
+            if params.get(name) is not None:
+                params[name] = datetime.fromisoformat(params[name])
+        if "operations" in params:
+            params["operations"] = [BatchOperation(**operation) for operation in params["operations"]]
+    except (ValueError, TypeError):
+        # Raised by the binding, the date parsing and the operation constructor only
+        raise BusinessException("exception.invalid.request")
+    return params
+
+
+def _encode_result(value: Any) -> Any:
+    """Convert a service result to JSON-compatible values."""
+    if isinstance(value, list):
+        return [_encode_result(item) for item in value]
+    if isinstance(value, Transaction):
+        return _encode_transaction(value)
+    if isinstance(value, CurrentAccount):
+        account_id = value.get_id()
+        client = value.get_client()
+        return {"branch": account_id.get_branch().get_number(), "number": account_id.get_number(),
+                "first_name": client.get_first_name(), "last_name": client.get_last_name(),
+                "password": client.get_password(), "balance": value.get_balance()}
+    if isinstance(value, Employee):
+        return {"username": value.get_username(), "first_name": value.get_first_name(),
+                "last_name": value.get_last_name()}
+    if isinstance(value, MonthlySummary):
+        return {name: getattr(value, name) for name in MonthlySummary.__slots__}
+    if isinstance(value, BatchResult):
+        transaction = value.get_transaction()
+        return {"index": value.get_index(), "error": value.get_error(),
+                "transaction": _encode_transaction(transaction) if transaction is not None else None}
+    return value
+
+
+def _encode_transaction(transaction: Transaction) -> Dict[str, Any]:
+    account_id = transaction.get_account().get_id()
+    encoded = {"type": type(transaction).__name__.lower(),
+               "location": transaction.get_location().get_number(),
+               "branch": account_id.get_branch().get_number(), "number": account_id.get_number(),
+               "amount": transaction.get_amount(), "date": transaction.get_date().isoformat()}
+    if isinstance(transaction, Deposit):
+        encoded["envelope"] = transaction.get_envelope()
+    elif isinstance(transaction, Transfer):
+        destination_id = transaction.get_destination_account().get_id()
+        encoded["dst_branch"] = destination_id.get_branch().get_number()
+        encoded["dst_number"] = destination_id.get_number()
+    return encoded
@@ -1,12 +1,17 @@
 """
 ATM interface - allows clients to perform banking operations.
 """
+from calendar import monthrange
 from datetime import datetime
-from typing import List
+from typing import Iterator, Optional
 
 from .ui_utils import Menu, Command, SimpleCommand, InputReader, MessageDisplay, UserSession
+from ...business.impl.atm_selector import ATMSelector, RoundRobinATMSelector
+from ...business.impl.idempotency import IdempotencyCache
 from ...business.impl.service_impl import AccountOperationServiceImpl
 from ...business.business_exception import BusinessException
+from ...business.domain.monthly_summary import MonthlySummary
+from ...business.domain.statement_page import StatementPage
 from ...business.domain.transaction import Transaction, Deposit, Withdrawal, Transfer
 from ...data.database import Database
 
@@ -14,9 +19,15 @@ from ...data.database import Database
 class ATMInterface:
     """ATM interface for client operations."""
     
-    def __init__(self, database: Database):
+    # Transactions shown per screen of a statement
+    STATEMENT_PAGE_SIZE = 10
+    
+    def __init__(self, database: Database, atm_selector: Optional[ATMSelector] = None,
+                 idempotency_cache: Optional[IdempotencyCache] = None):
         self.database = database
-        self.operation_service = AccountOperationServiceImpl(database)
+        self.operation_service = AccountOperationServiceImpl(database, idempotency_cache)
+        # Spreads the operations over the ATMs of the database
+        self.atm_selector = atm_selector or RoundRobinATMSelector(database)
         self.session = UserSession()
         self.setup_menus()
     
@@ -53,7 +64,7 @@ class ATMInterface:
             self.session.set_current_account(account)
             
             client = account.get_client()
-            MessageDisplay.show_success(f"Acesso autorizado! Bem-vindo, {client.get_name()}!")
+            MessageDisplay.show_success(f"Acesso autorizado! Bem-vindo, {client.get_first_name()}!")
             self.client_menu.show()
             
         except BusinessException as e:
@@ -69,11 +80,11 @@ class ATMInterface:
         
         try:
             account = self.session.get_current_account()
-            account_id = account.get_current_account_id()
+            account_id = account.get_id()
             
             balance = self.operation_service.get_balance(
                 account_id.get_branch().get_number(),
-                account_id.get_account_number()
+                account_id.get_number()
             )
             
             print(f"\nSaldo atual: R$ {balance:.2f}")
@@ -91,17 +102,12 @@ class ATMInterface:
         
         try:
             account = self.session.get_current_account()
-            account_id = account.get_current_account_id()
+            account_id = account.get_id()
             
-            # Get ATM location (first ATM in database)
-            atm_locations = [loc for loc in self.database.get_operation_locations() 
-                           if hasattr(loc, 'get_number') and loc.get_number() >= 1000]
-            if not atm_locations:
+            if not self.database.get_atms():
                 MessageDisplay.show_error("Nenhum caixa eletrônico disponível")
                 return
             
-            atm_location = atm_locations[0].get_number()
-            
             envelope = InputReader.read_int("Número do envelope: ")
             amount = InputReader.read_float("Valor do depósito: R$ ")
             
@@ -109,13 +115,14 @@ class ATMInterface:
                 MessageDisplay.show_error("Valor deve ser positivo")
                 return
             
-            deposit = self.operation_service.deposit(
-                atm_location,
-                account_id.get_branch().get_number(),
-                account_id.get_account_number(),
-                envelope,
-                amount
-            )
+            with self.atm_selector.selected() as atm:
+                deposit = self.operation_service.deposit(
+                    atm.get_number(),
+                    account_id.get_branch().get_number(),
+                    account_id.get_number(),
+                    envelope,
+                    amount
+                )
             
             print(f"\nDepósito realizado com sucesso!")
             print(f"Data: {deposit.get_date().strftime('%d/%m/%Y %H:%M:%S')}")
@@ -138,29 +145,25 @@ class ATMInterface:
         
         try:
             account = self.session.get_current_account()
-            account_id = account.get_current_account_id()
+            account_id = account.get_id()
             
-            # Get ATM location (first ATM in database)
-            atm_locations = [loc for loc in self.database.get_operation_locations() 
-                           if hasattr(loc, 'get_number') and loc.get_number() >= 1000]
-            if not atm_locations:
+            if not self.database.get_atms():
                 MessageDisplay.show_error("Nenhum caixa eletrônico disponível")
                 return
             
-            atm_location = atm_locations[0].get_number()
-            
             amount = InputReader.read_float("Valor do saque: R$ ")
             
             if amount <= 0:
                 MessageDisplay.show_error("Valor deve ser positivo")
                 return
             
-            withdrawal = self.operation_service.withdrawal(
-                atm_location,
-                account_id.get_branch().get_number(),
-                account_id.get_account_number(),
-                amount
-            )
+            with self.atm_selector.selected() as atm:
+                withdrawal = self.operation_service.withdrawal(
+                    atm.get_number(),
+                    account_id.get_branch().get_number(),
+                    account_id.get_number(),
+                    amount
+                )
             
             print(f"\nSaque realizado com sucesso!")
             print(f"Data: {withdrawal.get_date().strftime('%d/%m/%Y %H:%M:%S')}")
@@ -182,17 +185,12 @@ class ATMInterface:
         
         try:
             account = self.session.get_current_account()
-            account_id = account.get_current_account_id()
+            account_id = account.get_id()
             
-            # Get ATM location (first ATM in database)  
-            atm_locations = [loc for loc in self.database.get_operation_locations() 
-                           if hasattr(loc, 'get_number') and loc.get_number() >= 1000]
-            if not atm_locations:
+            if not self.database.get_atms():
                 MessageDisplay.show_error("Nenhum caixa eletrônico disponível")
                 return
             
-            atm_location = atm_locations[0].get_number()
-            
             dst_branch = InputReader.read_int("Agência destino: ")
             dst_account = InputReader.read_int("Conta destino: ")
             amount = InputReader.read_float("Valor da transferência: R$ ")
@@ -201,14 +199,15 @@ class ATMInterface:
                 MessageDisplay.show_error("Valor deve ser positivo")
                 return
             
-            transfer = self.operation_service.transfer(
-                atm_location,
-                account_id.get_branch().get_number(),
-                account_id.get_account_number(),
-                dst_branch,
-                dst_account,
-                amount
-            )
+            with self.atm_selector.selected() as atm:
+                transfer = self.operation_service.transfer(
+                    atm.get_number(),
+                    account_id.get_branch().get_number(),
+                    account_id.get_number(),
+                    dst_branch,
+                    dst_account,
+                    amount
+                )
             
             print(f"\nTransferência realizada com sucesso!")
             print(f"Data: {transfer.get_date().strftime('%d/%m/%Y %H:%M:%S')}")
@@ -231,7 +230,7 @@ class ATMInterface:
         
         try:
             account = self.session.get_current_account()
-            account_id = account.get_current_account_id()
+            account_id = account.get_id()
             
             print("\n--- Período do Extrato ---")
             print("Data inicial:")
@@ -255,14 +254,15 @@ class ATMInterface:
                 MessageDisplay.show_error("Data inicial deve ser anterior à data final")
                 return
             
-            transactions = self.operation_service.get_statement_by_date(
+            pages = self.operation_service.iter_statement(
                 account_id.get_branch().get_number(),
-                account_id.get_account_number(),
+                account_id.get_number(),
                 start_date,
-                end_date
+                end_date,
+                self.STATEMENT_PAGE_SIZE
             )
             
-            self._display_statement(transactions, f"Extrato de {start_date.strftime('%d/%m/%Y')} a {end_date.strftime('%d/%m/%Y')}")
+            self._display_statement(pages, f"Extrato de {start_date.strftime('%d/%m/%Y')} a {end_date.strftime('%d/%m/%Y')}")
             
         except BusinessException as e:
             MessageDisplay.show_error(self._get_error_message(str(e)))
@@ -277,7 +277,7 @@ class ATMInterface:
         
         try:
             account = self.session.get_current_account()
-            account_id = account.get_current_account_id()
+            account_id = account.get_id()
             
             month = InputReader.read_int("Mês (1-12): ")
             year = InputReader.read_int("Ano: ")
@@ -286,11 +286,12 @@ class ATMInterface:
                 MessageDisplay.show_error("Mês deve estar entre 1 e 12")
                 return
             
-            transactions = self.operation_service.get_statement_by_month(
+            pages = self.operation_service.iter_statement(
                 account_id.get_branch().get_number(),
-                account_id.get_account_number(),
-                month,
-                year
+                account_id.get_number(),
+                datetime(year, month, 1),
+                datetime(year, month, monthrange(year, month)[1], 23, 59, 59),
+                self.STATEMENT_PAGE_SIZE
             )
             
             months = [
@@ -298,7 +299,15 @@ class ATMInterface:
                 "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"
             ]
             
-            self._display_statement(transactions, f"Extrato de {months[month-1]} de {year}")
+            self._display_statement(pages, f"Extrato de {months[month-1]} de {year}")
+            
+            summary = self.operation_service.get_monthly_summary(
+                account_id.get_branch().get_number(),
+                account_id.get_number(),
+                month,
+                year
+            )
+            self._display_monthly_summary(summary)
             
         except BusinessException as e:
             MessageDisplay.show_error(self._get_error_message(str(e)))
@@ -313,12 +322,12 @@ class ATMInterface:
         
         account = self.session.get_current_account()
         client = account.get_client()
-        account_id = account.get_current_account_id()
+        account_id = account.get_id()
         
         print("\n--- Informações da Conta ---")
         print(f"Agência: {account_id.get_branch().get_number()}")
-        print(f"Conta: {account_id.get_account_number()}")
-        print(f"Cliente: {client.get_name()} {client.get_last_name()}")
+        print(f"Conta: {account_id.get_number()}")
+        print(f"Cliente: {client.get_first_name()} {client.get_last_name()}")
         print(f"CPF: {client.get_cpf()}")
         print(f"Data de Nascimento: {client.get_birthday().strftime('%d/%m/%Y')}")
         print(f"Saldo: R$ {account.get_balance():.2f}")
@@ -326,45 +335,67 @@ class ATMInterface:
     def logout(self) -> None:
         """Logout current client."""
         if self.session.is_client_logged_in():
-            client_name = self.session.get_current_account().get_client().get_name()
+            client_name = self.session.get_current_account().get_client().get_first_name()
             self.session.clear_session()
             MessageDisplay.show_success(f"Logout realizado com sucesso! Até logo, {client_name}!")
         else:
             MessageDisplay.show_info("Nenhum usuário logado")
     
-    def _display_statement(self, transactions: List[Transaction], title: str) -> None:
-        """Display transaction statement."""
+    def _display_statement(self, pages: Iterator[StatementPage], title: str) -> None:
+        """Display a transaction statement one page at a time, newest first."""
         print(f"\n--- {title} ---")
         
-        if not transactions:
-            print("Nenhuma transação encontrada no período.")
-            return
+        shown = 0
+        for page in pages:
+            transactions = page.get_transactions()
+            if shown == 0:
+                if not transactions:
+                    print("Nenhuma transação encontrada no período.")
+                    return
+                print(f"{'Data/Hora':<20} {'Tipo':<12} {'Valor':<15} {'Detalhes'}")
+                print("-" * 70)
+            
+            for transaction in transactions:
+                print(self._format_transaction(transaction))
+            shown += len(transactions)
+            
+            if page.has_next():
+                answer = InputReader.read_string("-- Enter para mais transações, 0 para encerrar: ")
+                if answer == "0":
+                    break
         
-        print(f"{'Data/Hora':<20} {'Tipo':<12} {'Valor':<15} {'Detalhes'}")
-        print("-" * 70)
+        print(f"\nTransações exibidas: {shown}")
+    
+    def _format_transaction(self, transaction: Transaction) -> str:
+        """Format one line of a statement."""
+        date_str = transaction.get_date().strftime('%d/%m/%Y %H:%M:%S')
+        amount_str = f"R$ {transaction.get_amount():.2f}"
         
-        for transaction in transactions:
-            date_str = transaction.get_date().strftime('%d/%m/%Y %H:%M:%S')
-            amount_str = f"R$ {transaction.get_amount():.2f}"
-            
-            if isinstance(transaction, Deposit):
-                transaction_type = "Depósito"
-                details = f"Envelope: {transaction.get_envelope()}"
-            elif isinstance(transaction, Withdrawal):
-                transaction_type = "Saque"
-                details = ""
-            elif isinstance(transaction, Transfer):
-                transaction_type = "Transferência"
-                dst_account = transaction.get_destination_account()
-                dst_id = dst_account.get_current_account_id()
-                details = f"Para: {dst_id.get_branch().get_number()}-{dst_id.get_account_number()}"
-            else:
-                transaction_type = "Desconhecido"
-                details = ""
-            
-            print(f"{date_str:<20} {transaction_type:<12} {amount_str:<15} {details}")
+        if isinstance(transaction, Deposit):
+            transaction_type = "Depósito"
+            details = f"Envelope: {transaction.get_envelope()}"
+        elif isinstance(transaction, Withdrawal):
+            transaction_type = "Saque"
+            details = ""
+        elif isinstance(transaction, Transfer):
+            transaction_type = "Transferência"
+            dst_account = transaction.get_destination_account()
+            dst_id = dst_account.get_id()
+            details = f"Para: {dst_id.get_branch().get_number()}-{dst_id.get_number()}"
+        else:
+            transaction_type = "Desconhecido"
+            details = ""
         
-        print(f"\nTotal de transações: {len(transactions)}")
+        return f"{date_str:<20} {transaction_type:<12} {amount_str:<15} {details}"
+    
+    def _display_monthly_summary(self, summary: MonthlySummary) -> None:
+        """Display the totals of a monthly statement."""
+        print(f"\n{'Saldo inicial:':<25} R$ {summary.get_opening_balance():.2f}")
+        print(f"{'Depósitos:':<25} R$ {summary.get_deposits():.2f}")
+        print(f"{'Saques:':<25} R$ {summary.get_withdrawals():.2f}")
+        print(f"{'Transferências enviadas:':<25} R$ {summary.get_transfers_out():.2f}")
+        print(f"{'Transferências recebidas:':<25} R$ {summary.get_transfers_in():.2f}")
+        print(f"{'Saldo final:':<25} R$ {summary.get_closing_balance():.2f}")
     
     def _get_error_message(self, exception_key: str) -> str:
         """Get error message from exception key."""
@@ -375,6 +406,8 @@ class ATMInterface:
             "exception.inexistent.account": "Conta não encontrada",
             "exception.invalid.operation.location": "Local de operação inválido",
             "exception.insufficient.funds": "Saldo insuficiente",
+            "exception.invalid.cursor": "Posição do extrato inválida",
+            "exception.invalid.page.size": "Tamanho de página inválido",
         }
         return error_messages.get(exception_key, "Erro desconhecido")
 
@@ -5,6 +5,7 @@ from datetime import datetime
 from typing import Optional
 
 from .ui_utils import Menu, Command, SimpleCommand, InputReader, MessageDisplay, UserSession
+from ...business.impl.idempotency import IdempotencyCache
 from ...business.impl.service_impl import AccountManagementServiceImpl
 from ...business.business_exception import BusinessException
 from ...data.database import Database
@@ -14,9 +15,9 @@ from ...business.domain.employee import Employee
 class BranchInterface:
     """Branch interface for employee operations."""
     
-    def __init__(self, database: Database):
+    def __init__(self, database: Database, idempotency_cache: Optional[IdempotencyCache] = None):
         self.database = database
-        self.account_service = AccountManagementServiceImpl(database)
+        self.account_service = AccountManagementServiceImpl(database, idempotency_cache)
         self.session = UserSession()
         self.setup_menus()
     
@@ -46,7 +47,7 @@ class BranchInterface:
             employee = self.account_service.login(username, password)
             self.session.set_employee(employee)
             
-            MessageDisplay.show_success(f"Login realizado com sucesso! Bem-vindo, {employee.get_name()}!")
+            MessageDisplay.show_success(f"Login realizado com sucesso! Bem-vindo, {employee.get_first_name()}!")
             self.employee_menu.show()
             
         except BusinessException as e:
@@ -96,9 +97,9 @@ class BranchInterface:
             )
             
             print("\n--- Conta Criada com Sucesso ---")
-            print(f"Agência: {account.get_current_account_id().get_branch().get_number()}")
-            print(f"Conta: {account.get_current_account_id().get_account_number()}")
-            print(f"Cliente: {account.get_client().get_name()} {account.get_client().get_last_name()}")
+            print(f"Agência: {account.get_id().get_branch().get_number()}")
+            print(f"Conta: {account.get_id().get_number()}")
+            print(f"Cliente: {account.get_client().get_first_name()} {account.get_client().get_last_name()}")
             print(f"CPF: {account.get_client().get_cpf()}")
             print(f"Senha: {account.get_client().get_password()}")
             print(f"Saldo: R$ {account.get_balance():.2f}")
@@ -118,7 +119,7 @@ class BranchInterface:
         
         employee = self.session.get_employee()
         print("\n--- Informações do Funcionário ---")
-        print(f"Nome: {employee.get_name()} {employee.get_last_name()}")
+        print(f"Nome: {employee.get_first_name()} {employee.get_last_name()}")
         print(f"CPF: {employee.get_cpf()}")
         print(f"Usuário: {employee.get_username()}")
         print(f"Agência: {employee.get_operation_location().get_number()}")
@@ -127,7 +128,7 @@ class BranchInterface:
     def logout(self) -> None:
         """Logout current employee."""
         if self.session.is_employee_logged_in():
-            employee_name = self.session.get_employee().get_name()
+            employee_name = self.session.get_employee().get_first_name()
             self.session.clear_session()
             MessageDisplay.show_success(f"Logout realizado com sucesso! Até logo, {employee_name}!")
         else:
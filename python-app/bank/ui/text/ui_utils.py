@@ -1,11 +1,13 @@
 """
 Text-based user interface command definitions and utilities.
 """
-from typing import Any, Callable, Optional, List
+from typing import Any, Callable, Optional, List, TYPE_CHECKING
 from abc import ABC, abstractmethod
 
-from ...business.domain.employee import Employee
-from ...business.domain.current_account import CurrentAccount
+if TYPE_CHECKING:
+    # Only needed for annotations; importing the domain here would slow down startup
+    from ...business.domain.employee import Employee
+    from ...business.domain.current_account import CurrentAccount
 
 
 class Command(ABC):
@@ -142,22 +144,22 @@ class UserSession:
     """Manages user session data."""
     
     def __init__(self):
-        self._employee: Optional[Employee] = None
-        self._current_account: Optional[CurrentAccount] = None
+        self._employee: Optional['Employee'] = None
+        self._current_account: Optional['CurrentAccount'] = None
     
-    def set_employee(self, employee: Employee) -> None:
+    def set_employee(self, employee: 'Employee') -> None:
         """Set the logged-in employee."""
         self._employee = employee
     
-    def get_employee(self) -> Optional[Employee]:
+    def get_employee(self) -> Optional['Employee']:
         """Get the logged-in employee."""
         return self._employee
     
-    def set_current_account(self, account: CurrentAccount) -> None:
+    def set_current_account(self, account: 'CurrentAccount') -> None:
         """Set the current account."""
         self._current_account = account
     
-    def get_current_account(self) -> Optional[CurrentAccount]:
+    def get_current_account(self) -> Optional['CurrentAccount']:
         """Get the current account."""
         return self._current_account
     
@@ -0,0 +1,192 @@
+"""
+Latency histograms and their export as Prometheus text or JSON.
+"""
+import os
+import threading
+from collections import deque
+from typing import Dict, Tuple
+
+# Linear sub-buckets per power of two: values are kept within about 3%
+_SUB_BUCKET_BITS = 5
+_SUB_BUCKETS = 1 << _SUB_BUCKET_BITS
+# Values up to 2 ** 42 ns (about 73 minutes); larger ones fall in the last bucket
+_MAX_SHIFT = 42 - _SUB_BUCKET_BITS
+_BUCKET_COUNT = (_MAX_SHIFT + 2) * _SUB_BUCKETS
+
+# Recorded values waiting to be added to the buckets, at most
+_PENDING_LIMIT = 4096
+
+# Upper bounds of the buckets of the Prometheus export, in seconds
+PROMETHEUS_BUCKETS = (0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025,
+                      0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Percentiles of the JSON export
+JSON_PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Histogram of durations in nanoseconds, with log-linear buckets.
+
+    As in HDR histograms, each power of two is split in a fixed number of
+    linear sub-buckets, so every recorded value is kept with the same
+    relative precision in a fixed memory size.
+
+    Recording only appends the value to a deque, which is thread-safe
+    without a lock. Pending values are added to the buckets in batches,
+    when enough of them accumulate or when the histogram is read.
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'minimum', 'maximum', '_pending', '_lock')
+
+    def __init__(self):
+        self.counts = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.minimum = 0
+        self.maximum = 0
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def record(self, value: int) -> None:
+        """Record a duration in nanoseconds."""
+        self._pending.append(value)
+        if len(self._pending) >= _PENDING_LIMIT:
+            self._flush()
+
+    def get_count(self) -> int:
+        self._flush()
+        return self.count
+
+    def get_total(self) -> int:
+        self._flush()
+        return self.total
+
+    def get_minimum(self) -> int:
+        self._flush()
+        return self.minimum
+
+    def get_maximum(self) -> int:
+        self._flush()
+        return self.maximum
+
+    def get_percentile(self, percentile: float) -> int:
+        """Get the highest value equivalent to the given percentile of the recorded values."""
+        self._flush()
+        if self.count == 0:
+            return 0
+        target = max(int(percentile / 100 * self.count + 0.5), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(_highest_value(index), self.maximum)
+        return self.maximum
+
+    def count_at_most(self, value: int) -> int:
+        """Get the number of recorded values whose bucket lies entirely at or below value."""
+        self._flush()
+        return sum(count for index, count in enumerate(self.counts)
+                   if count and _highest_value(index) <= value)
+
+    def _flush(self) -> None:
+        """Add the pending values to the buckets."""
+        with self._lock:
+            pending = self._pending
+            counts = self.counts
+            # Values appended meanwhile stay pending
+            for _ in range(len(pending)):
+                value = pending.popleft()
+                if value < 2 * _SUB_BUCKETS:
+                    index = value if value > 0 else 0
+                else:
+                    shift = value.bit_length() - _SUB_BUCKET_BITS - 1
+                    index = min(((shift + 1) << _SUB_BUCKET_BITS) + (value >> shift) - _SUB_BUCKETS,
+                                _BUCKET_COUNT - 1)
+                counts[index] += 1
+                if self.count == 0 or value < self.minimum:
+                    self.minimum = value
+                if value > self.maximum:
+                    self.maximum = value
+                self.count += 1
+                self.total += value
+
+
+class MetricsRegistry:
+    """
+    Latency histograms of service calls, by service, method and outcome.
+
+    The outcome is "ok" for calls that returned, or the key of the
+    BusinessException (or "exception.internal" for any other exception)
+    that the call raised, so the histogram counts are also the error
+    counters.
+    """
+
+    def __init__(self, prefix: str = "bank"):
+        self.prefix = prefix
+        self.histograms: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, service: str, method: str, outcome: str) -> LatencyHistogram:
+        """Get the histogram of a service method and outcome, creating it if needed."""
+        key = (service, method, outcome)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def to_json(self) -> dict:
+        """Get a JSON-serializable snapshot of every histogram, with durations in seconds."""
+        operations = []
+        for (service, method, outcome), histogram in sorted(self.histograms.items()):
+            if histogram.get_count() == 0:
+                continue
+            entry = {
+                "service": service,
+                "method": method,
+                "outcome": outcome,
+                "count": histogram.get_count(),
+                "sum": histogram.get_total() / 1e9,
+                "min": histogram.get_minimum() / 1e9,
+                "max": histogram.get_maximum() / 1e9,
+            }
+            for percentile in JSON_PERCENTILES:
+                entry[f"p{percentile:g}"] = histogram.get_percentile(percentile) / 1e9
+            operations.append(entry)
+        return {"operations": operations}
+
+    def to_prometheus(self) -> str:
+        """Get every histogram in the Prometheus text exposition format."""
+        name = f"{self.prefix}_service_duration_seconds"
+        lines = [f"# HELP {name} Duration of service calls, by method and outcome.",
+                 f"# TYPE {name} histogram"]
+        for (service, method, outcome), histogram in sorted(self.histograms.items()):
+            labels = f'service="{service}",method="{method}",outcome="{outcome}"'
+            for bound in PROMETHEUS_BUCKETS:
+                lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} '
+                             f'{histogram.count_at_most(int(bound * 1e9))}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.get_count()}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.get_total() / 1e9:.9f}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.get_count()}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Write the Prometheus text export to path, e.g. for the textfile collector.
+
+        The file is written next to path and atomically renamed over it, so
+        readers never see a partial export.
+        """
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w') as metrics_file:
+            metrics_file.write(self.to_prometheus())
+        os.replace(temporary_path, path)
+
+
+def _highest_value(index: int) -> int:
+    """Get the highest value recorded in a bucket."""
+    if index < 2 * _SUB_BUCKETS:
+        return index
+    shift = (index >> _SUB_BUCKET_BITS) - 1
+    return ((_SUB_BUCKETS + (index & (_SUB_BUCKETS - 1)) + 1) << shift) - 1
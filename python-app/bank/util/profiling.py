@@ -0,0 +1,237 @@
+"""
+Opt-in profiling of UI commands and service calls.
+"""
+import cProfile
+import io
+import linecache
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Environment variables enabling profiling without command line options
+PROFILE_ENV = "BANK_PROFILE"
+PROFILE_RATE_ENV = "BANK_PROFILE_RATE"
+PROFILE_TOP_ENV = "BANK_PROFILE_TOP"
+
+# Frames kept per allocation traceback
+_TRACEMALLOC_FRAMES = 8
+
+# Allocations made by the profiler itself or by the import system, left out of the reports
+_IGNORED_FILES = (tracemalloc.__file__, cProfile.__file__, pstats.__file__, linecache.__file__, __file__,
+                  "<frozen importlib.*>")
+
+
+class _Capture:
+    """Profile and allocations of one sampled call, possibly paused while a nested call is captured."""
+
+    __slots__ = ('name', 'profile', 'allocations', 'peak', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.profile = cProfile.Profile()
+        # (file, line) -> [size, count] of the blocks allocated and still alive
+        self.allocations: Dict[Tuple[str, int], List[int]] = {}
+        self.peak = 0
+        self.start = 0.0
+
+    def resume(self) -> None:
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        self.profile.enable()
+
+    def pause(self) -> None:
+        self.profile.disable()
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, filename) for filename in _IGNORED_FILES])
+        for statistic in snapshot.statistics('lineno'):
+            frame = statistic.traceback[0]
+            totals = self.allocations.setdefault((frame.filename, frame.lineno), [0, 0])
+            totals[0] += statistic.size
+            totals[1] += statistic.count
+
+
+class Profiler:
+    """
+    Samples calls of UI commands and service methods with cProfile and tracemalloc.
+
+    install() wraps SimpleCommand.execute and the methods of the service
+    implementations; uninstall() restores them, so nothing is wrapped, and
+    nothing costs anything, unless profiling is enabled.
+
+    Each call is captured with probability sample_rate. A captured call
+    writes <sequence>-<name>.prof, a cProfile dump readable with pstats or
+    snakeviz, and <sequence>-<name>.txt, with the top functions by
+    cumulative time and the top allocation sites (blocks allocated during
+    the call and still alive at its end). close() writes allocations.txt,
+    the top allocation sites over all captured calls.
+
+    A command run from another command's menu pauses the capture of the
+    outer one and is captured on its own. A service call made by a captured
+    command stays part of the command's capture, where its share of the
+    time shows next to the domain model and the printing. Allocations are
+    traced process-wide, so they are only accurate with one call captured
+    at a time, as in the text interface.
+    """
+
+    def __init__(self, output_dir: str, sample_rate: float = 1.0, top: int = 20, seed: Optional[int] = None):
+        if not 0 < sample_rate <= 1:
+            raise ValueError("sample_rate must be in (0, 1]")
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.top = top
+        self.random = random.Random(seed)
+        # (file, line) -> [size, count] over all captured calls
+        self.allocations: Dict[Tuple[str, int], List[int]] = {}
+        self.captured = 0
+        self._sequence = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._originals: List[Tuple[type, str, Callable]] = []
+        self._started_tracemalloc = False
+
+    @classmethod
+    def from_environment(cls) -> Optional['Profiler']:
+        """Create a profiler from BANK_PROFILE (output directory), BANK_PROFILE_RATE and BANK_PROFILE_TOP."""
+        output_dir = os.environ.get(PROFILE_ENV)
+        if not output_dir:
+            return None
+        return cls(output_dir, float(os.environ.get(PROFILE_RATE_ENV, "1")),
+                   int(os.environ.get(PROFILE_TOP_ENV, "20")))
+
+    def install(self) -> None:
+        """Wrap the UI commands and the service implementations, and start tracing allocations."""
+        from ..business.impl.service_impl import AccountManagementServiceImpl, AccountOperationServiceImpl
+        from ..business.services import AccountManagementService, AccountOperationService
+        from ..ui.text.ui_utils import SimpleCommand
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(_TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+
+        original_execute = SimpleCommand.execute
+
+        def execute(command: SimpleCommand) -> None:
+            self.call(command.get_label(), True, original_execute, command)
+
+        self._replace(SimpleCommand, 'execute', execute)
+        for cls, interface, prefix in ((AccountOperationServiceImpl, AccountOperationService, "operation"),
+                                       (AccountManagementServiceImpl, AccountManagementService, "management")):
+            for method in sorted(interface.__abstractmethods__):
+                self._replace(cls, method, self._wrap_service(f"{prefix}.{method}", getattr(cls, method)))
+
+    def uninstall(self) -> None:
+        """Restore the wrapped methods and stop tracing allocations."""
+        for cls, name, original in reversed(self._originals):
+            setattr(cls, name, original)
+        self._originals = []
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def close(self) -> None:
+        """Uninstall the profiler and write the allocation report of all captured calls."""
+        self.uninstall()
+        with open(os.path.join(self.output_dir, "allocations.txt"), "w") as report:
+            report.write(f"Chamadas perfiladas: {self.captured}\n\n")
+            report.write(_format_allocations(self.allocations, self.top))
+
+    def call(self, name: str, is_command: bool, function: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        Call function, capturing it if sampled.
+
+        Commands pause the capture in progress on the thread, if any; other
+        calls made while a capture is in progress are left to it.
+        """
+        stack = self._stack()
+        if stack and not is_command:
+            return function(*args, **kwargs)
+        if self.random.random() >= self.sample_rate:
+            return function(*args, **kwargs)
+
+        capture = _Capture(name)
+        outer = stack[-1] if stack else None
+        if outer is not None:
+            outer.pause()
+        stack.append(capture)
+        capture.start = time.perf_counter()
+        try:
+            capture.resume()
+        except ValueError:
+            # Another profiler is active, e.g. on another thread since Python 3.12
+            stack.pop()
+            if outer is not None:
+                outer.resume()
+            return function(*args, **kwargs)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            capture.pause()
+            elapsed = time.perf_counter() - capture.start
+            stack.pop()
+            self._write(capture, elapsed)
+            if outer is not None:
+                outer.resume()
+
+    def _wrap_service(self, name: str, method: Callable) -> Callable:
+        def wrapper(service: Any, *args: Any, **kwargs: Any) -> Any:
+            return self.call(name, False, method, service, *args, **kwargs)
+
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    def _replace(self, cls: type, name: str, replacement: Callable) -> None:
+        self._originals.append((cls, name, cls.__dict__[name]))
+        setattr(cls, name, replacement)
+
+    def _stack(self) -> List[_Capture]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _write(self, capture: _Capture, elapsed: float) -> None:
+        """Write the dump and the report of a capture, and add its allocations to the totals."""
+        with self._lock:
+            self._sequence += 1
+            self.captured += 1
+            sequence = self._sequence
+            for site, (size, count) in capture.allocations.items():
+                totals = self.allocations.setdefault(site, [0, 0])
+                totals[0] += size
+                totals[1] += count
+        base = os.path.join(self.output_dir, f"{sequence:04d}-{_slug(capture.name)}")
+        capture.profile.dump_stats(base + ".prof")
+
+        stream = io.StringIO()
+        stats = pstats.Stats(capture.profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        with open(base + ".txt", "w") as report:
+            report.write(f"{capture.name}: {elapsed * 1000:.3f} ms, "
+                         f"pico de memória alocada {capture.peak / 1024:.1f} KiB\n\n")
+            report.write(_format_allocations(capture.allocations, self.top))
+            report.write("\n")
+            report.write(stream.getvalue())
+
+
+def _format_allocations(allocations: Dict[Tuple[str, int], List[int]], top: int) -> str:
+    """Format the top allocation sites by size."""
+    lines = [f"Top {top} locais de alocação (blocos ainda vivos ao final da chamada):"]
+    ranked = sorted(allocations.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    for (filename, lineno), (size, count) in ranked:
+        lines.append(f"{size / 1024:10.1f} KiB {count:8d} blocos  {filename}:{lineno}")
+    return "\n".join(lines) + "\n"
+
+
+def _slug(name: str) -> str:
+    """Convert a command label or method name to a file name part."""
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9.]+', '-', ascii_name.lower()).strip('-') or 'call'
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: group-by analytics over the ledger versus walking every account.
+
+Builds a synthetic dataset and answers three questions - totals per branch,
+daily cash-out per ATM and deposit volume per month - first by iterating
+the transactions of every account, then with LedgerAnalytics (numpy and
+pure Python backends). Also reports the one-time export cost and the cost
+the analytics listener adds to each deposit.
+
+Usage:
+    python benchmarks/bench_analytics.py [--accounts N] [--transactions M]
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.domain.operation_location import ATM
+from bank.business.domain.transaction import Deposit, Withdrawal
+from bank.data import analytics
+from bank.data.analytics import LedgerAnalytics
+from bank.data.database import Database
+from bank.data.synthetic import SyntheticDataGenerator
+
+
+def naive_queries(database: Database) -> tuple:
+    """Answer the three questions by walking the transactions of every account."""
+    by_branch = defaultdict(float)
+    cash_out = defaultdict(float)
+    deposits = defaultdict(float)
+    for account in database.get_all_current_accounts():
+        branch = account.get_id().get_branch().get_number()
+        for transaction in account.get_transactions():
+            by_branch[(branch, type(transaction).__name__)] += transaction.get_amount()
+            if isinstance(transaction, Withdrawal) and isinstance(transaction.get_location(), ATM):
+                cash_out[(transaction.get_location().get_number(), transaction.get_date().date())] += \
+                    transaction.get_amount()
+            elif isinstance(transaction, Deposit):
+                deposits[transaction.get_date().date().replace(day=1)] += transaction.get_amount()
+    return by_branch, cash_out, deposits
+
+
+def analytics_queries(ledger_analytics: LedgerAnalytics) -> tuple:
+    return (ledger_analytics.get_totals_by_branch(), ledger_analytics.get_daily_cash_out(),
+            ledger_analytics.get_deposit_volume('month'))
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=20000)
+    parser.add_argument("--transactions", type=int, default=2000000)
+    parser.add_argument("--deposits", type=int, default=20000)
+    args = parser.parse_args()
+
+    database = Database(init_data=False)
+    SyntheticDataGenerator(seed=1, accounts=args.accounts, transactions=args.transactions).populate(database)
+    accounts = list(database.get_all_current_accounts())
+    atm = next(location for location in database.get_all_operation_locations() if isinstance(location, ATM))
+    print(f"{args.transactions} transactions, {args.accounts} accounts")
+
+    naive = timed(naive_queries, database)
+    print(f"naive loop over all accounts:        {naive:8.3f} s")
+
+    backends = [False] + ([True] if analytics.numpy is not None else [])
+    for use_numpy in backends:
+        name = "numpy" if use_numpy else "pure Python"
+        start = time.perf_counter()
+        ledger_analytics = LedgerAnalytics(database, use_numpy)
+        export = time.perf_counter() - start
+        queries = timed(analytics_queries, ledger_analytics)
+        print(f"analytics ({name}): export {export:.3f} s, queries {queries:8.3f} s "
+              f"({naive / queries:.1f}x faster than the loop)")
+
+        start = time.perf_counter()
+        for index in range(args.deposits):
+            accounts[index % len(accounts)].deposit(atm, index, 1.0)
+        with_listener = (time.perf_counter() - start) / args.deposits
+        for account in accounts:
+            account.remove_listener(ledger_analytics)
+        start = time.perf_counter()
+        for index in range(args.deposits):
+            accounts[index % len(accounts)].deposit(atm, index, 1.0)
+        without_listener = (time.perf_counter() - start) / args.deposits
+        print(f"  deposit: {without_listener * 1e6:.1f} us without analytics, "
+              f"{with_listener * 1e6:.1f} us with incremental updates")
+    if analytics.numpy is None:
+        print("numpy is not installed: only the pure Python backend was measured")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent ATM sessions on the asyncio facade versus sequential sync calls.
+
+Every session logs in and performs a mix of deposits, withdrawals,
+transfers and balance queries. The sync run performs the same operations
+one after the other; the async run interleaves all sessions on one event
+loop, whose calls run on its default executor. With a write-ahead log,
+the async run uses a larger thread pool so that sessions share group
+commits instead of waiting for one fsync each.
+
+Usage:
+    python benchmarks/bench_async.py [--sessions N] [--operations M] [--wal-sessions K]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.business_exception import BusinessException
+from bank.business.domain.client import Client
+from bank.business.domain.current_account import CurrentAccount
+from bank.business.domain.operation_location import Branch, ATM
+from bank.business.impl.async_service_impl import AsyncAccountOperationService
+from bank.business.impl.service_impl import AccountOperationServiceImpl
+from bank.data.database import Database
+
+
+def build_service(accounts: int, wal_path: str = None) -> AccountOperationServiceImpl:
+    database = Database(init_data=False, wal_path=wal_path)
+    branch = Branch(1, "Branch 1")
+    database.save_operation_location(branch)
+    database.save_operation_location(ATM(2))
+    for number in range(1, accounts + 1):
+        client = Client("Client", str(number), 10000000000 + number, "123", datetime(1990, 1, 1))
+        database.save_current_account(CurrentAccount(branch, number, client, 1000.0))
+    return AccountOperationServiceImpl(database)
+
+
+def session_script(session: int, accounts: int, operations: int) -> list:
+    """Get the calls made by a session: (method name, arguments)."""
+    rng = random.Random(session)
+    number = rng.randint(1, accounts)
+    calls = [("login", (1, number, "123"))]
+    for _ in range(operations):
+        kind = rng.randint(1, 4)
+        if kind == 1:
+            calls.append(("deposit", (2, 1, number, rng.randint(1000, 9999), 10.0)))
+        elif kind == 2:
+            calls.append(("withdrawal", (2, 1, number, 5.0)))
+        elif kind == 3:
+            calls.append(("transfer", (2, 1, number, 1, rng.randint(1, accounts), 5.0)))
+        else:
+            calls.append(("get_balance", (1, number)))
+    return calls
+
+
+def run_sync(service: AccountOperationServiceImpl, scripts: list) -> None:
+    for script in scripts:
+        for method, args in script:
+            try:
+                getattr(service, method)(*args)
+            except BusinessException:
+                pass
+
+
+async def run_async(service: AsyncAccountOperationService, scripts: list) -> None:
+    async def session(script: list) -> None:
+        for method, args in script:
+            try:
+                await getattr(service, method)(*args)
+            except BusinessException:
+                pass
+
+    await asyncio.gather(*(session(script) for script in scripts))
+
+
+def compare(label: str, sessions: int, operations: int, wal_directory: str = None) -> None:
+    accounts = max(sessions // 2, 2)
+    scripts = [session_script(session, accounts, operations) for session in range(sessions)]
+    calls = sum(len(script) for script in scripts)
+
+    wal_path = os.path.join(wal_directory, "sync.wal") if wal_directory else None
+    service = build_service(accounts, wal_path)
+    start = time.perf_counter()
+    run_sync(service, scripts)
+    sync_time = time.perf_counter() - start
+    service.database.close()
+
+    wal_path = os.path.join(wal_directory, "async.wal") if wal_directory else None
+    service = build_service(accounts, wal_path)
+    executor = ThreadPoolExecutor(64) if wal_directory else None
+    start = time.perf_counter()
+    asyncio.run(run_async(AsyncAccountOperationService(service, executor), scripts))
+    async_time = time.perf_counter() - start
+    if executor is not None:
+        executor.shutdown()
+    service.database.close()
+
+    print(f"{label}: {sessions} sessions, {calls} calls")
+    print(f"  sync : {calls / sync_time:9.0f} calls/s")
+    print(f"  async: {calls / async_time:9.0f} calls/s ({sync_time / async_time:.1f}x)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--operations", type=int, default=10, help="operations per session")
+    parser.add_argument("--wal-sessions", type=int, default=500,
+                        help="sessions of the write-ahead log run")
+    args = parser.parse_args()
+
+    compare("in-memory", args.sessions, args.operations)
+    with tempfile.TemporaryDirectory() as directory:
+        compare("with WAL", args.wal_sessions, args.operations, directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: balance at a past date from checkpoints versus replaying the history.
+
+Builds an account with a long history, then compares get_balance_at with
+replaying get_transactions() for random dates, and measures the cost of
+recording rows in order and back-dated, which maintain the checkpoints.
+
+Usage:
+    python benchmarks/bench_balance_at.py [--transactions N] [--queries Q]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.domain.transaction import Deposit, Transfer
+from bank.business.impl.service_impl import AccountOperationServiceImpl
+from bank.data.database import Database
+from bank.data.synthetic import SyntheticDataGenerator
+
+
+def replay_balance(account, when: datetime) -> float:
+    """Balance at when, the way it was computed before the checkpoints."""
+    balance = account.get_balance()
+    for transaction in account.get_transactions():
+        if transaction.get_date() <= when:
+            continue
+        amount = transaction.get_amount()
+        if isinstance(transaction, Deposit):
+            balance -= amount
+        elif isinstance(transaction, Transfer) and transaction.get_destination_account() is account:
+            balance -= amount
+        else:
+            balance += amount
+    return balance
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    begin, end = datetime(2015, 1, 1), datetime(2024, 12, 31, 23, 59, 59)
+    database = Database(init_data=False)
+    SyntheticDataGenerator(seed=1, accounts=2, transactions=args.transactions, start=begin, end=end).populate(database)
+    account = max(database.get_all_current_accounts(), key=lambda account: len(account.get_ledger()))
+    branch, number = account.get_id().get_branch().get_number(), account.get_id().get_number()
+    service = AccountOperationServiceImpl(database)
+    rng = random.Random(1)
+    dates = [begin + (end - begin) * rng.random() for _ in range(args.queries)]
+    print(f"{len(account.get_ledger())} transactions")
+
+    start = time.perf_counter()
+    for when in dates:
+        service.get_balance_at(branch, number, when)
+    elapsed = time.perf_counter() - start
+    print(f"get_balance_at   {elapsed / len(dates) * 1e6:12.1f} us/query")
+
+    replayed = dates[:max(1, len(dates) // 100)]
+    start = time.perf_counter()
+    for when in replayed:
+        expected = replay_balance(account, when)
+    elapsed = time.perf_counter() - start
+    print(f"replay           {elapsed / len(replayed) * 1e6:12.1f} us/query")
+    print(f"same result      {abs(expected - service.get_balance_at(branch, number, replayed[-1])) < 1e-6}")
+
+    ledger = account.get_ledger()
+    location = next(iter(ledger.location_table.values()))
+    rows = 1000
+    for name, offset in (("append, in order", timedelta(days=3650)), ("append, back-dated", None)):
+        start = time.perf_counter()
+        for _ in range(rows):
+            date = end + offset if offset is not None else begin + (end - begin) * rng.random()
+            ledger.append(0, date, 1.0, location, 1)
+        elapsed = time.perf_counter() - start
+        print(f"{name:18s} {elapsed / rows * 1e6:10.1f} us/row")
+
+
+if __name__ == "__main__":
+    main()
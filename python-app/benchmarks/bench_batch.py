@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: apply_batch versus one service call per operation.
+
+Usage:
+    python benchmarks/bench_batch.py [--accounts N] [--operations M] [--wal-operations K]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.business_exception import BusinessException
+from bank.business.domain.batch_operation import BatchOperation
+from bank.business.domain.client import Client
+from bank.business.domain.current_account import CurrentAccount
+from bank.business.domain.operation_location import Branch, ATM
+from bank.business.impl.service_impl import AccountOperationServiceImpl
+from bank.data.database import Database
+
+
+def build_service(accounts: int, wal_path: str = None) -> AccountOperationServiceImpl:
+    database = Database(init_data=False, wal_path=wal_path)
+    branch = Branch(1, "Branch 1")
+    database.save_operation_location(branch)
+    database.save_operation_location(ATM(2))
+    for number in range(1, accounts + 1):
+        client = Client("Client", str(number), 10000000000 + number, "123", datetime(1990, 1, 1))
+        database.save_current_account(CurrentAccount(branch, number, client, 1000.0))
+    return AccountOperationServiceImpl(database)
+
+
+def generate_operations(accounts: int, count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    operations = []
+    for _ in range(count):
+        kind = rng.randint(1, 3)
+        number = rng.randint(1, accounts)
+        if kind == 1:
+            operations.append(BatchOperation.deposit(2, 1, number, rng.randint(1000, 9999), 50.0))
+        elif kind == 2:
+            operations.append(BatchOperation.withdrawal(2, 1, number, 20.0))
+        else:
+            operations.append(BatchOperation.transfer(2, 1, number, 1, rng.randint(1, accounts), 20.0))
+    return operations
+
+
+def apply_one_by_one(service: AccountOperationServiceImpl, operations: list) -> int:
+    """Apply operations through the single-operation methods. Return the number of failures."""
+    failures = 0
+    for operation in operations:
+        try:
+            if operation.get_kind() == BatchOperation.DEPOSIT:
+                service.deposit(operation.get_operation_location(), operation.get_branch(),
+                                operation.get_account_number(), operation.get_envelope(),
+                                operation.get_amount())
+            elif operation.get_kind() == BatchOperation.WITHDRAWAL:
+                service.withdrawal(operation.get_operation_location(), operation.get_branch(),
+                                   operation.get_account_number(), operation.get_amount())
+            else:
+                service.transfer(operation.get_operation_location(), operation.get_branch(),
+                                 operation.get_account_number(), operation.get_dst_branch(),
+                                 operation.get_dst_account_number(), operation.get_amount())
+        except BusinessException:
+            failures += 1
+    return failures
+
+
+def compare(label: str, accounts: int, count: int, wal_directory: str = None) -> None:
+    operations = generate_operations(accounts, count)
+    timings = []
+    for mode in ("loop", "batch"):
+        wal_path = os.path.join(wal_directory, f"{mode}.wal") if wal_directory else None
+        service = build_service(accounts, wal_path)
+        start = time.perf_counter()
+        if mode == "loop":
+            failures = apply_one_by_one(service, operations)
+        else:
+            failures = sum(not result.is_success() for result in service.apply_batch(operations))
+        timings.append(time.perf_counter() - start)
+        balance = sum(account.get_balance() for account in service.database.get_all_current_accounts())
+        service.database.close()
+        print(f"{label} {mode:5s}: {timings[-1] / count * 1e6:8.1f} us/operation  "
+              f"({failures} failed, total balance {balance:.2f})")
+    print(f"{label} speedup: {timings[0] / timings[1]:.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--operations", type=int, default=50000)
+    parser.add_argument("--wal-operations", type=int, default=1000,
+                        help="number of operations of the write-ahead log run")
+    args = parser.parse_args()
+
+    compare("in-memory", args.accounts, args.operations)
+    with tempfile.TemporaryDirectory() as directory:
+        compare("with WAL ", args.accounts, args.wal_operations, directory)
+
+
+if __name__ == "__main__":
+    main()
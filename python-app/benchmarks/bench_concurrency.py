@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent transfers from several threads.
+
+Every thread transfers random amounts between random accounts, so the total
+amount of money must stay unchanged and no balance may go negative. The
+throughput is reported for each thread count; with a write-ahead log the
+threads share group commits, so throughput grows with the thread count.
+
+Usage:
+    python benchmarks/bench_concurrency.py [--accounts N] [--operations M] [--threads 1,2,4,8] [--no-wal]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.business_exception import BusinessException
+from bank.business.domain.client import Client
+from bank.business.domain.current_account import CurrentAccount
+from bank.business.domain.operation_location import Branch, ATM
+from bank.data.database import Database
+
+
+def build_database(accounts: int, wal_path: str = None) -> Database:
+    """Build a database with the given number of accounts, each with a balance of 100."""
+    database = Database(init_data=False, wal_path=wal_path)
+    branch = Branch(1, "Branch 1")
+    database.save_operation_location(branch)
+    database.save_operation_location(ATM(2))
+    for number in range(1, accounts + 1):
+        client = Client("Client", str(number), 10000000000 + number, "123", datetime(1990, 1, 1))
+        database.save_current_account(CurrentAccount(branch, number, client, 100.0))
+    return database
+
+
+def run_transfers(database: Database, threads: int, operations: int) -> float:
+    """Run operations transfers split across threads. Return the elapsed time."""
+    accounts = list(database.get_all_current_accounts())
+    atm = database.get_operation_location(2)
+    start_barrier = threading.Barrier(threads + 1)
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        start_barrier.wait()
+        for _ in range(operations // threads):
+            source, destination = rng.sample(accounts, 2)
+            try:
+                source.transfer(atm, destination, rng.randint(1, 60))
+            except BusinessException:
+                pass  # Insufficient balance
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--operations", type=int, default=4000)
+    parser.add_argument("--threads", default="1,2,4,8,16")
+    parser.add_argument("--no-wal", action="store_true", help="run without a write-ahead log")
+    args = parser.parse_args()
+
+    print(f"{args.accounts} accounts, {args.operations} transfers, "
+          f"{'no write-ahead log' if args.no_wal else 'write-ahead log'}")
+    baseline = None
+    with tempfile.TemporaryDirectory() as directory:
+        for threads in (int(value) for value in args.threads.split(",")):
+            wal_path = None if args.no_wal else os.path.join(directory, f"bank-{threads}.wal")
+            database = build_database(args.accounts, wal_path)
+            elapsed = run_transfers(database, threads, args.operations)
+            database.close()
+
+            balances = [account.get_balance() for account in database.get_all_current_accounts()]
+            total = sum(balances)
+            if abs(total - 100.0 * args.accounts) > 1e-6 or min(balances) < 0:
+                raise SystemExit(f"inconsistent balances with {threads} threads: total {total}, "
+                                 f"minimum {min(balances)}")
+
+            throughput = args.operations / elapsed
+            baseline = baseline or throughput
+            print(f"{threads:3d} threads: {throughput:10.0f} transfers/s  "
+                  f"({throughput / baseline:4.1f}x)  total {total:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Benchmark: statement export throughput.
+
+Exports every account of a synthetic dataset in each format, with and
+without gzip, in this process and with a process pool, and reports rows
+per second, megabytes per second (before compression) and the file size.
+
+Usage:
+    python benchmarks/bench_export.py [--accounts N] [--transactions M] [--workers W]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.data.database import Database
+from bank.data.export import FORMATS, StatementExporter
+from bank.data.synthetic import SyntheticDataGenerator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=10000)
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    database = Database(init_data=False)
+    SyntheticDataGenerator(seed=1, accounts=args.accounts, transactions=args.transactions).populate(database)
+    print(f"{args.accounts} accounts, {args.transactions} transactions, pool of {args.workers} workers")
+    print(f"{'format':8s} {'gzip':5s} {'workers':>7s} {'rows/s':>12s} {'MB/s':>8s} {'file MB':>9s}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "export")
+        for output_format in FORMATS:
+            for compress in (False, True):
+                for workers in sorted({1, args.workers}):
+                    summary = StatementExporter(database, output_format, compress,
+                                                workers=workers).export(path)
+                    print(f"{output_format:8s} {str(compress):5s} {workers:7d} "
+                          f"{summary.get_rows_per_second():12,.0f} {summary.get_megabytes_per_second():8.1f} "
+                          f"{summary.get_file_bytes() / 1e6:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
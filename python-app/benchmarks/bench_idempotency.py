@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark: idempotency keys on deposits.
+
+Compares deposits without a key, first calls with a key, and retries
+answered from the cache, then streams many distinct keys through a
+bounded cache to show that its memory stays flat.
+
+Usage:
+    python benchmarks/bench_idempotency.py [--operations N] [--keys K] [--max-entries M]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.impl.idempotency import IdempotencyCache
+from bank.business.impl.service_impl import AccountOperationServiceImpl
+from bank.data.database import Database
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--operations", type=int, default=100000)
+    parser.add_argument("--keys", type=int, default=2000000)
+    parser.add_argument("--max-entries", type=int, default=100000)
+    args = parser.parse_args()
+
+    database = Database()
+    service = AccountOperationServiceImpl(database, IdempotencyCache(args.max_entries))
+    balance = service.get_balance(1, 1)
+
+    def without_key() -> None:
+        for _ in range(args.operations):
+            service.deposit(3, 1, 1, 1, 1.0)
+
+    def first_call() -> None:
+        for index in range(args.operations):
+            service.deposit(3, 1, 1, 1, 1.0, f"atm-3-{index}")
+
+    def retry() -> None:
+        for index in range(args.operations):
+            service.deposit(3, 1, 1, 1, 1.0, f"atm-3-{index}")
+
+    for name, run in (("no key", without_key), ("key, first call", first_call), ("key, retry", retry)):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:16s} {elapsed / args.operations * 1e6:8.2f} us/deposit")
+    print(f"deposits applied {service.get_balance(1, 1) - balance:.0f} of {3 * args.operations}")
+
+    cache = IdempotencyCache(args.max_entries)
+    tracemalloc.start()
+    for index in range(args.keys):
+        cache.run(f"key-{index}", ("deposit", 3, 1, 1, 1, 1.0), int)
+        if index + 1 in (args.max_entries, args.keys):
+            current = tracemalloc.get_traced_memory()[0]
+            print(f"{index + 1:9d} keys: {len(cache):7d} entries, {current / 2 ** 20:8.2f} MiB")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bulk account import from CSV.
+
+Generates a CSV of clients and imports it into the SQLite backend (which
+does not keep the accounts in memory) and into the in-memory database,
+reporting the time taken and the peak memory allocated by the import.
+
+Usage:
+    python benchmarks/bench_import.py [--rows N] [--memory-rows M]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.impl.account_importer import AccountImporter
+from bank.business.domain.operation_location import Branch
+from bank.data.database import Database
+from bank.data.sqlite_database import SqliteDatabase
+
+
+def write_clients(path: str, rows: int, seed: int = 42) -> None:
+    """Write a CSV of rows clients spread over branches 1 to 10, with a few invalid rows."""
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(AccountImporter.HEADER)
+        for number in range(rows):
+            branch = rng.randint(1, 10) if number % 1000 else 99
+            writer.writerow((branch, "Client", f"N{number}", 10000000000 + number,
+                             f"{rng.randint(1940, 2005)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                             rng.randint(0, 10000)))
+
+
+def run_import(database, input_path: str, output_path: str, trace: bool):
+    for number in range(1, 11):
+        database.save_operation_location(Branch(number, f"Branch {number}"))
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with open(input_path, newline='') as input_file, open(output_path, 'w', newline='') as output_file:
+        summary = AccountImporter(database).import_csv(input_file, output_file)
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    database.close()
+    return summary, elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--memory-rows", type=int, default=100000,
+                        help="rows imported into the in-memory database")
+    parser.add_argument("--trace", action="store_true",
+                        help="measure peak allocations with tracemalloc (slower)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "clients.csv")
+        output_path = os.path.join(directory, "results.csv")
+        for label, rows, database in (
+                ("SQLite", args.rows, lambda: SqliteDatabase(os.path.join(directory, "bank.db"),
+                                                            init_data=False)),
+                ("in-memory", args.memory_rows, lambda: Database(init_data=False))):
+            write_clients(input_path, rows)
+            summary, elapsed, peak = run_import(database(), input_path, output_path, args.trace)
+            line = (f"{label:9s}: {rows} rows in {elapsed:6.2f} s ({rows / elapsed:8.0f} rows/s), "
+                    f"{summary.get_imported()} imported, {summary.get_failed()} rejected")
+            if args.trace:
+                line += f", peak {peak / 2 ** 20:.1f} MiB"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
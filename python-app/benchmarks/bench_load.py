@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark: configurable workload with per-operation latency percentiles.
+
+Drives AccountOperationServiceImpl with a mix of login, balance, deposit,
+withdrawal, transfer and statement calls. Accounts are picked with a
+Zipfian popularity, the most popular being the sample "Richer" account.
+
+In open-loop mode (--rate), requests are scheduled at a fixed average
+arrival rate with exponential inter-arrival times, and latency is measured
+from the scheduled arrival, so queueing delay is included when the service
+falls behind. Without --rate, each thread sends its next request as soon
+as the previous one completes (closed loop).
+
+Usage:
+    python benchmarks/bench_load.py [--operations N] [--rate R] [--mix balance=40,deposit=20,...]
+                                    [--zipf S] [--accounts A] [--threads T] [--json results.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from itertools import accumulate
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.business_exception import BusinessException
+from bank.business.domain.client import Client
+from bank.business.domain.current_account import CurrentAccount
+from bank.business.impl.service_impl import AccountOperationServiceImpl
+from bank.data.database import Database
+
+DEFAULT_MIX = "login=5,balance=35,deposit=20,withdrawal=15,transfer=15,statement=10"
+PERCENTILES = (50, 95, 99, 99.9)
+ATM_NUMBER = 3
+
+
+class Workload:
+    """Picks operations from a weighted mix and accounts from a Zipfian distribution."""
+
+    def __init__(self, mix: dict, accounts: list, zipf: float, seed: int):
+        self.rng = random.Random(seed)
+        self.operations = list(mix)
+        self.operation_weights = list(accumulate(mix.values()))
+        self.accounts = accounts
+        self.account_weights = list(accumulate(1 / rank ** zipf for rank in range(1, len(accounts) + 1)))
+
+    def next_operation(self) -> str:
+        return self.operations[bisect_left(self.operation_weights,
+                                           self.rng.random() * self.operation_weights[-1])]
+
+    def next_account(self) -> tuple:
+        return self.accounts[bisect_left(self.account_weights, self.rng.random() * self.account_weights[-1])]
+
+
+def build_service(accounts: int) -> tuple:
+    """Build the sample database plus accounts. Return the service and the (branch, number) keys, hottest first."""
+    database = Database()
+    branches = [location for location in database.get_all_operation_locations()
+                if location.get_number() in (1, 2)]
+    for index in range(accounts):
+        number = database.get_next_current_account_number()
+        client = Client("Load", str(number), 10000000000 + number, "123", datetime(1990, 1, 1))
+        database.save_current_account(CurrentAccount(branches[index % 2], number, client, 1000.0))
+    keys = [(account.get_id().get_branch().get_number(), account.get_id().get_number())
+            for account in database.get_all_current_accounts()]
+    # The "Richer" sample account is the hottest
+    keys.sort(key=lambda key: key != (2, 3))
+    return AccountOperationServiceImpl(database), keys
+
+
+def perform(service: AccountOperationServiceImpl, workload: Workload, operation: str, now: datetime) -> None:
+    branch, number = workload.next_account()
+    if operation == "login":
+        service.login(branch, number, "123")
+    elif operation == "balance":
+        service.get_balance(branch, number)
+    elif operation == "deposit":
+        service.deposit(ATM_NUMBER, branch, number, 1000, 10.0)
+    elif operation == "withdrawal":
+        service.withdrawal(ATM_NUMBER, branch, number, 5.0)
+    elif operation == "transfer":
+        dst_branch, dst_number = workload.next_account()
+        service.transfer(ATM_NUMBER, branch, number, dst_branch, dst_number, 5.0)
+    elif operation == "statement":
+        service.get_statement_by_month(branch, number, now.month, now.year)
+    else:
+        raise ValueError(f"unknown operation: {operation}")
+
+
+def run_thread(service, workload: Workload, count: int, interval: float, start: float,
+               latencies: dict, errors: dict) -> None:
+    """Perform count operations, recording their latencies. interval 0 means closed loop."""
+    now = datetime.now()
+    scheduled = start
+    for _ in range(count):
+        operation = workload.next_operation()
+        if interval > 0:
+            scheduled += workload.rng.expovariate(1 / interval)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            scheduled = time.perf_counter()
+        try:
+            perform(service, workload, operation, now)
+        except BusinessException:
+            errors[operation] = errors.get(operation, 0) + 1
+        latencies.setdefault(operation, []).append(time.perf_counter() - scheduled)
+
+
+def percentile(sorted_values: list, rank: float) -> float:
+    """Nearest-rank percentile."""
+    index = max(int(round(rank / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for item in mix.split(","):
+        name, weight = item.split("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--operations", type=int, default=100000)
+    parser.add_argument("--rate", type=float, default=0, help="open-loop arrivals per second (0 = closed loop)")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of account popularity")
+    parser.add_argument("--accounts", type=int, default=10000, help="accounts added to the sample data")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    service, accounts = build_service(args.accounts)
+    interval = args.threads / args.rate if args.rate > 0 else 0
+    per_thread = args.operations // args.threads
+    thread_results = [({}, {}) for _ in range(args.threads)]
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run_thread,
+                                args=(service, Workload(mix, accounts, args.zipf, args.seed + index),
+                                      per_thread, interval, start, *thread_results[index]))
+               for index in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for operation in mix:
+        latencies = sorted(value for latencies, _ in thread_results for value in latencies.get(operation, []))
+        if not latencies:
+            continue
+        results[operation] = {
+            "count": len(latencies),
+            "errors": sum(errors.get(operation, 0) for _, errors in thread_results),
+            "throughput": len(latencies) / elapsed,
+            "latency_us": {f"p{rank:g}": percentile(latencies, rank) * 1e6 for rank in PERCENTILES},
+        }
+    total = sum(result["count"] for result in results.values())
+    report = {
+        "config": {"operations": args.operations, "rate": args.rate, "mix": mix, "zipf": args.zipf,
+                   "accounts": len(accounts), "threads": args.threads, "seed": args.seed},
+        "elapsed": elapsed,
+        "throughput": total / elapsed,
+        "operations": results,
+    }
+
+    mode = f"open loop at {args.rate:g}/s" if args.rate > 0 else "closed loop"
+    print(f"{total} operations in {elapsed:.2f} s ({report['throughput']:.0f}/s), {mode}, "
+          f"{args.threads} threads, zipf {args.zipf}")
+    print(f"{'operation':12s} {'count':>8s} {'errors':>7s} {'ops/s':>9s} "
+          + " ".join(f"{'p' + format(rank, 'g') + ' us':>10s}" for rank in PERCENTILES))
+    for operation, result in results.items():
+        print(f"{operation:12s} {result['count']:8d} {result['errors']:7d} {result['throughput']:9.0f} "
+              + " ".join(f"{value:10.1f}" for value in result["latency_us"].values()))
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: account lookups by branch and account number.
+
+Compares building a CurrentAccountId (and its Branch) for every lookup with
+Database.find_current_account, which walks a nested dictionary keyed by the
+plain numbers, and reports lookups per second and the memory allocated
+while a lookup runs.
+
+Usage:
+    python benchmarks/bench_lookup.py [--accounts N] [--lookups M]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.domain.current_account_id import CurrentAccountId
+from bank.business.domain.operation_location import Branch
+from bank.business.impl.service_impl import AccountOperationServiceImpl
+from bank.data.database import Database
+from bank.data.synthetic import SyntheticDataGenerator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=1000000)
+    args = parser.parse_args()
+
+    database = Database(init_data=False)
+    SyntheticDataGenerator(seed=1, accounts=args.accounts, transactions=0).populate(database)
+    service = AccountOperationServiceImpl(database)
+    rng = random.Random(1)
+    keys = [(account.get_id().get_branch().get_number(), account.get_id().get_number())
+            for account in rng.sample(list(database.get_all_current_accounts()), min(args.accounts, 1000))]
+    keys = (keys * (args.lookups // len(keys) + 1))[:args.lookups]
+
+    def by_id(branch: int, number: int):
+        return database.current_accounts.get(CurrentAccountId(Branch(branch), number))
+
+    lookups = [
+        ("CurrentAccountId(Branch(b), n)", by_id),
+        ("find_current_account(b, n)", database.find_current_account),
+        ("service.get_balance(b, n)", service.get_balance),
+    ]
+    print(f"{args.lookups} lookups over {args.accounts} accounts")
+    for name, lookup in lookups:
+        start = time.perf_counter()
+        for branch, number in keys:
+            lookup(branch, number)
+        elapsed = time.perf_counter() - start
+
+        branch, number = keys[0]
+        lookup(branch, number)
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        lookup(branch, number)
+        allocated = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+        print(f"{name:32s} {args.lookups / elapsed:12,.0f} lookups/s  {allocated:5d} bytes allocated per lookup")
+
+
+if __name__ == "__main__":
+    main()
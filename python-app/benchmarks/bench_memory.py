@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory used per account and per transaction.
+
+Reports the bytes retained per account (account, id, client and empty
+ledger), per ledger row, and per materialized Transaction object, on a
+synthetic dataset.
+
+Usage:
+    python benchmarks/bench_memory.py [--accounts N] [--transactions M]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.domain.client import Client
+from bank.business.domain.current_account import CurrentAccount
+from bank.business.domain.operation_location import Branch, ATM
+
+
+def build_accounts(accounts: int) -> list:
+    branches = [Branch(number, f"Branch {number}") for number in range(1, 11)]
+    return [CurrentAccount(branches[number % 10], number,
+                           Client("Client", str(number), number, "123", datetime(1990, 1, 1)), 1000.0)
+            for number in range(1, accounts + 1)]
+
+
+def record_transactions(accounts: list, transactions: int, seed: int = 42) -> None:
+    rng = random.Random(seed)
+    atms = [ATM(number) for number in range(1001, 1011)]
+    for _ in range(transactions):
+        account = rng.choice(accounts)
+        kind = rng.randint(1, 3)
+        if kind == 1:
+            account.deposit(rng.choice(atms), rng.randint(1000, 9999), 10.0)
+        elif kind == 2:
+            account.withdrawal(rng.choice(atms), 1.0)
+        else:
+            account.transfer(rng.choice(atms), rng.choice(accounts), 1.0)
+
+
+def measure(function):
+    """Call function. Return its result and the bytes still allocated afterwards."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=10000)
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--materialize", type=int, default=100000,
+                        help="number of ledger rows materialized as Transaction objects")
+    args = parser.parse_args()
+
+    accounts, account_bytes = measure(lambda: build_accounts(args.accounts))
+    # Warm up the per-account structures so only the rows are measured
+    record_transactions(accounts, args.accounts * 4, seed=1)
+    rows_before = sum(len(account.ledger) for account in accounts)
+
+    _, ledger_bytes = measure(lambda: record_transactions(accounts, args.transactions))
+    rows = sum(len(account.ledger) for account in accounts) - rows_before
+
+    def materialize():
+        transactions = []
+        for account in accounts:
+            transactions.extend(account.get_transactions())
+            if len(transactions) >= args.materialize:
+                break
+        return transactions
+
+    transactions, object_bytes = measure(materialize)
+
+    print(f"{args.accounts} accounts, {args.transactions} transactions ({rows} ledger rows)")
+    print(f"Per account:              {account_bytes / args.accounts:8.1f} bytes")
+    print(f"Per ledger row:           {ledger_bytes / rows:8.1f} bytes")
+    print(f"Per Transaction object:   {object_bytes / len(transactions):8.1f} bytes")
+
+
+if __name__ == "__main__":
+    main()
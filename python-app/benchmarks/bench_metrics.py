@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark: overhead of recording service metrics.
+
+Runs the same calls on AccountOperationServiceImpl and on the same service
+wrapped in InstrumentedAccountOperationService, alternating between both
+every chunk of calls over several rounds, keeps the best time of each
+chunk, and reports the time per call and the relative overhead. The database is in memory, so
+the calls are as fast as they get and the overhead is at its largest.
+
+Usage:
+    python benchmarks/bench_metrics.py [--accounts N] [--calls M] [--rounds R] [--json]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.impl.instrumented_service_impl import InstrumentedAccountOperationService
+from bank.business.impl.service_impl import AccountOperationServiceImpl
+from bank.data.database import Database
+from bank.data.synthetic import SyntheticDataGenerator
+from bank.util.metrics import MetricsRegistry
+
+# Calls timed together
+CHUNK_SIZE = 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=10000)
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    database = Database(init_data=False)
+    SyntheticDataGenerator(seed=1, accounts=args.accounts, transactions=args.accounts * 10,
+                           start=datetime(2024, 1, 1), end=datetime(2024, 12, 31)).populate(database)
+    atm = min(atm.get_number() for atm in database.get_atms())
+    rng = random.Random(1)
+    keys = [(account.get_id().get_branch().get_number(), account.get_id().get_number())
+            for account in database.get_all_current_accounts()]
+    keys = [rng.choice(keys) for _ in range(args.calls)]
+    pairs = list(zip(keys, keys[1:] + keys[:1]))
+
+    plain = AccountOperationServiceImpl(database)
+    registry = MetricsRegistry()
+    instrumented = InstrumentedAccountOperationService(plain, registry)
+
+    operations = [
+        ("get_balance", lambda service, key, _: service.get_balance(*key)),
+        ("deposit", lambda service, key, _: service.deposit(atm, *key, 1, 1.0)),
+        ("withdrawal", lambda service, key, _: service.withdrawal(atm, *key, 1.0)),
+        ("transfer", lambda service, key, other: service.transfer(atm, *key, *other, 1.0)),
+        ("get_statement_by_month", lambda service, key, _: service.get_statement_by_month(*key, 6, 2024)),
+    ]
+
+    def run(service, call, chunk) -> float:
+        start = time.perf_counter()
+        for key, other in chunk:
+            call(service, key, other)
+        return time.perf_counter() - start
+
+    chunks = [pairs[start:start + CHUNK_SIZE] for start in range(0, len(pairs), CHUNK_SIZE)]
+    results = []
+    gc.disable()
+    for name, call in operations:
+        # Best time of each chunk of calls, for each service
+        best = {"plain": [float("inf")] * len(chunks), "instrumented": [float("inf")] * len(chunks)}
+        for round_number in range(args.rounds):
+            for index, chunk in enumerate(chunks):
+                # Both services run each chunk back to back, in alternating order
+                order = [("plain", plain), ("instrumented", instrumented)]
+                for label, service in order[::-1] if (round_number + index) % 2 else order:
+                    best[label][index] = min(best[label][index], run(service, call, chunk))
+            gc.collect()
+        plain_time, instrumented_time = sum(best["plain"]), sum(best["instrumented"])
+        results.append({
+            "operation": name,
+            "plain_us": plain_time / args.calls * 1e6,
+            "instrumented_us": instrumented_time / args.calls * 1e6,
+            "overhead": instrumented_time / plain_time - 1,
+        })
+    gc.enable()
+
+    if args.json:
+        print(json.dumps({"results": results, "metrics": registry.to_json()}, indent=2))
+        return
+    print(f"{args.calls} calls, best of {args.rounds} rounds per chunk of {CHUNK_SIZE}, {args.accounts} accounts")
+    print(f"{'operation':24s} {'plain':>10s} {'instrumented':>13s} {'overhead':>9s}")
+    for result in results:
+        print(f"{result['operation']:24s} {result['plain_us']:8.2f}us {result['instrumented_us']:11.2f}us "
+              f"{result['overhead']:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: request throughput of the JSON server over loopback.
+
+The server runs in its own process on the sample database. Client threads
+each hold one keep-alive connection and send deposits and balance queries,
+either one at a time or pipelined.
+
+Usage:
+    python benchmarks/bench_server.py [--connections N] [--requests M] [--depths 1,16,64] [--workers W]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.data.database import Database
+from bank.ui.json.client import BankClient
+from bank.ui.json.server import BankServer
+
+
+def serve(workers: int, port_queue) -> None:
+    server = BankServer(Database(), workers=workers)
+
+    async def run() -> None:
+        await server.start()
+        port_queue.put(server.get_port())
+        await server.serve_forever()
+
+    asyncio.run(run())
+
+
+def run_clients(port: int, connections: int, requests: int, depth: int) -> float:
+    """Send requests split across connections, depth at a time. Return the elapsed time."""
+    barrier = threading.Barrier(connections + 1)
+    per_connection = requests // connections
+
+    def client(number: int) -> None:
+        account = number % 3 + 1
+        branch = 1 if account == 1 else 2
+        batch = [("operation", "deposit", dict(operation_location=3, branch=branch, account_number=account,
+                                               envelope=1, amount=1.0)),
+                 ("operation", "get_balance", dict(branch=branch, account_number=account))] * (depth // 2 or 1)
+        batch = batch[:depth]
+        with BankClient(port=port) as bank_client:
+            barrier.wait()
+            for _ in range(per_connection // depth):
+                bank_client.call_many(batch)
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(connections)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--depths", default="1,16,64")
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(args.workers, port_queue), daemon=True)
+    server.start()
+    port = port_queue.get()
+    try:
+        print(f"{args.connections} connections, {args.requests} requests, {args.workers} server workers")
+        for depth in (int(value) for value in args.depths.split(",")):
+            elapsed = run_clients(port, args.connections, args.requests, depth)
+            print(f"pipeline depth {depth:3d}: {args.requests / elapsed:8.0f} requests/s")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: branch-sharded worker processes versus a single process.
+
+Applies the same batches of deposits, withdrawals and transfers (a share of
+them between branches) with the single-process service and with the
+sharded service for several worker counts, and measures the round trip of
+a single routed call. Scaling needs as many free cores as workers.
+
+Usage:
+    python benchmarks/bench_sharding.py [--branches B] [--accounts N] [--operations M] [--workers 1,2,4]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.domain.batch_operation import BatchOperation
+from bank.business.domain.client import Client
+from bank.business.domain.current_account import CurrentAccount
+from bank.business.domain.operation_location import Branch, ATM
+from bank.business.impl.service_impl import AccountOperationServiceImpl
+from bank.business.impl.sharded_service_impl import ShardedAccountOperationService
+from bank.data.database import Database
+
+ATM_NUMBER = 1000
+
+
+def build_database(branches: int, accounts: int) -> Database:
+    database = Database(init_data=False)
+    database.save_operation_location(ATM(ATM_NUMBER))
+    for branch_number in range(1, branches + 1):
+        branch = Branch(branch_number, f"Branch {branch_number}")
+        database.save_operation_location(branch)
+        for number in range(1, accounts + 1):
+            client = Client("Client", str(number), 10000000000 + number, "123", datetime(1990, 1, 1))
+            database.save_current_account(CurrentAccount(branch, number, client, 1000.0))
+    return database
+
+
+def generate_batches(branches: int, accounts: int, operations: int, batch_size: int,
+                     cross_branch: float, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    batches = []
+    for start in range(0, operations, batch_size):
+        batch = []
+        for _ in range(min(batch_size, operations - start)):
+            branch = rng.randint(1, branches)
+            number = rng.randint(1, accounts)
+            kind = rng.randint(1, 3)
+            if kind == 1:
+                batch.append(BatchOperation.deposit(ATM_NUMBER, branch, number, 1000, 10.0))
+            elif kind == 2:
+                batch.append(BatchOperation.withdrawal(ATM_NUMBER, branch, number, 5.0))
+            else:
+                dst_branch = rng.randint(1, branches) if rng.random() < cross_branch else branch
+                batch.append(BatchOperation.transfer(ATM_NUMBER, branch, number, dst_branch,
+                                                     rng.randint(1, accounts), 5.0))
+        batches.append(batch)
+    return batches
+
+
+def run(service, batches: list) -> float:
+    start = time.perf_counter()
+    for batch in batches:
+        service.apply_batch(batch)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--branches", type=int, default=8)
+    parser.add_argument("--accounts", type=int, default=1000, help="accounts per branch")
+    parser.add_argument("--operations", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--cross-branch", type=float, default=0.01,
+                        help="share of transfers to another branch")
+    parser.add_argument("--workers", default="1,2,4,8")
+    args = parser.parse_args()
+
+    batches = generate_batches(args.branches, args.accounts, args.operations, args.batch_size,
+                               args.cross_branch)
+    print(f"{args.branches} branches x {args.accounts} accounts, {args.operations} operations, "
+          f"{os.cpu_count()} CPUs")
+
+    elapsed = run(AccountOperationServiceImpl(build_database(args.branches, args.accounts)), batches)
+    baseline = args.operations / elapsed
+    print(f"single process: {baseline:9.0f} operations/s")
+
+    for workers in (int(value) for value in args.workers.split(",")):
+        service = ShardedAccountOperationService(build_database(args.branches, args.accounts), workers)
+        elapsed = run(service, batches)
+        start = time.perf_counter()
+        for _ in range(1000):
+            service.get_balance(1, 1)
+        round_trip = (time.perf_counter() - start) / 1000
+        total = sum(service.get_balance(branch, number) for branch in range(1, args.branches + 1)
+                    for number in range(1, args.accounts + 1))
+        service.close()
+        throughput = args.operations / elapsed
+        print(f"{workers:2d} workers:     {throughput:9.0f} operations/s ({throughput / baseline:4.2f}x), "
+              f"call round trip {round_trip * 1e6:6.1f} us, total balance {total:.2f}")
+
+
+if __name__ == "__main__":
+    main()
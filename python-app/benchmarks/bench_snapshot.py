@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold start from a memory-mapped snapshot versus rebuilding the data.
+
+Usage:
+    python benchmarks/bench_snapshot.py [--accounts N] [--transactions M] [--touch K]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.data.database import Database
+from bank.business.domain.client import Client
+from bank.business.domain.current_account import CurrentAccount
+from bank.business.domain.current_account_id import CurrentAccountId
+from bank.business.domain.operation_location import Branch, ATM
+
+
+def build_database(accounts: int, transactions: int, seed: int = 42) -> Database:
+    """Build a database with the given number of accounts and transactions."""
+    rng = random.Random(seed)
+    database = Database(init_data=False)
+    branches = [Branch(number, f"Branch {number}") for number in range(1, 11)]
+    atms = [ATM(number) for number in range(1001, 1021)]
+    for location in branches + atms:
+        database.save_operation_location(location)
+
+    all_accounts = []
+    for number in range(1, accounts + 1):
+        client = Client("Client", str(number), 10000000000 + number, "123", datetime(1990, 1, 1))
+        account = CurrentAccount(rng.choice(branches), number, client, 1000.0)
+        database.save_current_account(account)
+        all_accounts.append(account)
+
+    base_date = datetime(2024, 1, 1)
+    for _ in range(transactions):
+        account = rng.choice(all_accounts)
+        location = rng.choice(atms)
+        kind = rng.randint(1, 3)
+        if kind == 1:
+            transaction = account.deposit(location, rng.randint(1000, 9999), rng.uniform(10, 500))
+        elif kind == 2 and account.get_balance() > 20:
+            transaction = account.withdrawal(location, rng.uniform(1, account.get_balance() / 2))
+        elif account.get_balance() > 20:
+            transaction = account.transfer(location, rng.choice(all_accounts),
+                                           rng.uniform(1, account.get_balance() / 2))
+        else:
+            continue
+        transaction.set_date(base_date + timedelta(minutes=rng.randint(0, 525600)))
+    return database
+
+
+def touch_accounts(database: Database, count: int, accounts: int, seed: int = 7) -> int:
+    """Read the history of count random accounts. Return the number of transactions read."""
+    rng = random.Random(seed)
+    rows = 0
+    for _ in range(count):
+        number = rng.randint(1, accounts)
+        # The branch is part of the key, so try every branch
+        for branch in range(1, 11):
+            account = database.get_current_account(CurrentAccountId(Branch(branch), number))
+            if account is not None:
+                rows += len(account.get_transactions())
+                break
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=20000)
+    parser.add_argument("--transactions", type=int, default=500000)
+    parser.add_argument("--touch", type=int, default=100)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    Database()
+    init_data_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    database = build_database(args.accounts, args.transactions)
+    rebuild_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bank.snapshot")
+
+        start = time.perf_counter()
+        database.save_snapshot(path)
+        write_time = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        restored = Database(init_data=False, snapshot_path=path)
+        open_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rows = touch_accounts(restored, args.touch, args.accounts)
+        touch_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loaded = sum(len(a.get_transactions()) for a in restored.get_all_current_accounts())
+        full_load_time = time.perf_counter() - start
+        restored.close()
+
+    print(f"Dataset: {args.accounts} accounts, {args.transactions} transactions")
+    print(f"Database() with _init_data:           {init_data_time * 1000:10.2f} ms")
+    print(f"Rebuild dataset from scratch:         {rebuild_time * 1000:10.2f} ms")
+    print(f"Write snapshot ({size / 2 ** 20:.1f} MiB):             {write_time * 1000:10.2f} ms")
+    print(f"Open snapshot (mmap, catalog only):   {open_time * 1000:10.2f} ms")
+    print(f"Touch {args.touch} accounts ({rows} transactions): {touch_time * 1000:10.2f} ms")
+    print(f"Load all accounts ({loaded} rows):     {full_load_time * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: application startup.
+
+Measures, over several fresh interpreter runs, the import time of
+bank.main reported by python -X importtime (with the modules that cost
+the most), the wall-clock time from launching run_bank.py until the first
+menu prompt is printed, and the time until the ATM menu prompt, which
+includes building the database deferred until then.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N] [--top K] [--no-sample-data]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN_BANK = os.path.join(APP_DIR, "run_bank.py")
+PROMPT = "Escolha uma opção".encode()
+
+
+def import_times() -> Dict[str, Tuple[int, int]]:
+    """Import bank.main in a fresh interpreter. Return the self and cumulative microseconds by module."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import bank.main"],
+                            cwd=APP_DIR, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, module = line[len("import time:"):].split("|")
+        times[module.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def time_to_prompts(arguments: List[str]) -> Tuple[float, float]:
+    """Launch run_bank.py. Return the seconds until the first menu prompt and until the ATM menu prompt."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, RUN_BANK] + arguments, cwd=APP_DIR,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    output = b""
+    while output.count(PROMPT) < 1:
+        output += process.stdout.read1(4096)
+    first_prompt = time.perf_counter() - start
+    # Open the ATM interface, which builds the database
+    process.stdin.write(b"2\n")
+    process.stdin.flush()
+    while output.count(PROMPT) < 2:
+        output += process.stdout.read1(4096)
+    atm_prompt = time.perf_counter() - start
+    process.communicate(b"0\n0\n")
+    return first_prompt, atm_prompt
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10, help="modules listed by self import time")
+    parser.add_argument("--no-sample-data", action="store_true", help="start run_bank.py without sample data")
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    print(f"import bank.main (median of {args.runs} runs): "
+          f"{statistics.median(run['bank.main'][1] for run in runs) / 1000:.1f} ms")
+    modules = sorted(runs[0], key=lambda module: statistics.median(run.get(module, (0, 0))[0] for run in runs),
+                     reverse=True)
+    for module in modules[:args.top]:
+        print(f"  {statistics.median(run.get(module, (0, 0))[0] for run in runs) / 1000:7.2f} ms  {module}")
+
+    arguments = ["--no-sample-data"] if args.no_sample_data else []
+    prompts = [time_to_prompts(arguments) for _ in range(args.runs)]
+    print(f"time to first prompt (median): {statistics.median(first for first, _ in prompts) * 1000:.1f} ms")
+    print(f"time to ATM prompt (median):   {statistics.median(atm for _, atm in prompts) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
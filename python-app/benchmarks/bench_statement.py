@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark: full statements versus cursor-paginated statements.
+
+Builds an account with a long history, then compares the time and peak
+memory of get_statement_by_date over the whole range with reading the
+first page, and all pages, of iter_statement.
+
+Usage:
+    python benchmarks/bench_statement.py [--transactions N] [--page-size P]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.business.impl.service_impl import AccountOperationServiceImpl
+from bank.data.database import Database
+from bank.data.synthetic import SyntheticDataGenerator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=500000)
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    begin, end = datetime(2015, 1, 1), datetime(2024, 12, 31, 23, 59, 59)
+    database = Database(init_data=False)
+    SyntheticDataGenerator(seed=1, accounts=2, transactions=args.transactions, start=begin, end=end,
+                           transfer_weight=0).populate(database)
+    account = max(database.get_all_current_accounts(), key=lambda account: len(account.get_ledger()))
+    branch, number = account.get_id().get_branch().get_number(), account.get_id().get_number()
+    service = AccountOperationServiceImpl(database)
+
+    def full() -> int:
+        return len(service.get_statement_by_date(branch, number, begin, end))
+
+    def first_page() -> int:
+        return len(next(service.iter_statement(branch, number, begin, end, args.page_size)).get_transactions())
+
+    def all_pages() -> int:
+        return sum(len(page.get_transactions())
+                   for page in service.iter_statement(branch, number, begin, end, args.page_size))
+
+    print(f"{len(account.get_ledger())} transactions in the range, pages of {args.page_size}")
+    for name, read in (("get_statement_by_date", full), ("iter_statement, first page", first_page),
+                       ("iter_statement, all pages", all_pages)):
+        start = time.perf_counter()
+        count = read()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        read()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:28s} {count:9d} transactions {elapsed * 1000:10.2f} ms  peak {peak / 2 ** 20:8.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
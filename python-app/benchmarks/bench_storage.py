@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: service throughput on the in-memory and the SQLite databases.
+
+Usage:
+    python benchmarks/bench_storage.py [--accounts N] [--operations M]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bank.data.database import Database
+from bank.data.sqlite_database import SqliteDatabase
+from bank.business.impl.service_impl import AccountManagementServiceImpl, AccountOperationServiceImpl
+
+ATM_NUMBER = 3
+
+
+def populate(database, accounts: int) -> list:
+    """Create accounts through the management service. Return their (branch, number) keys."""
+    management = AccountManagementServiceImpl(database)
+    keys = []
+    for index in range(accounts):
+        branch = 1 + index % 2
+        account = management.create_current_account(branch, "Client", str(index), 10000000000 + index,
+                                                    datetime(1990, 1, 1), 1000.0)
+        keys.append((branch, account.get_id().get_number()))
+    return keys
+
+
+def run_operations(database, keys: list, operations: int, seed: int = 42) -> dict:
+    """Run a mix of operations. Return the throughput of each kind, in operations per second."""
+    service = AccountOperationServiceImpl(database)
+    rng = random.Random(seed)
+    workload = {
+        "deposit": lambda b, n: service.deposit(ATM_NUMBER, b, n, 1234, 10.0),
+        "withdrawal": lambda b, n: service.withdrawal(ATM_NUMBER, b, n, 1.0),
+        "transfer": lambda b, n: service.transfer(ATM_NUMBER, b, n, *rng.choice(keys), 1.0),
+        "balance": lambda b, n: service.get_balance(b, n),
+        "statement": lambda b, n: service.get_statement_by_month(b, n, datetime.now().month,
+                                                                 datetime.now().year),
+    }
+    results = {}
+    for name, operation in workload.items():
+        targets = [rng.choice(keys) for _ in range(operations)]
+        start = time.perf_counter()
+        for branch, number in targets:
+            operation(branch, number)
+        results[name] = operations / (time.perf_counter() - start)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--operations", type=int, default=5000)
+    args = parser.parse_args()
+
+    memory = Database()
+    memory_results = run_operations(memory, populate(memory, args.accounts), args.operations)
+
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite = SqliteDatabase(os.path.join(directory, "bank.db"))
+        sqlite_results = run_operations(sqlite, populate(sqlite, args.accounts), args.operations)
+        sqlite.close()
+
+    print(f"{args.accounts} accounts, {args.operations} operations per kind (ops/s)")
+    print(f"{'operation':<12} {'in-memory':>12} {'sqlite':>12} {'ratio':>8}")
+    for name in memory_results:
+        ratio = memory_results[name] / sqlite_results[name]
+        print(f"{name:<12} {memory_results[name]:>12.0f} {sqlite_results[name]:>12.0f} {ratio:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
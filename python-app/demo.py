@@ -69,8 +69,7 @@ def demo_banking_system():
         # Test deposit
         print("\n6. Realizando depósito...")
         # Get first ATM
-        from bank.business.domain.operation_location import ATM
-        atm_locations = [loc for loc in db.get_all_operation_locations() if isinstance(loc, ATM)]
+        atm_locations = list(db.get_atms())
         if atm_locations:
             deposit = account_ops.deposit(
                 atm_locations[0].get_number(),
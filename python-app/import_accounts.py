@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Bulk account import - creates the current accounts listed in a CSV file.
+
+Usage:
+    python import_accounts.py clients.csv results.csv (--wal bank.wal | --sqlite bank.db)
+
+Sample data is never added: the branches must already be in the storage.
+"""
+import argparse
+import os
+import sys
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bank.business.impl.account_importer import AccountImporter
+from bank.data.database import Database
+from bank.data.sqlite_database import SqliteDatabase
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Importa contas correntes de um arquivo CSV")
+    parser.add_argument("input", help="CSV com branch,first_name,last_name,cpf,birthday,balance")
+    parser.add_argument("output", help="CSV de saída com o número e a senha de cada conta, ou o erro")
+    storage = parser.add_mutually_exclusive_group(required=True)
+    storage.add_argument("--wal", help="log de escrita antecipada do banco em memória")
+    storage.add_argument("--sqlite", help="arquivo do banco SQLite")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    database = SqliteDatabase(args.sqlite) if args.sqlite else Database(wal_path=args.wal, init_data=False)
+    try:
+        with open(args.input, newline='', encoding='utf-8') as input_file, \
+                open(args.output, 'w', newline='', encoding='utf-8') as output_file:
+            summary = AccountImporter(database, args.chunk_size).import_csv(input_file, output_file)
+    finally:
+        database.close()
+    print(f"Contas importadas: {summary.get_imported()}")
+    print(f"Linhas rejeitadas: {summary.get_failed()}")
+
+
+if __name__ == "__main__":
+    main()
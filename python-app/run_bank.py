@@ -4,6 +4,7 @@ Banking System - Main entry point
 Run this script to start the banking application.
 """
 
+import argparse
 import sys
 import os
 
@@ -13,4 +14,31 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from bank.main import main
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sistema bancário didático")
+    parser.add_argument("--no-sample-data", dest="sample_data", action="store_false",
+                        help="inicia com o banco de dados vazio")
+    parser.add_argument("--profile", metavar="DIRETORIO",
+                        help="grava perfis de cada comando e chamada de serviço no diretório "
+                             "(ou defina BANK_PROFILE)")
+    parser.add_argument("--profile-rate", type=float, default=1.0,
+                        help="fração das chamadas perfiladas (amostragem)")
+    parser.add_argument("--profile-top", type=int, default=20,
+                        help="número de linhas dos relatórios")
+    args = parser.parse_args()
+
+    profiler = None
+    # The profiler pulls in cProfile and tracemalloc, so it is only imported when enabled
+    if args.profile or os.environ.get("BANK_PROFILE"):
+        from bank.util.profiling import Profiler
+
+        profiler = (Profiler(args.profile, args.profile_rate, args.profile_top) if args.profile
+                    else Profiler.from_environment())
+    if profiler is None:
+        main(args.sample_data)
+    else:
+        profiler.install()
+        try:
+            main(args.sample_data)
+        finally:
+            profiler.close()
+            print(f"Perfis gravados em {profiler.output_dir}")
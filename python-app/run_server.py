@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Banking System - JSON server entry point
+Run this script to serve the banking services over TCP (JSON lines).
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Add the bank package to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bank.business.impl.idempotency import DEFAULT_MAX_ENTRIES, DEFAULT_TTL, IdempotencyCache
+from bank.data.database import Database
+from bank.ui.json.server import DEFAULT_MAX_REQUEST_BYTES, BankServer, is_loopback_host
+from bank.util.metrics import MetricsRegistry
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor JSON do sistema bancário")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="endereço de loopback em que o servidor escuta")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4,
+                        help="threads executando as operações (0 = executor padrão do event loop)")
+    parser.add_argument("--max-request-bytes", type=int, default=DEFAULT_MAX_REQUEST_BYTES,
+                        help="tamanho máximo de uma requisição (linha JSON); maiores são rejeitadas")
+    parser.add_argument("--wal", help="log de escrita antecipada")
+    parser.add_argument("--snapshot", help="snapshot carregado na inicialização")
+    parser.add_argument("--metrics", help="arquivo de métricas no formato texto do Prometheus")
+    parser.add_argument("--metrics-interval", type=float, default=15.0,
+                        help="segundos entre as gravações do arquivo de métricas")
+    parser.add_argument("--idempotency-keys", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="chaves de idempotência lembradas, no máximo (cerca de 0,5 KB cada)")
+    parser.add_argument("--idempotency-ttl", type=float, default=DEFAULT_TTL,
+                        help="segundos durante os quais uma chave de idempotência é lembrada")
+    args = parser.parse_args()
+    if not is_loopback_host(args.host):
+        parser.error("o servidor não autentica as requisições e só escuta em endereços de loopback")
+
+    database = Database(wal_path=args.wal, snapshot_path=args.snapshot)
+    metrics = MetricsRegistry() if args.metrics else None
+    server = BankServer(database, args.host, args.port, args.workers, metrics,
+                        IdempotencyCache(args.idempotency_keys, args.idempotency_ttl), args.max_request_bytes)
+
+    async def write_metrics() -> None:
+        while True:
+            await asyncio.sleep(args.metrics_interval)
+            metrics.write_prometheus(args.metrics)
+
+    async def run() -> None:
+        await server.start()
+        print(f"Servidor bancário escutando em {args.host}:{server.get_port()}")
+        writer = asyncio.create_task(write_metrics()) if metrics is not None else None
+        try:
+            await server.serve_forever()
+        finally:
+            if writer is not None:
+                writer.cancel()
+                metrics.write_prometheus(args.metrics)
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\nServidor encerrado.")
+    finally:
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
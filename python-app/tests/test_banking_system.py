@@ -1,11 +1,951 @@
 """
 Comprehensive tests for the banking system.
 """
+import asyncio
+import builtins
+import io
+import json
+import random
+import sys
+import threading
+from datetime import datetime, timedelta
+
 import pytest
 
+from bank.business.business_exception import BusinessException
+from bank.business.domain.batch_operation import BatchOperation
+from bank.business.domain.client import Client
+from bank.business.domain.current_account import CurrentAccount
+from bank.business.domain.operation_location import ATM, Branch
+from bank.business.domain.transaction import Deposit, Transfer
+from bank.business.impl.account_importer import AccountImporter
+from bank.business.impl.async_service_impl import AsyncAccountOperationService
+from bank.business.impl.atm_selector import RoundRobinATMSelector
+from bank.business.impl.idempotency import DEFAULT_MAX_ENTRIES, IdempotencyCache
+from bank.business.impl.service_impl import AccountManagementServiceImpl, AccountOperationServiceImpl
+from bank.business.impl.sharded_service_impl import ShardedAccountOperationService
+from bank.data import snapshot
+from bank.data.analytics import LedgerAnalytics
+from bank.data.database import Database
+from bank.data.export import StatementExporter
+from bank.data.sqlite_database import SqliteDatabase
+from bank.data.synthetic import SyntheticDataGenerator
+from bank.main import BankingApplication
+from bank.ui.json.server import BankServer
+from bank.ui.text.atm_interface import ATMInterface
+from bank.ui.text.branch_interface import BranchInterface
+
+# Dates of the transactions recorded by the tests
+BASE_DATE = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def populate(database: Database) -> Database:
+    """Save a branch, two ATMs and three accounts, without any transaction."""
+    branch = Branch(1, "Centro")
+    database.save_operation_location(branch)
+    database.save_operation_location(ATM(2))
+    database.save_operation_location(ATM(3))
+    for number, balance in ((1, 1000.0), (2, 500.0), (3, 0.0)):
+        client = Client(f"Cliente{number}", "Teste", 10000000000 + number, "123", datetime(1990, 1, 1))
+        database.save_current_account(CurrentAccount(branch, number, client, balance))
+    return database
+
+
+@pytest.fixture
+def database():
+    return Database()
+
+
+@pytest.fixture
+def empty_database():
+    return populate(Database(init_data=False))
+
+
+@pytest.fixture
+def service(empty_database):
+    return AccountOperationServiceImpl(empty_database)
+
+
+def deposit_on(service: AccountOperationServiceImpl, account_number: int, amount: float,
+               date: datetime, envelope: int = 1) -> Deposit:
+    """Deposit into an account of branch 1 and date the deposit."""
+    deposit = service.deposit(2, 1, account_number, envelope, amount)
+    deposit.set_date(date)
+    return deposit
+
+
+def feed_input(monkeypatch, *values):
+    """Answer the prompts of the text interface with values, in order."""
+    answers = iter(str(value) for value in values)
+    monkeypatch.setattr(builtins, "input", lambda prompt="": next(answers))
+
+
+def account_state(database: Database, branch: int, number: int) -> tuple:
+    """Balance and (kind, amount, date) of every transaction of an account."""
+    account = database.find_current_account(branch, number)
+    return account.get_balance(), [(type(transaction), transaction.get_amount(), transaction.get_date())
+                                   for transaction in account.get_transactions()]
+
+
+# Write-ahead log
+
+def test_wal_replays_every_mutation(tmp_path):
+    wal_path = str(tmp_path / "bank.wal")
+    database = populate(Database(init_data=False, wal_path=wal_path, commit_window=0))
+    service = AccountOperationServiceImpl(database)
+    deposit_on(service, 1, 100.0, BASE_DATE)
+    service.withdrawal(2, 1, 2, 50.0)
+    service.transfer(3, 1, 1, 1, 3, 25.0).set_date(BASE_DATE + timedelta(days=1))
+    expected = [account_state(database, 1, number) for number in (1, 2, 3)]
+    database.close()
+
+    reopened = Database(wal_path=wal_path)
+    try:
+        assert [account_state(reopened, 1, number) for number in (1, 2, 3)] == expected
+        # Sample data is not added on top of a non-empty log
+        assert sorted(atm.get_number() for atm in reopened.get_atms()) == [2, 3]
+    finally:
+        reopened.close()
+
+
+def test_wal_drops_a_torn_tail(tmp_path):
+    wal_path = tmp_path / "bank.wal"
+    database = populate(Database(init_data=False, wal_path=str(wal_path), commit_window=0))
+    deposit_on(AccountOperationServiceImpl(database), 1, 100.0, BASE_DATE)
+    expected = account_state(database, 1, 1)
+    database.close()
+    complete = wal_path.read_bytes()
+    # A crash in the middle of writing a record
+    wal_path.write_bytes(complete + b'{"op":"deposit","branch":1,"num')
+
+    reopened = Database(wal_path=str(wal_path), commit_window=0)
+    try:
+        assert account_state(reopened, 1, 1) == expected
+        assert wal_path.read_bytes() == complete
+        AccountOperationServiceImpl(reopened).deposit(2, 1, 1, 9, 1.0)
+    finally:
+        reopened.close()
+
+    reopened = Database(wal_path=str(wal_path))
+    try:
+        assert reopened.find_current_account(1, 1).get_balance() == pytest.approx(expected[0] + 1.0)
+    finally:
+        reopened.close()
+
+
+# Snapshots
+
+def test_snapshot_and_wal_tail_restore_the_same_state(tmp_path):
+    wal_path, snapshot_path = str(tmp_path / "bank.wal"), str(tmp_path / "bank.snap")
+    database = populate(Database(init_data=False, wal_path=wal_path, commit_window=0))
+    service = AccountOperationServiceImpl(database)
+    for day in range(5):
+        deposit_on(service, 1, 10.0, BASE_DATE + timedelta(days=day), envelope=day)
+    service.transfer(2, 1, 1, 1, 2, 15.0)
+    database.save_snapshot(snapshot_path)
+    # Only in the log, after the snapshot
+    deposit_on(service, 2, 7.0, BASE_DATE + timedelta(days=10))
+    service.withdrawal(3, 1, 1, 20.0)
+    expected = [account_state(database, 1, number) for number in (1, 2, 3)]
+    database.close()
+
+    restored = Database(wal_path=wal_path, snapshot_path=snapshot_path)
+    try:
+        assert [account_state(restored, 1, number) for number in (1, 2, 3)] == expected
+        assert len(restored.get_all_current_accounts()) == 3
+        assert sorted(location.get_number() for location in restored.get_all_operation_locations()) == [1, 2, 3]
+    finally:
+        restored.close()
+
+
+def test_snapshot_drops_the_records_it_holds_from_the_wal(tmp_path):
+    wal_path, snapshot_path = tmp_path / "bank.wal", str(tmp_path / "bank.snap")
+    database = populate(Database(init_data=False, wal_path=str(wal_path), commit_window=0))
+    service = AccountOperationServiceImpl(database)
+    for day in range(50):
+        deposit_on(service, 1, 10.0, BASE_DATE + timedelta(days=day), envelope=day)
+    position = database.wal.get_position()
+    database.save_snapshot(snapshot_path)
+    # Only the base line is left, and numbering goes on from it
+    assert wal_path.read_bytes().count(b'\n') == 1
+    service.withdrawal(2, 1, 2, 20.0)
+    assert database.wal.get_position() == position + 1
+    database.save_snapshot(snapshot_path)
+    deposit_on(service, 3, 5.0, BASE_DATE)
+    expected = [account_state(database, 1, number) for number in (1, 2, 3)]
+    database.close()
+    # The base line, then the deposit and its date change
+    assert wal_path.read_bytes().count(b'\n') == 3
+
+    restored = Database(wal_path=str(wal_path), snapshot_path=snapshot_path)
+    try:
+        assert [account_state(restored, 1, number) for number in (1, 2, 3)] == expected
+    finally:
+        restored.close()
+    # The log alone no longer holds the whole state
+    with pytest.raises(ValueError):
+        Database(wal_path=str(wal_path))
+
+
+def test_snapshot_rename_is_durable_before_the_wal_is_truncated(tmp_path, monkeypatch):
+    database = populate(Database(init_data=False, wal_path=str(tmp_path / "bank.wal"), commit_window=0))
+    deposit_on(AccountOperationServiceImpl(database), 1, 10.0, BASE_DATE)
+    events = []
+    monkeypatch.setattr(snapshot, "sync_directory", lambda path: events.append(("sync", path)))
+    truncate = database.wal.truncate
+    monkeypatch.setattr(database.wal, "truncate", lambda lsn: (events.append(("truncate", lsn)), truncate(lsn)))
+    snapshot_path, position = str(tmp_path / "bank.snap"), database.wal.get_position()
+    try:
+        database.save_snapshot(snapshot_path)
+    finally:
+        database.close()
+    assert events == [("sync", snapshot_path), ("truncate", position)]
+
+
+# SQLite storage
+
+def test_sqlite_database_reopens_with_the_same_state(tmp_path):
+    path = str(tmp_path / "bank.db")
+    database = populate(SqliteDatabase(path, init_data=False))
+    service = AccountOperationServiceImpl(database)
+    deposit_on(service, 1, 100.0, BASE_DATE)
+    service.withdrawal(2, 1, 2, 50.0)
+    service.transfer(3, 1, 1, 1, 3, 25.0)
+    service.transfer(3, 1, 2, 1, 2, 10.0)
+    # Back-dated before the deposit
+    service.transfer(3, 1, 3, 1, 1, 5.0).set_date(BASE_DATE - timedelta(days=30))
+    expected = [account_state(database, 1, number) for number in (1, 2, 3)]
+    database.close()
+
+    reopened = SqliteDatabase(path)
+    try:
+        assert [account_state(reopened, 1, number) for number in (1, 2, 3)] == expected
+        # Sample data is not added on top of a non-empty database
+        assert sorted(location.get_number() for location in reopened.get_all_operation_locations()) == [1, 2, 3]
+    finally:
+        reopened.close()
+
+
+# Concurrency
+
+def test_concurrent_transfers_keep_the_total(service, empty_database):
+    accounts = [empty_database.find_current_account(1, number) for number in (1, 2, 3)]
+    total = sum(account.get_balance() for account in accounts)
+    errors = []
+
+    def transfer_around(source: int, destination: int) -> None:
+        for _ in range(300):
+            try:
+                service.transfer(2, 1, source, 1, destination, 7.0)
+            except BusinessException as e:
+                if str(e) != "exception.insufficient.balance":
+                    errors.append(e)
+
+    # Opposite directions over the same pairs, which must not deadlock
+    pairs = [(1, 2), (2, 1), (2, 3), (3, 2), (3, 1), (1, 3)]
+    threads = [threading.Thread(target=transfer_around, args=pair) for pair in pairs]
+    # Switch threads often, so the transfers interleave
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert errors == []
+    assert sum(account.get_balance() for account in accounts) == pytest.approx(total)
+    assert all(account.get_balance() >= 0 for account in accounts)
+    assert sum(len(account.get_transactions()) for account in accounts) % 2 == 0
+
+
+# Batches
+
+def test_atomic_batch_aborts_on_one_bad_leg(service, empty_database):
+    before = [account_state(empty_database, 1, number) for number in (1, 2, 3)]
+    operations = [
+        BatchOperation.deposit(2, 1, 3, 1, 100.0),
+        BatchOperation.transfer(2, 1, 1, 1, 2, 200.0),
+        BatchOperation.withdrawal(2, 1, 2, 50.0),
+        BatchOperation.withdrawal(2, 1, 99, 10.0),
+    ]
+
+    results = service.apply_batch(operations, atomic=True)
+
+    assert [result.get_error() for result in results] == ["exception.batch.aborted"] * 3 + [
+        "exception.inexistent.account"]
+    assert [account_state(empty_database, 1, number) for number in (1, 2, 3)] == before
+
+
+def test_atomic_batch_checks_the_running_balance(service, empty_database):
+    before = [account_state(empty_database, 1, number) for number in (1, 2, 3)]
+    # Each withdrawal fits the opening balance, both together do not
+    operations = [BatchOperation.withdrawal(2, 1, 2, 300.0), BatchOperation.withdrawal(2, 1, 2, 300.0)]
+
+    results = service.apply_batch(operations, atomic=True)
+
+    assert not any(result.is_success() for result in results)
+    assert [account_state(empty_database, 1, number) for number in (1, 2, 3)] == before
+
+    results = service.apply_batch(operations + [BatchOperation.withdrawal(2, 1, 99, 1.0)])
+    assert [result.is_success() for result in results] == [True, False, False]
+    assert empty_database.find_current_account(1, 2).get_balance() == pytest.approx(200.0)
+
+
+# Balance at a date
+
+def replayed_balance(account: CurrentAccount, when: datetime) -> float:
+    """Balance at when, undoing the later transactions one by one."""
+    balance = account.get_balance()
+    for transaction in account.get_transactions():
+        if transaction.get_date() > when:
+            credit = isinstance(transaction, Deposit) or (
+                isinstance(transaction, Transfer) and transaction.get_destination_account() is account)
+            balance += -transaction.get_amount() if credit else transaction.get_amount()
+    return balance
+
+
+def test_balance_at_follows_back_dated_rows(service, empty_database):
+    rng = random.Random(7)
+    account = empty_database.find_current_account(1, 1)
+    # In order first, then back-dated, across many checkpoint intervals
+    for index in range(300):
+        deposit_on(service, 1, 1.0 + index % 13, BASE_DATE + timedelta(hours=index), envelope=index)
+    for index in range(150):
+        date = BASE_DATE + timedelta(hours=rng.uniform(-24, 320))
+        if index % 3 == 0:
+            service.withdrawal(2, 1, 1, 2.5).set_date(date)
+        elif index % 3 == 1:
+            service.transfer(2, 1, 1, 1, 2, 4.0).set_date(date)
+        else:
+            deposit_on(service, 1, 3.0, date, envelope=1000 + index)
+    # An existing row moved to the past
+    account.get_transactions()[10].set_date(BASE_DATE - timedelta(days=3))
+
+    for when in [BASE_DATE + timedelta(hours=rng.uniform(-96, 340)) for _ in range(100)] + [
+            BASE_DATE - timedelta(days=10), BASE_DATE + timedelta(days=30)]:
+        assert service.get_balance_at(1, 1, when) == pytest.approx(replayed_balance(account, when))
+    assert service.get_balance_at(1, 1, BASE_DATE + timedelta(days=30)) == pytest.approx(account.get_balance())
+
+
+# Idempotency keys
+
+def test_retries_return_the_original_result(service, empty_database):
+    deposit = service.deposit(2, 1, 1, 5, 100.0, idempotency_key="atm-2-0001")
+    retried = service.deposit(2, 1, 1, 5, 100.0, idempotency_key="atm-2-0001")
+    transfer = service.transfer(2, 1, 1, 1, 2, 30.0, idempotency_key="atm-2-0002")
+    retried_transfer = service.transfer(2, 1, 1, 1, 2, 30.0, idempotency_key="atm-2-0002")
+    batch = [BatchOperation.withdrawal(2, 1, 2, 10.0)]
+    results = service.apply_batch(batch, idempotency_key="atm-2-0003")
+    retried_results = service.apply_batch(batch, idempotency_key="atm-2-0003")
+
+    assert retried is deposit and retried_transfer is transfer and retried_results is results
+    assert empty_database.find_current_account(1, 1).get_balance() == pytest.approx(1070.0)
+    assert empty_database.find_current_account(1, 2).get_balance() == pytest.approx(520.0)
+    assert len(empty_database.find_current_account(1, 1).get_transactions()) == 2
+    with pytest.raises(BusinessException, match="exception.idempotency.key.reused"):
+        service.deposit(2, 1, 1, 5, 999.0, idempotency_key="atm-2-0001")
+
+
+def test_account_creation_retries_return_the_same_account(empty_database):
+    management = AccountManagementServiceImpl(empty_database)
+    created = management.create_current_account(1, "Ana", "Silva", 111, datetime(1990, 5, 1), 10.0,
+                                                idempotency_key="branch-1-0001")
+    retried = management.create_current_account(1, "Ana", "Silva", 111, datetime(1990, 5, 1), 10.0,
+                                                idempotency_key="branch-1-0001")
+
+    assert retried is created
+    assert len(empty_database.get_all_current_accounts()) == 4
+    with pytest.raises(BusinessException, match="exception.idempotency.key.reused"):
+        management.create_current_account(1, "Bia", "Silva", 222, datetime(1990, 5, 1), 10.0,
+                                          idempotency_key="branch-1-0001")
+
+
+def test_failed_operations_are_not_remembered(service, empty_database):
+    with pytest.raises(BusinessException, match="exception.insufficient.balance"):
+        service.withdrawal(2, 1, 3, 10.0, idempotency_key="atm-3-0001")
+    deposit_on(service, 3, 50.0, BASE_DATE)
+
+    withdrawal = service.withdrawal(2, 1, 3, 10.0, idempotency_key="atm-3-0001")
+
+    assert service.withdrawal(2, 1, 3, 10.0, idempotency_key="atm-3-0001") is withdrawal
+    assert empty_database.find_current_account(1, 3).get_balance() == pytest.approx(40.0)
+
+
+def test_concurrent_retries_wait_for_the_running_operation():
+    cache = IdempotencyCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def operation() -> object:
+        calls.append(1)
+        started.set()
+        release.wait(10)
+        return object()
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.run("key", ("op",), operation)))
+    first.start()
+    started.wait(10)
+    retry = threading.Thread(target=lambda: results.append(cache.run("key", ("op",), operation)))
+    retry.start()
+    release.set()
+    first.join(10)
+    retry.join(10)
+
+    assert len(calls) == 1
+    assert len(results) == 2 and results[0] is results[1]
+    assert cache.get_hits() == 1
+
+
+def test_idempotency_cache_expires_and_evicts():
+    now = [0.0]
+    cache = IdempotencyCache(max_entries=2, ttl=10.0, clock=lambda: now[0])
+    for key in ("a", "b", "c"):
+        cache.run(key, (key,), lambda: key)
+    # The oldest entry was evicted by size
+    assert len(cache) == 2 and cache.get_evictions() == 1
+    assert cache.run("a", ("a",), lambda: "again") == "again"
+    now[0] = 100.0
+    assert cache.run("b", ("b",), lambda: "later") == "later"
+    assert len(cache) == 1
+
+
+def test_text_interfaces_share_one_idempotency_cache(monkeypatch):
+    monkeypatch.setattr(BranchInterface, "start", lambda self: interfaces.append(self))
+    monkeypatch.setattr(ATMInterface, "start", lambda self: interfaces.append(self))
+    interfaces = []
+    application = BankingApplication(sample_data=False)
+    application.start_branch_interface()
+    application.start_atm_interface()
+    application.start_atm_interface()
+    cache = application.get_idempotency_cache()
+    assert cache.max_entries == DEFAULT_MAX_ENTRIES
+    assert interfaces[0].account_service.idempotency_cache is cache
+    assert all(interface.operation_service.idempotency_cache is cache for interface in interfaces[1:])
+
+
+# Account import
+
+def test_import_rejects_invalid_rows_and_saves_the_rest(empty_database):
+    input_file = io.StringIO("branch,first_name,last_name,cpf,birthday,balance\n"
+                             "1,Ana,Silva,111,1990-05-01,100.50\n"
+                             "1,Bia,Souza,222,1991-06-02,-10\n"
+                             "1,Caio,Lima,333,1992-07-03,nan\n"
+                             "9,Davi,Reis,444,1993-08-04,5\n"
+                             "1,Eva,Melo,555,not a date,5\n")
+    output_file = io.StringIO()
+
+    summary = AccountImporter(empty_database).import_csv(input_file, output_file)
+
+    results = [line.split(",") for line in output_file.getvalue().splitlines()[1:]]
+    assert (summary.get_imported(), summary.get_failed()) == (1, 4)
+    assert [result[4] for result in results] == ["", "exception.invalid.amount", "exception.invalid.amount",
+                                                 "exception.invalid.branch", "exception.invalid.row"]
+    account = empty_database.find_current_account(1, int(results[0][2]))
+    assert account.get_balance() == pytest.approx(100.5)
+    assert account.get_client().get_password() == results[0][3]
+
+
+# ATM interface
+
+def test_atm_deposit_goes_through_the_selector(database, monkeypatch, capsys):
+    atm_interface = ATMInterface(database, RoundRobinATMSelector(database))
+    account = database.find_current_account(1, 1)
+    atm_interface.session.set_current_account(account)
+    balance = account.get_balance()
+
+    feed_input(monkeypatch, 7, 10.0, 8, 5.0)
+    atm_interface.deposit()
+    atm_interface.deposit()
+
+    output = capsys.readouterr().out
+    assert "Erro" not in output
+    assert account.get_balance() == pytest.approx(balance + 15.0)
+    deposits = sorted((transaction for transaction in account.get_transactions()
+                       if isinstance(transaction, Deposit) and transaction.get_envelope() in (7, 8)),
+                      key=Deposit.get_envelope)
+    locations = [deposit.get_location() for deposit in deposits]
+    atm_numbers = sorted(atm.get_number() for atm in database.get_atms())
+    assert all(isinstance(location, ATM) for location in locations)
+    # Round robin: consecutive operations use consecutive ATMs
+    assert [location.get_number() for location in locations] == atm_numbers[:2]
+
+
+def test_atm_check_balance_and_account_info(database, monkeypatch, capsys):
+    atm_interface = ATMInterface(database)
+    account = database.find_current_account(1, 1)
+    atm_interface.session.set_current_account(account)
+
+    atm_interface.check_balance()
+    atm_interface.show_account_info()
+
+    output = capsys.readouterr().out
+    assert "Erro" not in output
+    assert f"Saldo atual: R$ {account.get_balance():.2f}" in output
+    assert f"Cliente: {account.get_client().get_first_name()}" in output
+
+
+# Paginated statements
+
+def test_statement_pages_are_newest_first_and_complete(service):
+    for day in range(25):
+        deposit_on(service, 1, 1.0 + day, BASE_DATE + timedelta(days=day % 20), envelope=day)
+    begin, end = BASE_DATE - timedelta(days=1), BASE_DATE + timedelta(days=30)
+
+    pages = list(service.iter_statement(1, 1, begin, end, page_size=10))
+
+    assert [len(page.get_transactions()) for page in pages] == [10, 10, 5]
+    assert [page.has_next() for page in pages] == [True, True, False]
+    transactions = [transaction for page in pages for transaction in page.get_transactions()]
+    # Newest first; rows sharing a date, newest row first
+    keys = [(transaction.get_date(), transaction.get_row()) for transaction in transactions]
+    assert keys == sorted(keys, reverse=True)
+    assert sorted(transaction.get_envelope() for transaction in transactions) == list(range(25))
+
+
+def test_statement_cursor_resumes_where_it_stopped(service):
+    for day in range(15):
+        deposit_on(service, 1, 10.0, BASE_DATE + timedelta(days=day), envelope=day)
+    begin, end = BASE_DATE, BASE_DATE + timedelta(days=60)
+    first = next(service.iter_statement(1, 1, begin, end, page_size=6))
+    remaining = [transaction.get_envelope()
+                 for page in service.iter_statement(1, 1, begin, end, 6, first.get_cursor())
+                 for transaction in page.get_transactions()]
+
+    # Newer transactions, and one sharing the date of the last row of the page, do not move the cursor
+    deposit_on(service, 1, 10.0, BASE_DATE + timedelta(days=30), envelope=100)
+    deposit_on(service, 1, 10.0, first.get_transactions()[-1].get_date(), envelope=101)
+    resumed = [transaction.get_envelope()
+               for page in service.iter_statement(1, 1, begin, end, 6, first.get_cursor())
+               for transaction in page.get_transactions()]
+
+    assert [transaction.get_envelope() for transaction in first.get_transactions()] == list(range(14, 8, -1))
+    assert remaining == list(range(8, -1, -1))
+    assert resumed == remaining
+
+
+def test_statement_rejects_invalid_cursor_and_page_size(service):
+    begin, end = BASE_DATE, BASE_DATE + timedelta(days=1)
+    with pytest.raises(BusinessException, match="exception.invalid.cursor"):
+        service.iter_statement(1, 1, begin, end, 10, "not a cursor")
+    with pytest.raises(BusinessException, match="exception.invalid.page.size"):
+        service.iter_statement(1, 1, begin, end, 0)
+
+
+def test_atm_statement_shows_pages_on_request(empty_database, service, monkeypatch, capsys):
+    for day in range(25):
+        deposit_on(service, 1, 1.0, BASE_DATE + timedelta(days=day), envelope=day)
+    atm_interface = ATMInterface(empty_database)
+    atm_interface.session.set_current_account(empty_database.find_current_account(1, 1))
+
+    # Period, then Enter for the second page, then 0 instead of the third
+    feed_input(monkeypatch, 1, 1, 2024, 31, 12, 2024, "", "0")
+    atm_interface.statement_by_date()
+
+    output = capsys.readouterr().out
+    assert "Erro" not in output
+    assert "Transações exibidas: 20" in output
+    assert "Envelope: 24" in output and "Envelope: 5" in output and "Envelope: 4" not in output
+
+
+# Asynchronous facade
+
+def test_async_writes_keep_their_order_off_the_loop_thread(service):
+    loop_threads = set()
+    deposit = service.deposit
+
+    def recorded_deposit(*args):
+        loop_threads.add(threading.get_ident())
+        return deposit(*args)
+    service.deposit = recorded_deposit
+
+    async def run():
+        facade = AsyncAccountOperationService(service)
+        deposits = await asyncio.gather(*(facade.deposit(2, 1, 1, envelope, 1.0) for envelope in range(20)))
+        return facade, deposits, threading.get_ident()
+
+    facade, deposits, loop_thread = asyncio.run(run())
+
+    assert loop_thread not in loop_threads
+    assert [deposit.get_envelope() for deposit in sorted(deposits, key=Deposit.get_row)] == list(range(20))
+    assert facade.get_pending_accounts() == 0
+
+
+def test_async_statement_pages(service):
+    for day in range(12):
+        deposit_on(service, 1, 1.0, BASE_DATE + timedelta(days=day), envelope=day)
+    begin, end = BASE_DATE, BASE_DATE + timedelta(days=30)
+
+    async def run():
+        facade = AsyncAccountOperationService(service)
+        with pytest.raises(BusinessException, match="exception.invalid.page.size"):
+            await facade.iter_statement(1, 1, begin, end, page_size=0)
+        return [page async for page in await facade.iter_statement(1, 1, begin, end, page_size=5)]
+
+    pages = asyncio.run(run())
+
+    assert [len(page.get_transactions()) for page in pages] == [5, 5, 2]
+    assert [transaction.get_envelope() for page in pages
+            for transaction in page.get_transactions()] == list(range(11, -1, -1))
+
+
+# JSON server
+
+def test_server_only_listens_on_loopback_addresses(empty_database):
+    for host in ("0.0.0.0", "192.168.0.1", "example.com"):
+        with pytest.raises(ValueError):
+            BankServer(empty_database, host)
+    for host in ("127.0.0.1", "::1", "localhost"):
+        BankServer(empty_database, host, workers=0)
+
+
+def test_server_reports_malformed_requests_only_as_invalid(database):
+    requests = [b"not json", b"[1]",
+                {"service": "operation", "method": "get_balance", "params": {"branch": 1}},
+                {"service": "operation", "method": "get_balance", "params": {"branch": 1, "account_number": 1,
+                                                                             "extra": 1}},
+                {"service": "operation", "method": "get_balance_at",
+                 "params": {"branch": 1, "account_number": 1, "when": "yesterday"}},
+                {"service": "operation", "method": "get_balance", "params": [1, 1]},
+                {"service": "operation", "method": "deposit",
+                 "params": {"operation_location": 2, "branch": 1, "account_number": 1, "envelope": 1,
+                            "amount": "ten"}},
+                {"service": "operation", "method": "get_balance", "params": {"branch": 1, "account_number": 1}}]
+
+    async def run():
+        server = BankServer(database, workers=0)
+        await server.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.get_port())
+        responses = []
+        for index, request in enumerate(requests):
+            line = request if isinstance(request, bytes) else json.dumps(dict(request, id=index)).encode()
+            writer.write(line + b"\n")
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+        writer.close()
+        await writer.wait_closed()
+        await server.stop()
+        return responses
+
+    responses = asyncio.run(run())
+
+    assert [response.get("error") for response in responses[:6]] == ["exception.invalid.request"] * 6
+    # A type error raised inside the service is not the client's malformed request
+    assert responses[6]["error"] == "exception.internal"
+    assert responses[7]["result"] == pytest.approx(database.find_current_account(1, 1).get_balance())
+
+
+# Statement export
+
+def test_parallel_export_matches_the_sequential_one(tmp_path):
+    database = Database(init_data=False)
+    SyntheticDataGenerator(seed=5, branches=2, atms=3, accounts=12, transactions=600).populate(database)
+    database.attach_wal(str(tmp_path / "bank.wal"))
+    accounts = sorted((account.get_id().get_branch().get_number(), account.get_id().get_number())
+                      for account in database.get_all_current_accounts())
+    AccountOperationServiceImpl(database).deposit(min(database.atms), *accounts[0], 1, 10.0)
+    wal_size = (tmp_path / "bank.wal").stat().st_size
+    # Accounts that do not exist are skipped, and not counted
+    requested = accounts + [(99, 1), (1, 10 ** 6)]
+
+    summaries = []
+    for workers in (1, 3):
+        path = tmp_path / f"export-{workers}.csv"
+        summaries.append(StatementExporter(database, workers=workers).export(str(path), requested))
+
+    assert [summary.get_accounts() for summary in summaries] == [len(accounts)] * 2
+    assert summaries[0].get_rows() == summaries[1].get_rows() > 0
+    assert (tmp_path / "export-1.csv").read_bytes() == (tmp_path / "export-3.csv").read_bytes()
+    # The snapshot read by the workers is a copy: the log keeps its records
+    assert (tmp_path / "bank.wal").stat().st_size == wal_size > 0
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["bank.wal", "export-1.csv", "export-3.csv"]
+    database.close()
+
+
+def test_server_accepts_large_batches_and_rejects_overlong_lines(database):
+    deposits = [{"kind": "deposit", "operation_location": 2, "branch": 1, "account_number": 1,
+                 "amount": 1.0, "envelope": envelope} for envelope in range(2000)]
+    balance = database.find_current_account(1, 1).get_balance()
+
+    async def send(server, requests):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.get_port(), limit=1 << 24)
+        responses = []
+        for request in requests:
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+        writer.close()
+        await writer.wait_closed()
+        return responses
+
+    async def run():
+        server = BankServer(database, workers=0)
+        await server.start()
+        large = await send(server, [{"id": 1, "service": "operation", "method": "apply_batch",
+                                     "params": {"operations": deposits}}])
+        await server.stop()
+        server = BankServer(database, workers=0, max_request_bytes=4096)
+        await server.start()
+        limited = await send(server, [{"id": 2, "service": "operation", "method": "apply_batch",
+                                       "params": {"operations": deposits}},
+                                      {"id": 3, "service": "operation", "method": "get_balance",
+                                       "params": {"branch": 1, "account_number": 1}}])
+        await server.stop()
+        return large, limited
+
+    large, limited = asyncio.run(run())
+
+    assert len(large[0]["result"]) == 2000
+    assert all(result["error"] is None for result in large[0]["result"])
+    # The line over the limit is answered and skipped; the connection keeps serving
+    assert limited[0] == {"id": 2, "error": "exception.invalid.request"}
+    assert limited[1] == {"id": 3, "result": pytest.approx(balance + 2000.0)}
+
+
+# Sharded operations
+
+def sharded_database() -> Database:
+    """Populated database with a second branch, account 4 on it, and some history on both branches."""
+    database = populate(Database(init_data=False))
+    branch = Branch(4, "Norte")
+    database.save_operation_location(branch)
+    client = Client("Cliente4", "Teste", 10000000004, "123", datetime(1990, 1, 1))
+    database.save_current_account(CurrentAccount(branch, 4, client, 300.0))
+    service = AccountOperationServiceImpl(database)
+    for day in range(10):
+        deposit_on(service, 1, 10.0 + day, BASE_DATE + timedelta(days=3 * day), envelope=day)
+        service.transfer(2, 1, 1, 4, 4, 5.0).set_date(BASE_DATE + timedelta(days=3 * day + 1))
+    return database
+
+
+@pytest.fixture
+def sharded_service():
+    database = sharded_database()
+    service = ShardedAccountOperationService(database, workers=2)
+    yield service
+    service.close()
+
+
+def test_sharded_service_serves_the_loaded_history():
+    database = sharded_database()
+    direct = AccountOperationServiceImpl(database)
+    sharded = ShardedAccountOperationService(database, workers=2)
+    try:
+        begin, end = BASE_DATE - timedelta(days=1), BASE_DATE + timedelta(days=60)
+        when = BASE_DATE + timedelta(days=13)
+        for branch, number, rows in ((1, 1, 20), (4, 4, 10)):
+            expected = [(type(transaction), transaction.get_amount(), transaction.get_date())
+                        for transaction in direct.get_statement_by_date(branch, number, begin, end)]
+            assert len(expected) == rows
+            assert [(type(transaction), transaction.get_amount(), transaction.get_date())
+                    for transaction in sharded.get_statement_by_date(branch, number, begin, end)] == expected
+            assert sharded.get_balance_at(branch, number, when) == pytest.approx(
+                direct.get_balance_at(branch, number, when))
+            assert slot_values(sharded.get_monthly_summary(branch, number, 1, 2024)) == slot_values(
+                direct.get_monthly_summary(branch, number, 1, 2024))
+    finally:
+        sharded.close()
+
+
+def slot_values(value) -> tuple:
+    """Field values of an object with slots."""
+    return tuple(getattr(value, slot) for slot in type(value).__slots__)
+
+
+def test_sharded_service_routes_accounts_created_later(sharded_service):
+    database = sharded_service.database
+    branch = Branch(5, "Sul")
+    database.save_operation_location(branch)
+    database.save_operation_location(ATM(6))
+    number = database.get_next_current_account_number()
+    client = Client("Cliente5", "Teste", 10000000005, "123", datetime(1990, 1, 1))
+    database.save_current_account(CurrentAccount(branch, number, client, 50.0))
+
+    sharded_service.deposit(6, 5, number, 1, 25.0)
+    sharded_service.transfer(6, 1, 1, 5, number, 25.0)
+
+    assert sharded_service.get_balance(5, number) == pytest.approx(100.0)
+    with pytest.raises(BusinessException, match="exception.inexistent.account"):
+        sharded_service.get_balance(5, number + 1)
+
+
+def test_sharded_writes_are_replayed_from_the_shard_logs(tmp_path):
+    database = sharded_database()
+    balances = {1: database.find_current_account(1, 1).get_balance(),
+                4: database.find_current_account(4, 4).get_balance()}
+    sharded = ShardedAccountOperationService(database, workers=2, wal_directory=str(tmp_path))
+    try:
+        sharded.deposit(2, 1, 1, 50, 40.0)
+        sharded.transfer(2, 1, 1, 4, 4, 15.0)
+    finally:
+        sharded.close()
+
+    # Restarted over the same database, which the workers never write to
+    with pytest.raises(ValueError):
+        ShardedAccountOperationService(database, workers=3, wal_directory=str(tmp_path))
+    sharded = ShardedAccountOperationService(database, wal_directory=str(tmp_path))
+    try:
+        assert sharded.get_worker_count() == 2
+        assert sharded.get_balance(1, 1) == pytest.approx(balances[1] + 25.0)
+        assert sharded.get_balance(4, 4) == pytest.approx(balances[4] + 15.0)
+        statement = sharded.get_statement_by_date(1, 1, BASE_DATE, datetime.now() + timedelta(days=1))
+        assert len(statement) == 22
+    finally:
+        sharded.close()
+
+
+def failing_calls(shard, failing_method: str, error: BaseException):
+    """Replacement for shard.call raising error for one method."""
+    call = shard.call
+
+    def fail(method, *args):
+        if method == failing_method:
+            raise error
+        return call(method, *args)
+    return fail
+
+
+def test_transfers_interrupted_between_shards_are_settled_on_restart(tmp_path):
+    database = sharded_database()
+    balances = {1: database.find_current_account(1, 1).get_balance(),
+                4: database.find_current_account(4, 4).get_balance()}
+    sharded = ShardedAccountOperationService(database, workers=2, wal_directory=str(tmp_path))
+    source, destination = sharded._shard(1, 1), sharded._shard(4, 4)
+    try:
+        sharded.transfer(2, 1, 1, 4, 4, 5.0)
+        # The router dies after a debit, and after a debit and its credit, before either is confirmed
+        source.call("transfer_out", 2, 1, 1, 4, 4, 30.0, "debited")
+        debit = source.call("transfer_out", 2, 1, 1, 4, 4, 7.0, "credited")
+        destination.call("transfer_in", 2, 1, 1, 4, 4, 7.0, debit.get_date(), "credited")
+        # A refunded transfer is settled by its refund
+        destination.call = failing_calls(destination, "transfer_in", EOFError())
+        with pytest.raises(EOFError):
+            sharded.transfer(2, 1, 1, 4, 4, 11.0)
+        del destination.call
+        assert [transfer[0] for transfer in source.call("get_pending_transfers")] == ["debited", "credited"]
+    finally:
+        sharded.close()
+
+    sharded = ShardedAccountOperationService(database, wal_directory=str(tmp_path))
+    try:
+        assert sharded.get_balance(1, 1) == pytest.approx(balances[1] - 42.0)
+        assert sharded.get_balance(4, 4) == pytest.approx(balances[4] + 42.0)
+        for shard in sharded._shards:
+            assert shard.call("get_pending_transfers") == []
+            assert shard.call("get_received_transfers") == []
+    finally:
+        sharded.close()
+
+
+def test_failed_sub_batch_leaves_every_shard_usable(sharded_service):
+    first, second = sharded_service._shard(1, 1), sharded_service._shard(4, 4)
+    balances = sharded_service.get_balance(1, 1), sharded_service.get_balance(4, 4)
+    receive = first.receive
+
+    def failing_receive():
+        receive()
+        raise OSError("worker gone")
+    first.receive = failing_receive
+    operations = [BatchOperation.deposit(2, 1, 1, 1, 10.0), BatchOperation.deposit(2, 4, 4, 2, 20.0)]
+    with pytest.raises(OSError):
+        sharded_service.apply_batch(operations)
+    first.receive = receive
+
+    # Both replies were read and both shards released, so the next calls get their own replies
+    assert not first._lock.locked() and not second._lock.locked()
+    assert sharded_service.get_balance(1, 1) == pytest.approx(balances[0] + 10.0)
+    assert sharded_service.get_balance(4, 4) == pytest.approx(balances[1] + 20.0)
+
+
+def test_cross_shard_transfer_is_refunded_whatever_fails(sharded_service):
+    source, destination = sharded_service._shard(1, 1), sharded_service._shard(4, 4)
+    assert source is not destination
+    balance = sharded_service.get_balance(1, 1)
+
+    destination.call = failing_calls(destination, "transfer_in", EOFError())
+    with pytest.raises(EOFError):
+        sharded_service.transfer(2, 1, 1, 4, 4, 30.0)
+    assert sharded_service.get_balance(1, 1) == pytest.approx(balance)
+    assert sharded_service.get_balance(4, 4) == pytest.approx(350.0)
+
+    source.call = failing_calls(source, "transfer_in", OSError("worker gone"))
+    with pytest.raises(BusinessException, match="exception.transfer.compensation.failed") as raised:
+        sharded_service.transfer(2, 1, 1, 4, 4, 30.0)
+    assert isinstance(raised.value.__cause__, OSError)
+
+
+# Synthetic data
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_synthetic_ledgers_are_consistent_and_reproducible(use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    snapshots = []
+    for _ in range(2):
+        database = Database(init_data=False)
+        SyntheticDataGenerator(seed=9, branches=2, atms=3, accounts=30, transactions=2000,
+                               start=datetime(2024, 1, 1), end=datetime(2024, 7, 1),
+                               use_numpy=use_numpy).populate(database)
+        accounts = sorted(database.get_all_current_accounts(), key=lambda account: account.get_id().get_number())
+        snapshots.append([(account.get_balance(), [list(getattr(account.get_ledger(), name))
+                                                   for name, _ in account.get_ledger().COLUMNS])
+                          for account in accounts])
+    assert snapshots[0] == snapshots[1]
+
+    rows = 0
+    for account in accounts:
+        ledger = account.get_ledger()
+        rows += len(ledger)
+        for row in range(len(ledger)):
+            if ledger.links[row] != -1:
+                other = ledger.counterparty_table[ledger.counterparties[row]].get_ledger()
+                assert other.links[ledger.links[row]] == row
+                assert other.amounts[ledger.links[row]] == ledger.amounts[row]
+        # The balance never goes negative, and the indexes match the ones the ledger would build
+        statement = account.get_transactions()
+        assert account.get_balance() >= 0
+        assert all(round(account.get_balance_at(transaction.get_date()), 2) >= 0 for transaction in statement)
+        indexes = (list(ledger.time_order), dict(ledger.monthly_totals), list(ledger.balance_checkpoints))
+        ledger.set_columns({name: getattr(ledger, name) for name, _ in ledger.COLUMNS},
+                           ledger.location_table, ledger.counterparty_table)
+        assert indexes[0] == list(ledger.time_order)
+        assert indexes[1].keys() == ledger.monthly_totals.keys()
+        for key, totals in indexes[1].items():
+            assert totals == pytest.approx(ledger.monthly_totals[key])
+        assert indexes[2] == pytest.approx(list(ledger.balance_checkpoints))
+    # Each transfer is a row in both of its ledgers
+    assert rows == 2000 + sum(account.get_ledger().kinds.count(2) for account in accounts)
+
+
+# Analytics
+
+def test_analytics_backends_give_the_same_aggregates():
+    pytest.importorskip("numpy")
+    database = Database(init_data=False)
+    SyntheticDataGenerator(seed=3, branches=3, atms=5, accounts=40, transactions=3000,
+                           start=datetime(2024, 1, 1), end=datetime(2024, 4, 1)).populate(database)
+    vectorized = LedgerAnalytics(database, use_numpy=True)
+    plain = LedgerAnalytics(database, use_numpy=False)
+    assert vectorized.use_numpy and not plain.use_numpy
 
-#coloque aqui os testes unitários para o sistema bancário
+    queries = [dict(group_by=(key,)) for key in LedgerAnalytics.GROUP_KEYS]
+    queries += [dict(group_by=("branch", "kind")),
+                dict(group_by=("location", "month"), kinds=(0, 1)),
+                dict(group_by=("day",), begin=datetime(2024, 2, 1), end=datetime(2024, 2, 29, 23, 59, 59)),
+                dict(group_by=(), kinds=(2,)),
+                dict(group_by=("kind",), begin=datetime(2030, 1, 1))]
+    for query in queries:
+        expected = plain.aggregate(**query)
+        result = vectorized.aggregate(**query)
+        assert sorted(result) == sorted(expected), query
+        for group, (count, total) in expected.items():
+            assert result[group][0] == count, (query, group)
+            assert result[group][1] == pytest.approx(total), (query, group)
 
 
 if __name__ == "__main__":
-    pytest.main([__file__, "-v"])
\ No newline at end of file
+    pytest.main([__file__, "-v"])